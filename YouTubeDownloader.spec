@@ -5,7 +5,7 @@ a = Analysis(
     ['download_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('logo/logo.png', 'logo'), ('vendor/yt-dlp', 'vendor')],
+    datas=[('logo/logo.png', 'logo'), ('logo/logo_80.png', 'logo'), ('vendor/yt-dlp', 'vendor')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+
+
+def get_app_support_dir():
+    """Returns the path to the app's Application Support directory, creating it if needed.
+
+    The YOUTUBE_DOWNLOADER_HOME environment variable overrides the location (useful on headless boxes).
+    """
+    app_name = "YouTubeDownloader"
+    if os.environ.get("YOUTUBE_DOWNLOADER_HOME"):
+        app_dir = Path(os.environ["YOUTUBE_DOWNLOADER_HOME"]).expanduser()
+    else:
+        # Path is ~/Library/Application Support/AppName on macOS
+        app_dir = Path.home() / "Library" / "Application Support" / app_name
+    app_dir.mkdir(parents=True, exist_ok=True)
+    return app_dir
+
+
+def default_settings() -> dict:
+    """程序的默认设置"""
+    return {
+        "browser": "chrome", 
+        "interval_seconds": 600, 
+        "max_resolution": "2160",
+        "video_format": "mp4",
+        "audio_format": "m4a",
+        "max_workers": 3,
+        "per_host_limit": 2,
+        "rate_limit": {"enabled": True},
+        "metadata_cache": {"enabled": True},
+        "prefetch_metadata": True,
+        "engine": "auto",
+        "download_archive": {"enabled": True},
+        "job_store": {"enabled": True},
+        "playlist_fanout": {"enabled": False},
+        "cookie_cache": {"enabled": True},
+        "download_tuning": {"enabled": True, "auto_tune": False},
+        "metrics": {"enabled": True},
+        "postprocess_pool": {"enabled": False},
+        "bandwidth": {"enabled": False},
+        "url_normalizer": {"enabled": True, "mixed_policy": "video"},
+        "playlist_sync": {"enabled": False},
+        "staging": {"enabled": False},
+        "disk_admission": {"enabled": False},
+        "retry": {"enabled": True}
+    }
@@ -0,0 +1,240 @@
+import datetime
+import re
+import threading
+import time
+
+DEFAULT_BANDWIDTH = {
+    "enabled": False,
+    "limit": None,             # total download rate outside the schedule windows, e.g. "20M"; None = unlimited
+    "schedule": [],            # [{"days": "mon-fri", "start": "09:00", "end": "18:00", "limit": "20M"}], first match wins
+    "min_rate": "256K",        # no download gets less than this
+    "rebalance_seconds": 5,    # how often in-process downloads are rebalanced by measured speed
+}
+
+# Same units as yt-dlp --limit-rate: K/M/G are powers of 1024
+_RATE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$", re.IGNORECASE)
+_RATE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def parse_rate(value):
+    """把 "20M"、"512K" 或字节数转换为 字节/秒；None、空字符串和 0 表示不限速"""
+    if value is None or value == "" or value == 0:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    match = _RATE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"无法识别的速率: {value!r}")
+    rate = int(float(match.group(1)) * _RATE_UNITS[match.group(2).lower()])
+    return rate or None
+
+
+def format_rate(rate) -> str:
+    if rate is None:
+        return "不限速"
+    for unit, size in (("GiB", 1024 ** 3), ("MiB", 1024 ** 2), ("KiB", 1024)):
+        if rate >= size:
+            return f"{rate / size:.1f} {unit}/s"
+    return f"{rate:.0f} B/s"
+
+
+def _parse_days(spec) -> set:
+    """ "mon-fri"、"sat,sun" 或 ["mon", "wed"] 转换为 weekday() 序号集合；未指定时为每天"""
+    if not spec:
+        return set(range(7))
+    parts = spec if isinstance(spec, (list, tuple)) else str(spec).split(",")
+    days = set()
+    for part in parts:
+        part = str(part).strip().lower()
+        if "-" in part:
+            first, last = (_DAYS.index(name.strip()[:3]) for name in part.split("-", 1))
+            days.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+        else:
+            days.add(_DAYS.index(part[:3]))
+    return days
+
+
+def _parse_clock(text: str) -> int:
+    hours, minutes = str(text).split(":", 1)
+    return int(hours) * 60 + int(minutes)
+
+
+def _window_matches(window: dict, now: datetime.datetime) -> bool:
+    start, end = _parse_clock(window.get("start", "00:00")), _parse_clock(window.get("end", "24:00"))
+    minute = now.hour * 60 + now.minute
+    days = _parse_days(window.get("days"))
+    if start < end:
+        return now.weekday() in days and start <= minute < end
+    # Overnight window such as 22:00-06:00: the part after midnight belongs to the previous day
+    if minute >= start:
+        return now.weekday() in days
+    return minute < end and (now.weekday() - 1) % 7 in days
+
+
+def limit_at(config: dict, now: datetime.datetime):
+    """返回 (总带宽 字节/秒 或 None, 生效时段的描述)"""
+    for window in config.get("schedule") or []:
+        if _window_matches(window, now):
+            label = f"{window.get('days') or ''} {window.get('start', '00:00')}-{window.get('end', '24:00')}".strip()
+            return parse_rate(window.get("limit")), label
+    return parse_rate(config.get("limit")), "默认"
+
+
+class BandwidthLease:
+    """一个正在运行的下载进程分到的带宽份额
+
+    live 为 True 的份额 (进程内后端) 在运行中随时调整；其余的 (子进程后端) 在启动时固定为 --limit-rate。
+    """
+
+    def __init__(self, budget, owner, live: bool, fragments: int):
+        self.budget = budget
+        self.owner = owner
+        self.live = live
+        self.fragments = max(1, fragments)
+        self.rate = None
+        self.speed = None
+
+    def current_rate(self):
+        """当前份额 (字节/秒)；不限速时为 None"""
+        self.budget.refresh()
+        return self.rate
+
+    def ytdlp_rate(self):
+        """传给 yt-dlp 的限速：并发分片时每个分片单独限速，所以按分片数平分"""
+        rate = self.current_rate()
+        return max(1, int(rate / self.fragments)) if rate else None
+
+    def report_speed(self, speed):
+        self.speed = speed
+
+
+class BandwidthBudget:
+    """所有同时进行的下载共享的总带宽预算
+
+    总带宽由 limit 和按星期、时间段生效的 schedule 决定。每次有下载开始或结束时重新分配：
+    子进程下载在启动时取得公平份额 (按调度器预计的同时下载数计算，且不超过尚未分出的预算)，
+    之后保持不变；进程内下载平分剩余的预算，测得的速度明显低于份额时 (例如站点本身较慢)，
+    多出的部分分给其他下载。
+    """
+
+    def __init__(self, config: dict = None, clock=time.monotonic, now=datetime.datetime.now):
+        self.config = dict(DEFAULT_BANDWIDTH)
+        self.config.update(config or {})
+        self._clock = clock
+        self._now = now
+        self._lock = threading.Lock()
+        self._leases = []
+        self._sources = []  # callables returning how many downloads a scheduler expects to run at once
+        self._limit = None
+        self._window = None
+        self._checked = None
+        self._rebalanced = None
+
+    def limit(self):
+        """当前时段的总带宽 (字节/秒)；不限速时为 None"""
+        self.refresh()
+        return self._limit
+
+    def add_source(self, expected):
+        with self._lock:
+            self._sources.append(expected)
+
+    def remove_source(self, expected):
+        with self._lock:
+            if expected in self._sources:
+                self._sources.remove(expected)
+
+    def _expected(self) -> int:
+        with self._lock:
+            sources = list(self._sources)
+        total = 0
+        for expected in sources:
+            try:
+                total += int(expected())
+            except Exception:
+                pass
+        return total
+
+    def acquire(self, owner=None, live: bool = False, fragments: int = 1) -> BandwidthLease:
+        """为一个下载进程分配份额；结束时必须调用 release()"""
+        expected = self._expected()
+        lease = BandwidthLease(self, owner, live, fragments)
+        with self._lock:
+            self._leases.append(lease)
+            self._rebalance(new=lease, expected=expected)
+        return lease
+
+    def release(self, lease: BandwidthLease):
+        with self._lock:
+            if lease in self._leases:
+                self._leases.remove(lease)
+            self._rebalance()
+
+    def refresh(self):
+        """时段变化时，以及每 rebalance_seconds 秒按测得的速度，重新分配进程内下载的份额"""
+        now = self._clock()
+        if self._checked is not None and now - self._checked < 1.0:
+            return
+        with self._lock:
+            self._checked = now
+            previous = (self._limit, self._window)
+            self._update_limit()
+            due = self._rebalanced is None or now - self._rebalanced >= float(self.config["rebalance_seconds"])
+            if (self._limit, self._window) != previous or due:
+                self._rebalance()
+
+    def _update_limit(self):
+        self._limit, self._window = limit_at(self.config, self._now())
+
+    def _rebalance(self, new: BandwidthLease = None, expected: int = 0):
+        self._rebalanced = self._clock()
+        self._update_limit()
+        limit = self._limit
+        if limit is None:
+            for lease in self._leases:
+                if lease.live or lease is new:
+                    lease.rate = None
+            return
+        min_rate = parse_rate(self.config.get("min_rate")) or 1
+        live = [lease for lease in self._leases if lease.live]
+        fixed = [lease for lease in self._leases if not lease.live and lease is not new]
+        if new is not None and not new.live:
+            committed = sum(lease.rate or limit for lease in fixed) + min_rate * len(live)
+            fair = limit / max(len(self._leases), expected, 1)
+            new.rate = int(max(min_rate, min(fair, limit - committed)))
+            fixed.append(new)
+        remaining = max(0, limit - sum(lease.rate or limit for lease in fixed))
+        # Water-filling: downloads that cannot use their share keep a little headroom and give the rest away
+        unassigned = list(live)
+        while unassigned:
+            share = remaining / len(unassigned)
+            capped = [lease for lease in unassigned if lease.speed and lease.rate and lease.speed < 0.8 * lease.rate
+                      and lease.speed * 1.25 < share]
+            if not capped:
+                for lease in unassigned:
+                    lease.rate = int(max(min_rate, share))
+                break
+            for lease in capped:
+                lease.rate = int(max(min_rate, lease.speed * 1.25))
+                remaining = max(0, remaining - lease.rate)
+                unassigned.remove(lease)
+
+    def allocation(self, owner):
+        """owner (一个任务) 所有下载进程的份额之和；不限速或没有在下载时为 None"""
+        with self._lock:
+            rates = [lease.rate for lease in self._leases if lease.owner is owner]
+        if not rates or any(rate is None for rate in rates):
+            return None
+        return sum(rates)
+
+    def describe(self) -> str:
+        """适合显示在状态栏的简短描述，例如 "带宽 20.0 MiB/s (mon-fri 09:00-18:00) · 3 个下载" """
+        limit = self.limit()
+        with self._lock:
+            active = len(self._leases)
+            window = self._window
+        text = f"带宽 {format_rate(limit)} ({window})"
+        if limit is not None and active:
+            text += f" · {active} 个下载"
+        return text
@@ -0,0 +1,74 @@
+"""Check the global bandwidth budget with the real yt-dlp against a local HLS server.
+
+Runs the same batch of jobs through DownloadScheduler without a budget and with
+--limit, then prints the aggregate rate and the share each download was given
+(the "🚦" log lines). The aggregate should stay at or just under the budget:
+
+    python benchmarks/bench_bandwidth.py --jobs 3 --fragments 40 --limit 4M --engine subprocess
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bandwidth import format_rate, parse_rate  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler  # noqa: E402
+from fragment_server import start_server  # noqa: E402
+
+_SHARE = re.compile(r"🚦 带宽份额: (.+?) \(")
+
+
+def run(urls, args, limit, base_path: str):
+    settings = {"browser": "none", "engine": args.engine, "interval_seconds": 0, "prefetch_metadata": False,
+                "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                "metrics": {"enabled": False}, "metadata_cache": {"enabled": False}, "cookie_cache": {"enabled": False},
+                "max_workers": args.jobs, "per_host_limit": args.jobs,
+                "bandwidth": {"enabled": limit is not None, "limit": limit, "schedule": []}}
+    shares = []
+
+    def log(msg):
+        match = _SHARE.search(msg)
+        if match:
+            shares.append(match.group(1))
+
+    scheduler = DownloadScheduler(settings, base_path, log)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} jobs did not finish: {failed[:3]}")
+    return elapsed, shares
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=3, help="concurrent downloads")
+    parser.add_argument("--fragments", type=int, default=40)
+    parser.add_argument("--fragment-kb", type=int, default=256)
+    parser.add_argument("--limit", default="4M", help="total budget, yt-dlp --limit-rate syntax")
+    parser.add_argument("--engine", default="subprocess", choices=["subprocess", "inprocess"])
+    args = parser.parse_args()
+
+    server = start_server(0, args.fragments, args.fragment_kb, latency=0.02, bandwidth_kb=0)
+    total_bytes = args.jobs * args.fragments * args.fragment_kb * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        print(f"{args.jobs} jobs x {args.fragments * args.fragment_kb / 1024:.1f} MiB, {args.engine} engine")
+        for label, limit in (("unlimited", None), (f"budget {args.limit}", args.limit)):
+            urls = [f"http://127.0.0.1:{server.server_port}/{label.split()[0]}{i}.m3u8" for i in range(args.jobs)]
+            elapsed, shares = run(urls, args, limit, os.path.join(tmp, label.split()[0]))
+            line = f"{label:>16}: {elapsed:6.2f}s  {format_rate(total_bytes / elapsed):>12} aggregate"
+            if limit is not None:
+                line += f" ({total_bytes / elapsed * 100 / parse_rate(limit):.0f}% of budget), shares: {', '.join(shares)}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
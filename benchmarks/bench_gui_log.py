@@ -0,0 +1,89 @@
+"""Measure GUI responsiveness while a worker thread floods the log.
+
+A background thread pushes --lines log lines (and a progress update per line)
+through UiPipeline as fast as it can, while a 10 ms heartbeat on the Tk main
+loop records how late each tick fires. Needs a display (use xvfb-run on a
+headless box):
+
+    python benchmarks/bench_gui_log.py --lines 100000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from download_gui import UiPipeline  # noqa: E402
+
+HEARTBEAT_MS = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--max-log-lines", type=int, default=5000)
+    parser.add_argument("--frame-budget-ms", type=float, default=12)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise SystemExit(f"No display available ({e}); try: xvfb-run python {sys.argv[0]}")
+    text_area = tk.Text(root)
+    text_area.pack()
+    progress_bar = ttk.Progressbar(root)
+    progress_bar.pack()
+    status_var = tk.StringVar(value="")
+    ui = UiPipeline(root, text_area, progress_bar, status_var, {
+        "max_log_lines": args.max_log_lines,
+        "frame_budget_ms": args.frame_budget_ms,
+        "log_to_file": False,
+    })
+    ui.start()
+
+    gaps = []
+    last_tick = [time.perf_counter()]
+    done = threading.Event()
+    timings = {}
+
+    def heartbeat():
+        now = time.perf_counter()
+        gaps.append((now - last_tick[0]) * 1000 - HEARTBEAT_MS)
+        last_tick[0] = now
+        if not done.is_set():
+            root.after(HEARTBEAT_MS, heartbeat)
+
+    def finished():
+        timings["drained"] = time.perf_counter()
+        done.set()
+        root.after(50, root.quit)
+
+    def producer():
+        line = "[download]  42.0% of  123.45MiB at    5.00MiB/s ETA 00:21 (frag 12/345)\n"
+        timings["start"] = time.perf_counter()
+        for i in range(args.lines):
+            ui.log(line)
+            ui.progress(i * 100 / args.lines)
+        timings["produced"] = time.perf_counter()
+        ui.call_soon(finished)
+
+    root.after(HEARTBEAT_MS, heartbeat)
+    threading.Thread(target=producer, daemon=True).start()
+    root.mainloop()
+
+    gaps.sort()
+    elapsed = timings["drained"] - timings["start"]
+    print(f"lines:            {args.lines}")
+    print(f"drain time:       {elapsed:.2f} s ({args.lines / elapsed:,.0f} lines/s)")
+    print(f"heartbeat delay:  p50 {gaps[len(gaps) // 2]:.1f} ms, p99 {gaps[int(len(gaps) * 0.99)]:.1f} ms, max {gaps[-1]:.1f} ms")
+    print(f"lines on screen:  {int(text_area.index('end-1c').split('.')[0])}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
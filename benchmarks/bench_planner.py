@@ -0,0 +1,71 @@
+"""Check the dry-run planner with the fake yt-dlp and time serial vs. concurrent probes.
+
+A batch of --urls videos and one playlist of --playlist entries is planned
+twice: with planner.workers 1 and with --workers probes at once. Each probed
+entry takes --probe seconds, like a real format lookup. Both plans must
+report every entry at the fake's size and the same totals; the concurrent
+plan should be close to --workers times faster:
+
+    python benchmarks/bench_planner.py --urls 12 --playlist 60 --probe 0.05 --workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from download_planner import plan_batch  # noqa: E402
+
+BASE_SETTINGS = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": True,
+                 "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                 "metrics": {"enabled": False}, "cookie_cache": {"enabled": False}}
+
+
+def run(urls, workers: int, chunk_items: int, base_path: str):
+    """Returns (seconds, plan)"""
+    settings = dict(BASE_SETTINGS, planner={"workers": workers, "chunk_items": chunk_items})
+    start = time.perf_counter()
+    plan = plan_batch(urls, settings, base_path, lambda line: None)
+    return time.perf_counter() - start, plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=12)
+    parser.add_argument("--playlist", type=int, default=60, help="entries in the playlist")
+    parser.add_argument("--probe", type=float, default=0.05, help="seconds the fake spends probing each entry")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-items", type=int, default=10, help="playlist entries per probe")
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_PROBE"] = str(args.probe)
+    os.environ["FAKE_YTDLP_PLAYLIST_COUNT"] = str(args.playlist)
+    size = int(os.environ.setdefault("FAKE_YTDLP_SIZE", str(10 * 1024 * 1024)))
+    urls = [f"https://www.youtube.com/watch?v=pln{i:08d}" for i in range(args.urls)]
+    urls.append("https://www.youtube.com/playlist?list=PLplannercheck")
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        base_path = os.path.join(tmp, "downloads")
+        serial, serial_plan = run(urls, 1, args.chunk_items, base_path)
+        concurrent, plan = run(urls, args.workers, args.chunk_items, base_path)
+
+    entries = args.urls + args.playlist
+    for label, elapsed, result in (("serial", serial, serial_plan), (f"{args.workers} workers", concurrent, plan)):
+        totals = result["totals"]
+        print(f"{label:>10}: {totals['entries']} entries, {totals['bytes'] / 1024 / 1024:.0f} MiB, "
+              f"~{totals['estimated_seconds']}s to download, planned in {elapsed:.2f}s")
+    ok = all(result["totals"]["entries"] == entries and result["totals"]["bytes"] == entries * size
+             and result["totals"]["unknown_size"] == 0 for result in (serial_plan, plan))
+    ok = ok and plan["totals"] == dict(serial_plan["totals"], probe_seconds=plan["totals"]["probe_seconds"])
+    print(f"speedup {serial / concurrent:.1f}x, both plans match the fake's sizes -> {'OK' if ok else 'FAILED'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
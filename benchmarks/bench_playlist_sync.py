@@ -0,0 +1,87 @@
+"""Re-run a large playlist with and without incremental sync.
+
+The download archive already holds the first --items entries and the playlist
+has grown by --new entries. Without sync the fake yt-dlp walks the whole list
+and spends --item-check seconds on every entry before skipping it (a stand-in
+for the real tool's per-item check); with sync only the new entries are handed
+to yt-dlp. A second sync after --new more entries shows the steady state, and
+a third with nothing new shows the "already up to date" cost:
+
+    python benchmarks/bench_playlist_sync.py --items 2000 --new 3 --item-check 0.02 --fanout
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler, get_metadata_cache  # noqa: E402
+
+URL = "https://www.youtube.com/playlist?list=PLsyncbenchmark{}"
+
+
+def _archive_lines(path: str) -> int:
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def run(url: str, count: int, sync: bool, args, archive: str, base_path: str):
+    """Returns (seconds, entries downloaded)"""
+    os.environ["FAKE_YTDLP_PLAYLIST_COUNT"] = str(count)
+    settings = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "cookie_cache": {"enabled": False},
+                "job_store": {"enabled": False}, "rate_limit": {"enabled": False}, "metrics": {"enabled": False},
+                "download_archive": {"enabled": True, "path": archive},
+                "playlist_fanout": {"enabled": args.fanout, "max_workers": 4},
+                "playlist_sync": {"enabled": sync}}
+    # A new day: the cached listing from the previous run is out of date
+    get_metadata_cache(settings).invalidate(url)
+    before = _archive_lines(archive)
+    scheduler = DownloadScheduler(settings, base_path, lambda msg: None)
+    start = time.perf_counter()
+    jobs = scheduler.run([url])
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} jobs did not finish: {failed[:3]}")
+    return elapsed, _archive_lines(archive) - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000, help="entries already downloaded")
+    parser.add_argument("--new", type=int, default=3, help="entries added to the playlist before each sync")
+    parser.add_argument("--item-check", type=float, default=0.02, help="seconds yt-dlp spends skipping one entry")
+    parser.add_argument("--duration", type=float, default=0.2, help="seconds each new entry takes to download")
+    parser.add_argument("--fanout", action="store_true", help="download new entries in parallel")
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    os.environ["FAKE_YTDLP_ITEM_CHECK"] = str(args.item_check)
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        results = []
+        for label, sync in (("full re-walk", False), ("sync", True)):
+            archive = os.path.join(tmp, f"{label.split()[0]}-archive.txt")
+            with open(archive, "w", encoding="utf-8") as f:
+                f.writelines(f"youtube fake{i:07d}\n" for i in range(1, args.items + 1))
+            url = URL.format(label.split()[0])
+            results.append((label, *run(url, args.items + args.new, sync, args, archive, os.path.join(tmp, label))))
+            if sync:
+                results.append(("sync again", *run(url, args.items + 2 * args.new, True, args, archive,
+                                                   os.path.join(tmp, label))))
+                results.append(("sync, no change", *run(url, args.items + 2 * args.new, True, args, archive,
+                                                        os.path.join(tmp, label))))
+    mode = "parallel items" if args.fanout else "one item at a time"
+    print(f"{args.items} entries already downloaded, {args.new} new per run, {args.item_check}s per skipped entry, {mode}")
+    for label, elapsed, downloaded in results:
+        print(f"{label:>16}: {elapsed:6.2f}s  {downloaded} downloaded")
+
+
+if __name__ == "__main__":
+    main()
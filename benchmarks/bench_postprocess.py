@@ -0,0 +1,83 @@
+"""Compare inline post-processing with the separate post-processing pool.
+
+Inline: the fake yt-dlp spends --postprocess seconds "merging" inside the
+download process, as the real tool does with --merge-output-format.
+Pool: the download writes the raw streams and benchmarks/fake_ffmpeg.py spends
+the same time merging them on the post-processing pool, while the download
+workers move on to the next job:
+
+    python benchmarks/bench_postprocess.py --urls 12 --duration 0.5 --postprocess 0.5 --workers 2
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler  # noqa: E402
+
+
+def install_fake_ffmpeg(bin_dir: str) -> None:
+    """Create an executable "ffmpeg" in bin_dir that runs fake_ffmpeg.py (bin_dir is already first on PATH)."""
+    script = os.path.join(ROOT, "benchmarks", "fake_ffmpeg.py")
+    if os.name == "nt":
+        with open(os.path.join(bin_dir, "ffmpeg.bat"), "w") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        wrapper = os.path.join(bin_dir, "ffmpeg")
+        with open(wrapper, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def run(urls, workers: int, pool: bool, base_path: str, args) -> float:
+    os.environ["FAKE_YTDLP_POSTPROCESS"] = "0" if pool else str(args.postprocess)
+    os.environ["FAKE_FFMPEG_SECONDS"] = str(args.postprocess)
+    settings = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": False,
+                "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                "metrics": {"enabled": False}, "max_workers": workers, "per_host_limit": workers,
+                "postprocess_pool": {"enabled": pool, "workers": args.pool_workers, "max_pending": args.max_pending}}
+    scheduler = DownloadScheduler(settings, base_path, lambda msg: None)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} jobs did not finish: {failed[:3]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds each fake download takes")
+    parser.add_argument("--postprocess", type=float, default=0.5, help="seconds each merge/transcode takes")
+    parser.add_argument("--workers", type=int, default=2, help="download workers")
+    parser.add_argument("--pool-workers", type=int, default=2,
+                        help="post-processing workers (0 = CPU count; the fake ffmpeg only sleeps, so any count overlaps)")
+    parser.add_argument("--max-pending", type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        install_fake_ffmpeg(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        inline = run([f"https://www.youtube.com/watch?v=inl{i:08d}" for i in range(args.urls)], args.workers, False,
+                     os.path.join(tmp, "inline"), args)
+        pooled = run([f"https://www.youtube.com/watch?v=poo{i:08d}" for i in range(args.urls)], args.workers, True,
+                     os.path.join(tmp, "pool"), args)
+        merged = os.listdir(os.path.join(tmp, "pool", "videos"))  # .raw is removed once everything is merged
+    print(f"{args.urls} jobs, {args.workers} download workers, {args.duration}s download + {args.postprocess}s post-processing each")
+    print(f"inline post-processing: {inline:6.2f}s")
+    print(f"post-processing pool:   {pooled:6.2f}s  ({inline / pooled:.2f}x, {len(merged)} merged files)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Check the error-classifying retry engine with the fake yt-dlp.
+
+Three kinds of URLs are downloaded in one batch:
+  --transient  fail halfway with "HTTP Error 503" in their first --fail-times attempts
+  --permanent  always fail with "Private video"
+  --ok         succeed
+
+With retries enabled (backoff shortened to --base seconds) every transient job
+must finish after --fail-times + 1 attempts, resuming from its .part file,
+while every permanent job must fail after a single attempt with the failure
+reason "private". The same batch without retries is shown for comparison:
+
+    python benchmarks/bench_retry.py --transient 4 --permanent 2 --ok 4 --fail-times 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler  # noqa: E402
+from retry_policy import DEFAULT_RETRY  # noqa: E402
+
+BASE_SETTINGS = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": True,
+                 "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                 "metrics": {"enabled": False}, "cookie_cache": {"enabled": False}}
+
+
+def run(urls, retry: dict, base_path: str, state_dir: str, workers: int):
+    """Returns (seconds, jobs, log lines)"""
+    os.makedirs(state_dir)
+    os.environ["FAKE_YTDLP_STATE_DIR"] = state_dir
+    lines = []
+    settings = dict(BASE_SETTINGS, max_workers=workers, per_host_limit=workers, retry=retry)
+    scheduler = DownloadScheduler(settings, base_path, lines.append)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    return time.perf_counter() - start, jobs, lines
+
+
+def describe(label: str, elapsed: float, jobs: list) -> str:
+    done = sum(1 for job in jobs if job.state == DownloadJob.DONE)
+    failures = {}
+    for job in jobs:
+        if job.failure is not None:
+            failures[job.failure.category] = failures.get(job.failure.category, 0) + 1
+    return (f"{label:>10}: {done}/{len(jobs)} done, {sum(job.attempts for job in jobs)} attempts, "
+            f"failures {failures or '-'}, {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transient", type=int, default=4)
+    parser.add_argument("--permanent", type=int, default=2)
+    parser.add_argument("--ok", type=int, default=4)
+    parser.add_argument("--fail-times", type=int, default=2, help="failed attempts before a transient URL succeeds")
+    parser.add_argument("--base", type=float, default=0.2, help="first backoff delay in seconds")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=0.4, help="seconds each fake download takes")
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    os.environ["FAKE_YTDLP_FAIL_RULES"] = json.dumps([
+        {"match": "tra$", "message": "unable to download video data: HTTP Error 503: Service Unavailable",
+         "times": args.fail_times},
+        {"match": "prv$", "message": "Private video. Sign in if you've been granted access to this video"},
+    ])
+    # The fake names its files after the last five characters of the URL
+    urls = ([f"https://www.youtube.com/watch?v={i:08d}tra" for i in range(args.transient)]
+            + [f"https://www.youtube.com/watch?v={i:08d}prv" for i in range(args.permanent)]
+            + [f"https://www.youtube.com/watch?v={i:08d}oks" for i in range(args.ok)])
+    policies = {category: dict(policy, base_seconds=args.base, max_seconds=args.base * 8)
+                for category, policy in DEFAULT_RETRY["policies"].items()}
+    policies["server_error"]["max_attempts"] = max(policies["server_error"]["max_attempts"], args.fail_times + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        without = run(urls, {"enabled": False}, os.path.join(tmp, "without"), os.path.join(tmp, "state-without"),
+                      args.workers)
+        elapsed, jobs, lines = run(urls, {"enabled": True, "policies": policies}, os.path.join(tmp, "with"),
+                                   os.path.join(tmp, "state-with"), args.workers)
+
+    print(describe("no retry", *without[:2]))
+    print(describe("retry", elapsed, jobs))
+    resumed = sum(1 for line in lines if "Resuming download at byte" in line)
+    transient = [job for job in jobs if job.url.endswith("tra")]
+    permanent = [job for job in jobs if job.url.endswith("prv")]
+    ok = (all(job.state == DownloadJob.DONE and job.attempts == args.fail_times + 1 for job in transient)
+          and all(job.state == DownloadJob.FAILED and job.attempts == 1 and job.failure.category == "private"
+                  for job in permanent)
+          and resumed == len(transient) * args.fail_times)
+    print(f"transient jobs retried and finished, permanent jobs failed at once, {resumed} attempts resumed "
+          f"from .part -> {'OK' if ok else 'FAILED'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
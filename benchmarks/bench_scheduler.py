@@ -0,0 +1,70 @@
+"""Show that DownloadScheduler throughput scales with the worker count.
+
+Puts benchmarks/fake_yt_dlp.py on PATH as "yt-dlp" and runs the same batch
+of URLs with different worker counts:
+
+    python benchmarks/bench_scheduler.py --urls 16 --duration 0.5 --workers 1 2 4 8
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from download_logic import DownloadScheduler, DownloadJob  # noqa: E402
+
+
+def install_fake_ytdlp(bin_dir: str) -> None:
+    """Create an executable "yt-dlp" in bin_dir that runs fake_yt_dlp.py, and put it first on PATH."""
+    script = os.path.join(ROOT, "benchmarks", "fake_yt_dlp.py")
+    if os.name == "nt":
+        with open(os.path.join(bin_dir, "yt-dlp.bat"), "w") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        wrapper = os.path.join(bin_dir, "yt-dlp")
+        with open(wrapper, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+def run_batch(urls, workers: int, base_path: str) -> float:
+    # Every worker count downloads the same URLs: no archive to skip them, no job store in the real app directory
+    settings = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "max_workers": workers, "per_host_limit": workers,
+                "download_archive": {"enabled": False}, "job_store": {"enabled": False}}
+    scheduler = DownloadScheduler(settings, base_path, lambda msg: None)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} fake jobs did not finish: {failed[:3]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=16, help="number of URLs in the batch")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds each fake download takes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    urls = [f"https://www.youtube.com/watch?v=fake{i:05d}" for i in range(args.urls)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        print(f"{'workers':>8} {'seconds':>9} {'urls/s':>8} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            elapsed = run_batch(urls, workers, os.path.join(tmp, "downloads"))
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {len(urls) / elapsed:>8.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Open hundreds of progress streams against download_server.py on localhost.
+
+Starts the server with benchmarks/fake_yt_dlp.py as "yt-dlp", submits a batch
+of jobs over HTTP, follows every job with several SSE or NDJSON streams and
+reports how many events arrived, how long the batch took and how many threads
+the server used (the streams share one event loop, so the thread count stays
+at the number of download workers):
+
+    python benchmarks/bench_server_streams.py --jobs 20 --streams 500 --format sse
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+
+
+async def request(port: int, method: str, path: str, payload=None) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+async def follow(port: int, job_id: int, fmt: str) -> tuple:
+    """Read one job's stream until the server closes it; returns (events, final state)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /jobs/{job_id}/events?format={fmt} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    events, state = 0, None
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        line = line.strip()
+        if fmt == "sse" and line.startswith(b"data: "):
+            line = line[len(b"data: "):]
+        if line.startswith(b"{"):
+            events += 1
+            state = json.loads(line)["state"]
+    writer.close()
+    return events, state
+
+
+async def run(args, port: int) -> None:
+    for _ in range(100):
+        try:
+            await request(port, "GET", "/health")
+            break
+        except OSError:
+            await asyncio.sleep(0.1)
+
+    urls = [f"https://www.youtube.com/watch?v=srv{i:08d}" for i in range(args.jobs)]
+    start = time.perf_counter()
+    jobs = (await request(port, "POST", "/jobs", {"urls": urls}))["jobs"]
+    followers = [asyncio.create_task(follow(port, jobs[i % len(jobs)]["id"], args.format)) for i in range(args.streams)]
+    await asyncio.sleep(0.5)
+    health = await request(port, "GET", "/health")
+    results = await asyncio.gather(*followers)
+    elapsed = time.perf_counter() - start
+
+    states = {}
+    for _, state in results:
+        states[state] = states.get(state, 0) + 1
+    print(f"jobs={args.jobs} streams={args.streams} format={args.format}")
+    print(f"open streams seen by server: {health['streams']}, server threads: {health['threads']}")
+    print(f"events received: {sum(events for events, _ in results)} in {elapsed:.2f}s, final states: {states}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds each fake download takes")
+    parser.add_argument("--format", choices=["sse", "ndjson"], default="sse")
+    parser.add_argument("--port", type=int, default=18756)
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        settings_path = os.path.join(tmp, "settings.json")
+        with open(settings_path, "w") as f:
+            json.dump({"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": False,
+                       "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                       "max_workers": args.workers, "per_host_limit": args.workers}, f)
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "download_server.py"), "-q",
+                                   "--port", str(args.port), "--settings", settings_path,
+                                   "--app-dir", tmp, "-o", os.path.join(tmp, "downloads")])
+        try:
+            asyncio.run(run(args, args.port))
+        finally:
+            server.terminate()
+            server.wait(30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Check the staging directory and the free-space admission check with the fake yt-dlp.
+
+Staging: a batch of videos and a playlist are downloaded through a staging
+directory; afterwards every finished file must be in videos/ or playlists/,
+no .part file may be there, and the staging directory must be empty.
+
+Admission: the fake writes the full size of each download, and min_free_mb is
+raised so that the free space of the temporary disk only fits --fit jobs of
+--job-mb each (with size_margin 1). Finished files are deleted, as if another
+program moved them away. The batch must finish without failures while never
+running more than --fit jobs at once:
+
+    python benchmarks/bench_staging.py --urls 6 --workers 4 --fit 2 --job-mb 256
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler  # noqa: E402
+
+BASE_SETTINGS = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": True,
+                 "download_archive": {"enabled": False}, "job_store": {"enabled": False}, "rate_limit": {"enabled": False},
+                 "metrics": {"enabled": False}, "cookie_cache": {"enabled": False}}
+
+
+def run(urls, settings: dict, base_path: str, consume: bool = False):
+    """Returns (seconds, highest number of jobs running at once, log lines); consume deletes finished videos"""
+    lock = threading.Lock()
+    running = set()
+    peak = [0]
+    lines = []
+
+    def on_update(job):
+        with lock:
+            if job.state == DownloadJob.RUNNING:
+                running.add(job.index)
+            else:
+                running.discard(job.index)
+            peak[0] = max(peak[0], len(running))
+        if consume and job.state == DownloadJob.DONE:
+            folder = os.path.join(base_path, "videos")
+            for name in os.listdir(folder):
+                if not name.endswith(".part"):
+                    os.remove(os.path.join(folder, name))
+
+    scheduler = DownloadScheduler(settings, base_path, lines.append, on_job_update=on_update)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} jobs did not finish: {failed[:3]}")
+    return elapsed, peak[0], lines
+
+
+def check_staging(args, tmp: str) -> bool:
+    staging_dir = os.path.join(tmp, "staging")
+    base_path = os.path.join(tmp, "staged")
+    settings = dict(BASE_SETTINGS, max_workers=args.workers, per_host_limit=args.workers,
+                    staging={"enabled": True, "directory": staging_dir})
+    urls = [f"https://www.youtube.com/watch?v=stg{i:08d}" for i in range(args.urls)]
+    urls.append("https://www.youtube.com/playlist?list=PLstagingcheck")
+    elapsed, _, _ = run(urls, settings, base_path)
+    finished = [os.path.relpath(os.path.join(folder, name), base_path)
+                for folder, _, names in os.walk(base_path) for name in names]
+    partial = [name for name in finished if name.endswith(".part")]
+    left = [os.path.join(folder, name) for folder, _, names in os.walk(staging_dir) for name in names]
+    expected = args.urls + int(os.environ["FAKE_YTDLP_PLAYLIST_COUNT"])
+    ok = len(finished) == expected and not partial and not left
+    print(f"staging: {len(finished)}/{expected} files finalized, {len(partial)} .part in the destination, "
+          f"{len(left)} files left in staging, {elapsed:.2f}s -> {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_admission(args, tmp: str) -> bool:
+    base_path = os.path.join(tmp, "admitted")
+    os.makedirs(base_path)
+    job_bytes = args.job_mb * 1024 * 1024
+    os.environ["FAKE_YTDLP_SIZE"] = str(job_bytes)
+    os.environ["FAKE_YTDLP_WRITE_SIZE"] = "1"  # free space must shrink as the downloads progress
+    # Leave room for --fit jobs plus half of another one
+    min_free_mb = (shutil.disk_usage(base_path).free - job_bytes * (args.fit + 0.5)) / 1024 / 1024
+    if min_free_mb <= 0:
+        print(f"admission: skipped, the temporary disk has less than {args.fit + 0.5:.1f} x {args.job_mb} MiB free")
+        return True
+    settings = dict(BASE_SETTINGS, max_workers=args.workers, per_host_limit=args.workers,
+                    disk_admission={"enabled": True, "size_margin": 1.0, "min_free_mb": min_free_mb,
+                                    "recheck_seconds": 1})
+    urls = [f"https://www.youtube.com/watch?v=adm{i:08d}" for i in range(args.urls)]
+    elapsed, peak, lines = run(urls, settings, base_path, consume=True)
+    waits = sum(1 for line in lines if "磁盘空间不足" in line)
+    ok = peak <= args.fit
+    print(f"admission: {args.urls} jobs of {args.job_mb} MiB, {args.workers} workers, room for {args.fit}: "
+          f"at most {peak} running at once, {waits} waited for space, {elapsed:.2f}s -> {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--fit", type=int, default=2, help="jobs the free space should hold at once")
+    parser.add_argument("--job-mb", type=int, default=256, help="estimated size of each job (filesize_approx)")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds each fake download takes")
+    args = parser.parse_args()
+
+    os.environ["FAKE_YTDLP_DURATION"] = str(args.duration)
+    os.environ.setdefault("FAKE_YTDLP_PLAYLIST_COUNT", "3")
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        ok = check_staging(args, tmp)
+        ok = check_admission(args, tmp) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
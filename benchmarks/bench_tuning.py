@@ -0,0 +1,72 @@
+"""Compare download tuning profiles with the real yt-dlp against a local HLS server.
+
+Starts benchmarks/fragment_server.py (per-request latency, per-connection
+bandwidth cap), downloads the same playlist once per profile with the command
+download_logic builds, then lets DownloadTuner auto-select a profile the way
+the scheduler does on the first jobs of a site:
+
+    python benchmarks/bench_tuning.py --fragments 40 --fragment-kb 256 --latency 0.1 --bandwidth 512
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from download_logic import _video_command, url_host  # noqa: E402
+from download_tuning import DownloadTuner, profile_name  # noqa: E402
+from fragment_server import start_server  # noqa: E402
+
+
+def download(url: str, profile: dict, out_dir: str) -> float:
+    """Download url with the given profile; returns the wall time in seconds."""
+    settings = {"browser": "none", "download_archive": {"enabled": False}}
+    command = _video_command(url, settings, os.path.join(out_dir, f"{time.monotonic_ns()}.%(ext)s"), tuning=profile)
+    command[1:1] = ["--ignore-config", "--no-part", "--quiet"]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"yt-dlp failed for {profile_name(profile)}:\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fragments", type=int, default=40)
+    parser.add_argument("--fragment-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--bandwidth", type=float, default=512, help="KiB/s per connection")
+    parser.add_argument("--samples", type=int, default=1, help="auto-tune samples per candidate")
+    args = parser.parse_args()
+
+    server = start_server(0, args.fragments, args.fragment_kb, args.latency, args.bandwidth)
+    url = f"http://127.0.0.1:{server.server_port}/master.m3u8"
+    total_bytes = args.fragments * args.fragment_kb * 1024
+    tuner = DownloadTuner({"auto_tune": True, "samples_per_candidate": args.samples, "min_sample_mb": 0})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'profile':>12} {'seconds':>9} {'MiB/s':>8} {'speedup':>8}")
+        baseline = None
+        for profile in tuner.candidates():
+            elapsed = download(url, profile, tmp)
+            baseline = baseline or elapsed
+            print(f"{profile_name(profile):>12} {elapsed:>9.2f} {total_bytes / elapsed / 1024 / 1024:>8.2f} {baseline / elapsed:>7.2f}x")
+
+        site = url_host(url)
+        while True:
+            profile = tuner.choose(site)
+            if tuner.describe(site).startswith(f"{site}: {profile_name(profile)}"):
+                break
+            tuner.record(site, profile, total_bytes, download(url, profile, tmp), lambda msg: print(msg, end=""))
+        print(f"auto-tune picked {profile_name(profile)}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
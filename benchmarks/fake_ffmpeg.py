@@ -0,0 +1,27 @@
+"""A stand-in for ffmpeg used by the post-processing benchmark.
+
+Sleeps FAKE_FFMPEG_SECONDS (default 1.0) to stand for a merge or transcode,
+then writes the concatenated inputs to the output file (the last argument).
+"""
+import os
+import sys
+import time
+
+
+def main(argv):
+    inputs = [argv[i + 1] for i, arg in enumerate(argv[:-1]) if arg == "-i"]
+    output = argv[-1]
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_SECONDS", "1.0")))
+    try:
+        with open(output, "wb") as out:
+            for path in inputs:
+                with open(path, "rb") as f:
+                    out.write(f.read())
+    except OSError as e:
+        print(f"fake ffmpeg: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,269 @@
+"""A stand-in for yt-dlp that needs no network.
+
+It prints the same kind of "[download]  42.0% ..." lines as the real tool and
+sleeps between them, so the download pipeline can be timed offline.
+
+Behaviour is controlled through environment variables:
+    FAKE_YTDLP_DURATION  seconds one download takes (default 1.0)
+    FAKE_YTDLP_STEPS     number of progress lines per download (default 20)
+    FAKE_YTDLP_PLAYLIST_COUNT  entries reported for playlist URLs (default 3)
+    FAKE_YTDLP_FAIL_RATE  probability that a download fails halfway (default 0)
+    FAKE_YTDLP_FAIL_MATCH  regular expression; matching URLs always fail halfway
+    FAKE_YTDLP_STARTUP   seconds spent "extracting" before the first progress line (default 0)
+    FAKE_YTDLP_SIZE      bytes per download (default 10 MiB)
+    FAKE_YTDLP_POSTPROCESS  seconds of "[Merger]" post-processing after each download (default 0)
+    FAKE_YTDLP_ITEM_CHECK  seconds spent on each item before it is skipped as already downloaded (default 0)
+    FAKE_YTDLP_WRITE_SIZE  "1" writes FAKE_YTDLP_SIZE bytes to disk as the download progresses (default: 1 KiB)
+    FAKE_YTDLP_PROBE     seconds spent resolving the formats of each entry in probe mode (default 0)
+    FAKE_YTDLP_FAIL_RULES  JSON list of {"match": regex, "message": text, "times": n}; matching URLs fail
+                           halfway with "ERROR: [youtube] <id>: <message>", only in their first n attempts
+                           when "times" is given (attempts are counted in FAKE_YTDLP_STATE_DIR)
+
+Playlist URLs (containing "list=") download every entry in turn and print the
+"[download] Downloading item N of M" markers the real tool prints. Each download
+is written as a small "<destination>.part" file that is renamed when it finishes
+(a failed download leaves the .part behind, and the next attempt resumes from
+it). With "--print after_move:..."
+(post-processing pool mode) there is one video-only and one audio-only stream
+when the format selector downloads them separately ("bestvideo,bestaudio"). "--playlist-items"
+selects entries by position, and "--download-archive" skips recorded entries
+and records finished ones, like the real tool. "--print TEMPLATE" without
+"after_move:" only resolves the formats and prints one line per entry (probe
+mode, as used by the dry-run planner); failures go to stderr there.
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+
+_TEMPLATE_FIELD = re.compile(r"%\((\w+)\.(\w+)(?:\|([^)]*))?\)([sdj])")
+_DICT_FIELD = re.compile(r"%\(\.\{([\w,]+)\}\)j")
+
+COMBINED_FORMAT = {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2"}
+VIDEO_FORMAT = {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none"}
+AUDIO_FORMAT = {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2"}
+
+
+def render_template(template: str, fields: dict) -> str:
+    """Enough of yt-dlp's --progress-template syntax for %(progress.x|default)j style fields."""
+    def replace(match):
+        group, name, default, conversion = match.groups()
+        value = fields.get(group, {}).get(name)
+        if value is None:
+            return default if default is not None else "NA"
+        return json.dumps(value) if conversion == "j" else str(value)
+    return _TEMPLATE_FIELD.sub(replace, template)
+
+
+def _size() -> int:
+    return int(os.environ.get("FAKE_YTDLP_SIZE", str(10 * 1024 * 1024)))
+
+
+def fake_metadata(url: str) -> dict:
+    """Metadata shaped like yt-dlp's --dump-single-json --flat-playlist output."""
+    if "list=" in url:
+        count = int(os.environ.get("FAKE_YTDLP_PLAYLIST_COUNT", "3"))
+        entries = [{"id": f"fake{i:07d}", "ie_key": "Youtube", "title": f"Fake Item {i}", "filesize_approx": _size(),
+                    "url": f"https://www.youtube.com/watch?v=fake{i:07d}"} for i in range(1, count + 1)]
+        return {"id": url.split("list=")[-1], "title": "Fake Playlist", "playlist_count": count,
+                "entries": entries, "original_url": url, "webpage_url": url}
+    return {"id": url.rsplit("=", 1)[-1][-11:], "extractor_key": "Youtube", "title": f"Fake Video {url[-5:]}",
+            "filesize_approx": _size(), "original_url": url, "webpage_url": url}
+
+
+def main(argv):
+    duration = float(os.environ.get("FAKE_YTDLP_DURATION", "1.0"))
+    steps = max(1, int(os.environ.get("FAKE_YTDLP_STEPS", "20")))
+    # Options such as --download-archive may follow the URL
+    url = next((arg for arg in reversed(argv) if arg.startswith(("http://", "https://"))), argv[-1] if argv else "")
+
+    if "--version" in argv:
+        print("2099.01.01-fake")
+        return 0
+
+    if "--dump-single-json" in argv:
+        urls = [url]
+        if "--batch-file" in argv:
+            batch_file = argv[argv.index("--batch-file") + 1]
+            stream = sys.stdin if batch_file == "-" else open(batch_file, encoding="utf-8")
+            urls = [line.strip() for line in stream if line.strip()]
+        for url in urls:
+            print(json.dumps(fake_metadata(url)), flush=True)
+        return 0
+
+    for i, arg in enumerate(argv[:-1]):
+        if arg == "--print" and not argv[i + 1].startswith("after_move:"):
+            return fake_probe(url, argv, argv[i + 1])
+
+    download_template = None
+    for i, arg in enumerate(argv[:-1]):
+        if arg == "--progress-template" and argv[i + 1].startswith("download:"):
+            download_template = argv[i + 1][len("download:"):]
+
+    after_move = None
+    for i, arg in enumerate(argv[:-1]):
+        if arg == "--print" and argv[i + 1].startswith("after_move:"):
+            after_move = argv[i + 1][len("after_move:"):]
+    format_spec = argv[argv.index("-f") + 1] if "-f" in argv else "best"
+    if "," in format_spec:
+        formats = [VIDEO_FORMAT, AUDIO_FORMAT]
+    elif format_spec.startswith("bestaudio") and after_move:
+        formats = [AUDIO_FORMAT]
+    else:
+        formats = [COMBINED_FORMAT]
+
+    info = fake_metadata(url)
+    output = argv[argv.index("-o") + 1] if "-o" in argv else "%(title)s.%(ext)s"
+    print(f"[youtube] Extracting URL: {url}", flush=True)
+    time.sleep(float(os.environ.get("FAKE_YTDLP_STARTUP", "0")))
+    fail_pattern = os.environ.get("FAKE_YTDLP_FAIL_MATCH")
+    always_fail = bool(fail_pattern and re.search(fail_pattern, url))
+    fail_message = "fake failure"
+    rule = failure_rule(url)
+    if rule is not None:
+        always_fail, fail_message = True, rule.get("message", fail_message)
+    entries = info.get("entries")
+    if entries is None:
+        entries, playlist = [info], False
+    else:
+        playlist = True
+        if "--playlist-items" in argv:
+            positions = parse_playlist_items(argv[argv.index("--playlist-items") + 1])
+            entries = [entry for position, entry in enumerate(entries, 1) if position in positions]
+    archive_path = argv[argv.index("--download-archive") + 1] if "--download-archive" in argv else None
+    recorded = set()
+    if archive_path and os.path.exists(archive_path):
+        with open(archive_path, encoding="utf-8") as f:
+            recorded = {line.strip() for line in f}
+    item_check = float(os.environ.get("FAKE_YTDLP_ITEM_CHECK", "0"))
+    for index, entry in enumerate(entries, 1):
+        if playlist:
+            print(f"[download] Downloading item {index} of {len(entries)}", flush=True)
+            entry = dict(entry, playlist_index=index, n_entries=len(entries))
+        key = f"{(entry.get('ie_key') or entry.get('extractor_key')).lower()} {entry['id']}"
+        if key in recorded:
+            time.sleep(item_check)
+            print(f"[download] {entry['id']}: has already been recorded in the archive", flush=True)
+            continue
+        for fmt in formats:
+            code = fake_download(dict(entry, **fmt), output, duration / len(formats), steps, download_template,
+                                 always_fail, after_move, _size() // len(formats), fail_message)
+            if code:
+                return code
+        if archive_path:
+            with open(archive_path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+    return 0
+
+
+def fake_probe(url: str, argv, template: str) -> int:
+    """Resolve formats without downloading: one rendered template line per entry."""
+    time.sleep(float(os.environ.get("FAKE_YTDLP_STARTUP", "0")))
+    format_spec = argv[argv.index("-f") + 1] if "-f" in argv else "best"
+    height = re.search(r"height<=(\d+)", format_spec)
+    height = min(1080, int(height.group(1))) if height else 1080
+    if "+" in format_spec:
+        fmt = {"format_id": f"{VIDEO_FORMAT['format_id']}+{AUDIO_FORMAT['format_id']}", "ext": "mp4",
+               "resolution": f"{height * 16 // 9}x{height}"}
+    elif format_spec.startswith("bestaudio"):
+        fmt = {"format_id": AUDIO_FORMAT["format_id"], "ext": "m4a", "resolution": "audio only"}
+    else:
+        fmt = dict(COMBINED_FORMAT, resolution="640x360")
+    info = fake_metadata(url)
+    entries = info.get("entries")
+    positions = range(1, len(entries) + 1) if entries is not None else [None]
+    if entries is not None and "--playlist-items" in argv:
+        wanted = parse_playlist_items(argv[argv.index("--playlist-items") + 1])
+        positions = [position for position in positions if position in wanted]
+    code = 0
+    for position in positions:
+        entry = info if position is None else dict(entries[position - 1], playlist_index=position)
+        time.sleep(float(os.environ.get("FAKE_YTDLP_PROBE", "0")))
+        rule = failure_rule(entry.get("url") or url)
+        if rule is not None:
+            print(f"ERROR: [youtube] {entry['id']}: {rule.get('message', 'fake failure')}", file=sys.stderr, flush=True)
+            code = 1
+            continue
+        size = _size()
+        fields = dict(entry, **fmt, duration=60, filesize_approx=size, tbr=round(size * 8 / 60 / 1000, 1),
+                      extractor_key=entry.get("extractor_key") or entry.get("ie_key"))
+        print(_DICT_FIELD.sub(lambda m: json.dumps({key: fields.get(key) for key in m.group(1).split(",")}), template),
+              flush=True)
+    return code
+
+
+def failure_rule(url: str):
+    """The first FAKE_YTDLP_FAIL_RULES entry matching url that still fails this attempt, or None."""
+    for rule in json.loads(os.environ.get("FAKE_YTDLP_FAIL_RULES") or "[]"):
+        if not re.search(rule["match"], url):
+            continue
+        if "times" not in rule:
+            return rule
+        counter = os.path.join(os.environ["FAKE_YTDLP_STATE_DIR"], re.sub(r"\W", "_", url))
+        attempts = os.path.getsize(counter) if os.path.exists(counter) else 0
+        with open(counter, "ab") as f:
+            f.write(b".")
+        return rule if attempts < int(rule["times"]) else None
+    return None
+
+
+def parse_playlist_items(spec: str) -> set:
+    """1-based positions from a "1,4-6,9" style --playlist-items value."""
+    positions = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        positions.update(range(int(first), int(last or first) + 1))
+    return positions
+
+
+def fake_download(info: dict, output: str, duration: float, steps: int, download_template, always_fail: bool,
+                  after_move=None, total: int = None, fail_message: str = "fake failure") -> int:
+    total = total or _size()
+    destination = output
+    for field in ("title", "ext", "format_id", "id"):
+        destination = destination.replace(f"%({field})s", str(info[field]))
+    print(f"[download] Destination: {destination}", flush=True)
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    # The .part holds a 1 KiB header plus step_bytes per finished step, so a later attempt can resume
+    step_bytes = max(1, total // steps) if os.environ.get("FAKE_YTDLP_WRITE_SIZE") == "1" else 1
+    done = 0
+    if os.path.exists(destination + ".part"):
+        done = min(steps - 1, max(0, os.path.getsize(destination + ".part") - 1024) // step_bytes)
+    if done:
+        print(f"[download] Resuming download at byte {done * total // steps}", flush=True)
+    else:
+        with open(destination + ".part", "wb") as f:
+            f.write(os.urandom(1024))
+    failing = always_fail or random.random() < float(os.environ.get("FAKE_YTDLP_FAIL_RATE", "0"))
+    fail_at = done + max(1, (steps - done) // 2) if failing else None
+    size_text = f"{total / 1024 / 1024:.2f}MiB"
+    for i in range(done + 1, steps + 1):
+        if duration:
+            time.sleep(duration / steps)
+        with open(destination + ".part", "ab") as f:
+            f.write(bytes(step_bytes))
+        if i == fail_at:
+            print(f"ERROR: [youtube] {info['id']}: {fail_message}", flush=True)
+            return 1
+        if download_template:
+            progress = {"status": "downloading" if i < steps else "finished", "downloaded_bytes": total * i // steps,
+                        "total_bytes": total, "speed": total / (duration or 1), "eta": duration * (steps - i) / steps}
+            fields = {"progress": progress, "info": {key: info.get(key) for key in ("playlist_index", "n_entries")}}
+            print(render_template(download_template, fields), flush=True)
+        else:
+            print(f"[download]  {i * 100 / steps:5.1f}% of {size_text:>10} at    5.00MiB/s ETA 00:01", flush=True)
+    postprocess = float(os.environ.get("FAKE_YTDLP_POSTPROCESS", "0"))
+    if postprocess:
+        print(f'[Merger] Merging formats into "{destination}"', flush=True)
+        time.sleep(postprocess)
+    os.replace(destination + ".part", destination)
+    if after_move:
+        fields = dict(info, filepath=os.path.abspath(destination),
+                      extractor_key=info.get("extractor_key") or info.get("ie_key"))
+        print(_DICT_FIELD.sub(lambda m: json.dumps({key: fields.get(key) for key in m.group(1).split(",")}), after_move), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""Local HLS test server for measuring fragment concurrency.
+
+Serves a master playlist (one 720p variant) and a media playlist of
+--fragments segments. Every request waits --latency seconds before the first
+byte and each connection is capped at --bandwidth KiB/s, which is roughly how
+a CDN treats a single stream; parallel fragment requests therefore finish
+sooner, just like on a real site:
+
+    python benchmarks/fragment_server.py --port 18900 --fragments 40 --latency 0.1 --bandwidth 512
+
+The playlist is at http://127.0.0.1:18900/master.m3u8
+"""
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FragmentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        if path == "/media.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+            for i in range(server.fragments):
+                lines += ["#EXTINF:4.0,", f"seg{i:05d}.ts"]
+            lines.append("#EXT-X-ENDLIST")
+            self._send(("\n".join(lines) + "\n").encode(), "application/vnd.apple.mpegurl")
+        elif path.endswith(".m3u8"):
+            # Any other name is a master playlist, so several jobs can download under different titles
+            body = ("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720\nmedia.m3u8\n").encode()
+            self._send(body, "application/vnd.apple.mpegurl")
+        elif path.startswith("/seg") and path.endswith(".ts"):
+            with server.stats_lock:
+                server.requests += 1
+            time.sleep(server.latency)
+            self._send(server.payload, "video/mp2t", throttle=True)
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str, throttle: bool = False):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        chunk = 16 * 1024
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            if throttle and self.server.bandwidth:
+                time.sleep(chunk / self.server.bandwidth)
+
+
+def start_server(port: int = 0, fragments: int = 40, fragment_kb: int = 256, latency: float = 0.1, bandwidth_kb: float = 512):
+    """Start the server on a background thread; returns it (server.server_port holds the port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FragmentHandler)
+    server.daemon_threads = True
+    server.fragments = fragments
+    server.payload = os.urandom(fragment_kb * 1024)
+    server.latency = latency
+    server.bandwidth = bandwidth_kb * 1024
+    server.requests = 0
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--fragments", type=int, default=40)
+    parser.add_argument("--fragment-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds before the first byte of each fragment")
+    parser.add_argument("--bandwidth", type=float, default=512, help="KiB/s per connection (0 = unlimited)")
+    args = parser.parse_args()
+    server = start_server(args.port, args.fragments, args.fragment_kb, args.latency, args.bandwidth)
+    print(f"serving http://127.0.0.1:{server.server_port}/master.m3u8 (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
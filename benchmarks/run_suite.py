@@ -0,0 +1,258 @@
+"""Offline benchmark suite for the download pipeline.
+
+Puts benchmarks/fake_yt_dlp.py on PATH as "yt-dlp" (no network needed) and
+measures:
+
+    url_overhead   milliseconds handle_url adds on top of the bare yt-dlp process
+    parsing        progress lines per second through SubprocessEngine and the
+                   progress tracker, for --progress-template JSON and legacy text
+    batch          DownloadScheduler wall-clock time at several worker counts
+    memory         Python heap growth over repeated batches (tracemalloc)
+    normalize      URL normalization and duplicate collapsing of a large pasted batch
+
+Results are written as JSON so runs can be compared:
+
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --output after.json --compare before.json
+    python benchmarks/run_suite.py --quick --only parsing batch
+
+The GUI log benchmark needs a display and is run separately (bench_gui_log.py).
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import install_fake_ytdlp  # noqa: E402
+from fake_yt_dlp import render_template  # noqa: E402
+from url_corpus import bench_dedupe  # noqa: E402
+from download_engines import DOWNLOAD_PROGRESS_TEMPLATE, ProgressCoalescer, SubprocessEngine  # noqa: E402
+from download_logic import DownloadJob, DownloadScheduler, _ProgressTracker, handle_url  # noqa: E402
+
+SUITE_VERSION = 1
+
+# Everything that would touch the network or persist state between runs is off
+BASE_SETTINGS = {"browser": "none", "engine": "subprocess", "interval_seconds": 0, "prefetch_metadata": False,
+                 "download_archive": {"enabled": False}, "job_store": {"enabled": False},
+                 "rate_limit": {"enabled": False}, "cookie_cache": {"enabled": False}}
+
+# Prints a file to stdout; the trailing --progress-template keeps SubprocessEngine from adding its own
+_CAT = "import sys; sys.stdout.write(open(sys.argv[1], encoding='utf-8').read())"
+
+
+class _NullStatus:
+    def set(self, value):
+        pass
+
+    def get(self):
+        return ""
+
+
+def _fake_env(duration: float, steps: int, size: int = None):
+    os.environ["FAKE_YTDLP_DURATION"] = str(duration)
+    os.environ["FAKE_YTDLP_STEPS"] = str(steps)
+    if size:
+        os.environ["FAKE_YTDLP_SIZE"] = str(size)
+
+
+def bench_url_overhead(args, tmp: str) -> dict:
+    """handle_url versus running the fake yt-dlp directly, both with instant downloads"""
+    _fake_env(0, 1)
+    urls = [f"https://www.youtube.com/watch?v=ovh{i:08d}" for i in range(args.urls)]
+    start = time.perf_counter()
+    for url in urls:
+        subprocess.run(["yt-dlp", "--newline", "-o", os.path.join(tmp, "raw.%(ext)s"), url], capture_output=True)
+    raw = (time.perf_counter() - start) / len(urls)
+
+    settings = dict(BASE_SETTINGS)
+    start = time.perf_counter()
+    for url in urls:
+        if not handle_url(url, settings, os.path.join(tmp, "overhead"), lambda msg: None, threading.Event(), _NullStatus(), lambda p: None):
+            raise SystemExit(f"handle_url failed for {url}")
+    handled = (time.perf_counter() - start) / len(urls)
+    return {"urls": len(urls), "raw_process_ms": raw * 1000, "handle_url_ms": handled * 1000,
+            "overhead_ms": (handled - raw) * 1000}
+
+
+def _progress_lines(count: int, template: bool) -> list:
+    """count progress lines of a playlist with 10 items, with log lines mixed in like real output"""
+    total = 50 * 1024 * 1024
+    per_item = max(1, count // 10)
+    lines = []
+    for item in range(1, 11):
+        lines.append(f"[download] Downloading item {item} of 10")
+        lines.append(f"[download] Destination: Item {item}.mp4")
+        for step in range(1, per_item + 1):
+            done = total * step // per_item
+            if template:
+                progress = {"status": "downloading" if step < per_item else "finished", "downloaded_bytes": done,
+                            "total_bytes": total, "speed": 5e6, "eta": 3, "fragment_index": step, "fragment_count": per_item}
+                lines.append(render_template(DOWNLOAD_PROGRESS_TEMPLATE[len("download:"):],
+                                             {"progress": progress, "info": {"playlist_index": item, "n_entries": 10}}))
+            else:
+                lines.append(f"[download]  {done * 100 / total:5.1f}% of   50.00MiB at    5.00MiB/s ETA 00:03")
+    return lines
+
+
+def bench_parsing(args, tmp: str) -> dict:
+    """Lines per second from a pipe through SubprocessEngine, ProgressCoalescer and _ProgressTracker"""
+    results = {}
+    for name, template in (("template", True), ("legacy", False)):
+        lines = _progress_lines(args.lines, template)
+        path = os.path.join(tmp, f"progress-{name}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        tracker = ProgressCoalescer(_ProgressTracker(_NullStatus(), lambda p: None, True, 10))
+        command = [sys.executable, "-c", _CAT, path, "--progress-template", "-"]
+        start = time.perf_counter()
+        SubprocessEngine().run(command, lambda msg: None, threading.Event(), tracker)
+        tracker.flush()
+        elapsed = time.perf_counter() - start
+        results[f"{name}_lines"] = len(lines)
+        results[f"{name}_lines_per_s"] = len(lines) / elapsed
+    return results
+
+
+def _run_batch(urls, workers: int, base_path: str) -> float:
+    settings = dict(BASE_SETTINGS, max_workers=workers, per_host_limit=workers)
+    scheduler = DownloadScheduler(settings, base_path, lambda msg: None)
+    start = time.perf_counter()
+    jobs = scheduler.run(urls)
+    elapsed = time.perf_counter() - start
+    failed = [job for job in jobs if job.state != DownloadJob.DONE]
+    if failed:
+        raise SystemExit(f"{len(failed)} fake jobs did not finish: {failed[:3]}")
+    return elapsed
+
+
+def bench_batch(args, tmp: str) -> dict:
+    """Wall-clock time of one batch per worker count"""
+    _fake_env(args.duration, 20)
+    urls = [f"https://www.youtube.com/watch?v=bat{i:08d}" for i in range(args.urls)]
+    results = {"urls": len(urls), "download_seconds": args.duration}
+    for workers in args.workers:
+        elapsed = _run_batch(urls, workers, os.path.join(tmp, "batch"))
+        results[f"workers_{workers}_seconds"] = elapsed
+        results[f"workers_{workers}_urls_per_s"] = len(urls) / elapsed
+    return results
+
+
+def bench_memory(args, tmp: str) -> dict:
+    """Heap growth over repeated batches; a leak shows up as steady growth per round"""
+    _fake_env(0.05, 5)
+    gc.collect()
+    tracemalloc.start()
+    samples = []
+    for round_number in range(args.rounds):
+        urls = [f"https://www.youtube.com/watch?v=m{round_number:03d}{i:07d}" for i in range(args.urls)]
+        _run_batch(urls, max(args.workers), os.path.join(tmp, "memory"))
+        gc.collect()
+        samples.append(tracemalloc.get_traced_memory()[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # The first round warms up caches and imports; growth is measured from there
+    growth = (samples[-1] - samples[0]) / max(1, len(samples) - 1)
+    results = {"rounds": args.rounds, "urls_per_round": args.urls, "heap_after_first_round_bytes": samples[0],
+               "heap_after_last_round_bytes": samples[-1], "heap_growth_per_round_bytes": growth, "heap_peak_bytes": peak}
+    try:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+        results["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    except ImportError:
+        pass
+    return results
+
+
+def bench_normalize(args, tmp: str) -> dict:
+    """dedupe_urls lines per second on half as many lines as the parsing benchmark (100k by default)"""
+    return bench_dedupe(args.lines // 2, seed=1)
+
+
+BENCHMARKS = {
+    "url_overhead": bench_url_overhead,
+    "parsing": bench_parsing,
+    "batch": bench_batch,
+    "memory": bench_memory,
+    "normalize": bench_normalize,
+}
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print every metric present in both result files with its relative change"""
+    print(f"\ncomparison with {old.get('git_commit') or 'baseline'} ({old.get('created', '?')}):")
+    for name, metrics in new["results"].items():
+        for metric, value in metrics.items():
+            previous = old.get("results", {}).get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+                continue
+            change = (value - previous) * 100.0 / abs(previous)
+            print(f"  {name}.{metric:<32} {previous:>14.2f} -> {value:>14.2f}  {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="print the change against an earlier results file")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    parser.add_argument("--urls", type=int, help="URLs per batch")
+    parser.add_argument("--lines", type=int, help="progress lines for the parsing benchmark")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds each fake download takes in the batch benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rounds", type=int, help="batches for the memory benchmark")
+    args = parser.parse_args()
+    args.urls = args.urls or (8 if args.quick else 32)
+    args.lines = args.lines or (20_000 if args.quick else 200_000)
+    args.rounds = args.rounds or (3 if args.quick else 10)
+
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_ytdlp(tmp)
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = os.path.join(tmp, "app")
+        for name in args.only or BENCHMARKS:
+            start = time.perf_counter()
+            report["results"][name] = BENCHMARKS[name](args, tmp)
+            print(f"{name} ({time.perf_counter() - start:.1f}s)")
+            for metric, value in report["results"][name].items():
+                print(f"  {metric:<36} {value:>14.2f}" if isinstance(value, float) else f"  {metric:<36} {value:>14}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Randomized URL corpus and property checks for url_normalizer.
+
+Generates the many ways a video or playlist link gets pasted (youtu.be,
+m./music. hosts, /shorts/, /embed/, t= and si= parameters, shuffled query,
+mixed case host, http, stray whitespace) and checks that:
+
+    every spelling of one video or playlist gets the same key
+    different IDs never share a key
+    normalizing the canonical URL again changes nothing
+    watch links with list= follow the mixed policy (RD mixes stay videos)
+    non-YouTube links keep their path and meaningful query parameters
+
+Then times dedupe_urls on a large pasted batch:
+
+    python benchmarks/url_corpus.py --cases 5000 --lines 100000 --seed 1
+"""
+import argparse
+import random
+import string
+import sys
+import os
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from url_normalizer import MUSIC_PLAYLIST, VIDEO, VIDEO_PLAYLIST, dedupe_urls, normalize_url  # noqa: E402
+
+_ID_CHARS = string.ascii_letters + string.digits + "-_"
+
+# Fixed cases: (input, mixed policy, expected route, expected canonical URL)
+KNOWN = [
+    ("https://youtu.be/dQw4w9WgXcQ", "video", VIDEO, "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=30", "video", VIDEO, "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://m.youtube.com/watch?v=dQw4w9WgXcQ", "video", VIDEO, "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://www.youtube.com/shorts/dQw4w9WgXcQ?si=abc", "video", VIDEO, "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLx0sYbCqOb8TBPRdmBHs5Iftvv9TPboYG", "video", VIDEO,
+     "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLx0sYbCqOb8TBPRdmBHs5Iftvv9TPboYG", "playlist", VIDEO_PLAYLIST,
+     "https://www.youtube.com/playlist?list=PLx0sYbCqOb8TBPRdmBHs5Iftvv9TPboYG"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RDdQw4w9WgXcQ", "playlist", VIDEO,
+     "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://music.youtube.com/playlist?list=OLAK5uy_abcdefghijk", "video", MUSIC_PLAYLIST,
+     "https://music.youtube.com/playlist?list=OLAK5uy_abcdefghijk"),
+    ("https://www.youtube.com/@channel/videos", "video", VIDEO, "https://www.youtube.com/@channel/videos"),
+    ("https://open.spotify.com/track/abc", "video", "unsupported_spotify", "https://open.spotify.com/track/abc"),
+    ("ftp://example.com/a", "video", "invalid_string", "ftp://example.com/a"),
+    ("HTTPS://Example.COM:443/a/b?x=1&utm_source=feed#frag", "video", VIDEO, "https://example.com/a/b?x=1"),
+]
+
+
+def _random_id(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(_ID_CHARS) for _ in range(length))
+
+
+def _host_case(rng: random.Random, host: str) -> str:
+    return "".join(c.upper() if rng.random() < 0.3 else c for c in host)
+
+
+def _decorate(rng: random.Random, url: str) -> str:
+    """Random scheme, host case and surrounding whitespace"""
+    scheme, rest = url.split("://", 1)
+    host, _, path = rest.partition("/")
+    if rng.random() < 0.2:
+        scheme = "http"
+    return rng.choice(["", " ", "\t"]) + f"{scheme}://{_host_case(rng, host)}/{path}" + rng.choice(["", " ", "\r"])
+
+
+def _query(rng: random.Random, params: list) -> str:
+    extra = rng.sample([("t", f"{rng.randint(1, 999)}s"), ("si", _random_id(rng, 16)), ("feature", "share"),
+                        ("pp", _random_id(rng, 8)), ("index", str(rng.randint(1, 50)))], rng.randint(0, 3))
+    params = params + extra
+    rng.shuffle(params)
+    return "&".join(f"{name}={value}" for name, value in params)
+
+
+def video_variants(rng: random.Random, video_id: str) -> list:
+    forms = [
+        f"https://youtu.be/{video_id}",
+        f"https://youtu.be/{video_id}?{_query(rng, [])}",
+        f"https://www.youtube.com/watch?{_query(rng, [('v', video_id)])}",
+        f"https://m.youtube.com/watch?{_query(rng, [('v', video_id)])}",
+        f"https://youtube.com/watch?v={video_id}",
+        f"https://music.youtube.com/watch?v={video_id}",
+        f"https://www.youtube.com/shorts/{video_id}",
+        f"https://www.youtube.com/live/{video_id}?{_query(rng, [])}",
+        f"https://www.youtube.com/embed/{video_id}",
+        f"https://www.youtube-nocookie.com/embed/{video_id}",
+    ]
+    return [_decorate(rng, url) for url in forms]
+
+
+def playlist_variants(rng: random.Random, list_id: str) -> list:
+    forms = [
+        f"https://www.youtube.com/playlist?list={list_id}",
+        f"https://www.youtube.com/playlist?{_query(rng, [('list', list_id)])}",
+        f"https://m.youtube.com/playlist?list={list_id}",
+        f"https://youtube.com/watch?list={list_id}",
+    ]
+    return [_decorate(rng, url) for url in forms]
+
+
+def check_properties(cases: int, seed: int) -> list:
+    """Returns a list of failure descriptions (empty when every property holds)"""
+    rng = random.Random(seed)
+    failures = []
+
+    def expect(condition: bool, message: str):
+        if not condition and len(failures) < 20:
+            failures.append(message)
+
+    for url, policy, route, canonical in KNOWN:
+        normalized = normalize_url(url, policy)
+        expect((normalized.route, normalized.url) == (route, canonical),
+               f"{url!r} ({policy}): got {normalized.route} {normalized.url}, expected {route} {canonical}")
+
+    keys = {}
+    for _ in range(cases):
+        video_id, list_id = _random_id(rng, 11), "PL" + _random_id(rng, 32)
+        for expected_key, variants in ((f"youtube:video:{video_id}", video_variants(rng, video_id)),
+                                       (f"youtube:playlist:{list_id}", playlist_variants(rng, list_id))):
+            for url in variants:
+                normalized = normalize_url(url)
+                expect(normalized.key == expected_key, f"{url!r}: key {normalized.key}, expected {expected_key}")
+                again = normalize_url(normalized.url)
+                expect((again.url, again.key, again.route) == (normalized.url, normalized.key, normalized.route),
+                       f"{url!r}: not idempotent ({normalized.url} -> {again.url})")
+            owner = keys.setdefault(expected_key, video_id)
+            expect(owner == video_id, f"{expected_key} produced by two different IDs")
+
+        mixed = _decorate(rng, f"https://www.youtube.com/watch?{_query(rng, [('v', video_id), ('list', list_id)])}")
+        expect(normalize_url(mixed, "video").key == f"youtube:video:{video_id}", f"{mixed!r}: video policy")
+        expect(normalize_url(mixed, "playlist").key == f"youtube:playlist:{list_id}", f"{mixed!r}: playlist policy")
+        radio = f"https://www.youtube.com/watch?v={video_id}&list=RD{video_id}"
+        expect(normalize_url(radio, "playlist").route == VIDEO, f"{radio!r}: mixes stay videos")
+
+        path = "/" + "/".join(_random_id(rng, rng.randint(1, 8)) for _ in range(rng.randint(1, 3)))
+        value = _random_id(rng, 6)
+        other = normalize_url(f"https://Example.org{path}?id={value}&utm_medium=x")
+        expect(other.url == f"https://example.org{path}?id={value}", f"generic URL changed: {other.url}")
+    return failures
+
+
+def bench_dedupe(lines: int, seed: int) -> dict:
+    """dedupe_urls on a pasted batch with roughly one duplicate spelling per three lines"""
+    rng = random.Random(seed)
+    ids = [_random_id(rng, 11) for _ in range(max(1, lines * 2 // 3 // 10))]
+    batch = []
+    while len(batch) < lines:
+        batch.extend(video_variants(rng, rng.choice(ids)))
+    batch = batch[:lines]
+    start = time.perf_counter()
+    unique, duplicates = dedupe_urls(batch)
+    elapsed = time.perf_counter() - start
+    return {"lines": lines, "unique": len(unique), "duplicates": len(duplicates), "seconds": elapsed,
+            "lines_per_s": lines / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=2000, help="random IDs to check")
+    parser.add_argument("--lines", type=int, default=100_000, help="lines in the timed batch")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+
+    failures = check_properties(args.cases, seed)
+    print(f"properties: {args.cases} random IDs, seed {seed}: {'OK' if not failures else f'{len(failures)}+ FAILED'}")
+    for failure in failures:
+        print(f"  {failure}")
+    result = bench_dedupe(args.lines, seed)
+    print(f"dedupe: {result['lines']} lines -> {result['unique']} unique in {result['seconds']:.2f}s "
+          f"({result['lines_per_s']:,.0f} lines/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
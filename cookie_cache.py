@@ -0,0 +1,184 @@
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+DEFAULT_COOKIE_CACHE = {
+    "enabled": True,
+    "ttl_hours": 6,
+    # While the browser is running its cookie database changes constantly; export at most this often
+    "min_refresh_seconds": 60,
+}
+
+# Where browsers keep their cookie databases (macOS, Linux, Windows). Only used to notice changes;
+# the extraction itself is left to yt-dlp.
+_APPDATA = os.environ.get("APPDATA", "")
+_LOCALAPPDATA = os.environ.get("LOCALAPPDATA", "")
+_CHROMIUM_DIRS = {
+    "chrome": ["~/Library/Application Support/Google/Chrome", "~/.config/google-chrome", f"{_LOCALAPPDATA}/Google/Chrome/User Data"],
+    "chromium": ["~/Library/Application Support/Chromium", "~/.config/chromium", f"{_LOCALAPPDATA}/Chromium/User Data"],
+    "brave": ["~/Library/Application Support/BraveSoftware/Brave-Browser", "~/.config/BraveSoftware/Brave-Browser",
+              f"{_LOCALAPPDATA}/BraveSoftware/Brave-Browser/User Data"],
+    "edge": ["~/Library/Application Support/Microsoft Edge", "~/.config/microsoft-edge", f"{_LOCALAPPDATA}/Microsoft/Edge/User Data"],
+    "opera": ["~/Library/Application Support/com.operasoftware.Opera", "~/.config/opera", f"{_APPDATA}/Opera Software/Opera Stable"],
+    "vivaldi": ["~/Library/Application Support/Vivaldi", "~/.config/vivaldi", f"{_LOCALAPPDATA}/Vivaldi/User Data"],
+    "whale": ["~/Library/Application Support/Naver/Whale", "~/.config/naver-whale", f"{_LOCALAPPDATA}/Naver/Naver Whale/User Data"],
+}
+_FIREFOX_DIRS = ["~/Library/Application Support/Firefox/Profiles", "~/.mozilla/firefox", "~/snap/firefox/common/.mozilla/firefox",
+                 f"{_APPDATA}/Mozilla/Firefox/Profiles"]
+_SAFARI_FILES = ["~/Library/Containers/com.apple.Safari/Data/Library/Cookies/Cookies.binarycookies",
+                 "~/Library/Cookies/Cookies.binarycookies"]
+
+
+def cookie_database_paths(browser: str) -> list:
+    """返回浏览器 Cookie 数据库的可能位置 (存在的文件)；browser 使用 yt-dlp 的 BROWSER[+KEYRING][:PROFILE] 格式"""
+    name = re.split(r"[+:]", browser, maxsplit=1)[0].lower()
+    patterns = []
+    if name in _CHROMIUM_DIRS:
+        for directory in _CHROMIUM_DIRS[name]:
+            patterns += [f"{directory}/*/Cookies", f"{directory}/*/Network/Cookies", f"{directory}/Cookies",
+                         f"{directory}/Network/Cookies"]
+    elif name == "firefox":
+        patterns = [f"{directory}/*/cookies.sqlite" for directory in _FIREFOX_DIRS]
+    elif name == "safari":
+        patterns = list(_SAFARI_FILES)
+    paths = []
+    for pattern in patterns:
+        paths += glob.glob(os.path.expanduser(pattern))
+    return sorted(set(paths))
+
+
+def _print_log(msg: str):
+    print(msg, end="")
+
+
+def _sanitize(browser: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", browser)
+
+
+class CookieCache:
+    """把浏览器 Cookie 导出为 Netscape 格式的 cookies.txt 并缓存，代替每个 yt-dlp 进程各自解密浏览器数据库
+
+    以下情况会重新导出：缓存超过 TTL，或浏览器 Cookie 数据库的 mtime 比导出时新 (两次导出至少间隔
+    min_refresh_seconds)。yt-dlp 退出时会把 Cookie 写回 --cookies 文件，因此每个线程使用缓存的一份
+    私有副本，避免并行的进程同时写同一个文件。导出失败时返回 None，调用方回退到 --cookies-from-browser。
+    """
+
+    def __init__(self, directory, ttl_seconds: float = 6 * 3600, min_refresh_seconds: float = 60, clock=time.time):
+        self.directory = str(directory)
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failed_at = {}  # browser -> time of the last failed export
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            os.chmod(self.directory, 0o700)
+        except OSError:
+            pass
+        self._remove_old_copies()
+
+    def _paths(self, browser: str):
+        base = os.path.join(self.directory, _sanitize(browser))
+        return base + ".txt", base + ".json"
+
+    def _read_info(self, info_path: str) -> dict:
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_stale(self, browser: str) -> bool:
+        """缓存不存在、已过期或浏览器数据库已更新时返回 True"""
+        cookie_path, info_path = self._paths(browser)
+        info = self._read_info(info_path)
+        if not info or not os.path.exists(cookie_path):
+            return True
+        age = self._clock() - info.get("exported_at", 0)
+        if age > self.ttl_seconds:
+            return True
+        if age < self.min_refresh_seconds:
+            return False
+        source_mtime = max((os.path.getmtime(path) for path in cookie_database_paths(browser)), default=0)
+        return source_mtime > info.get("source_mtime", 0)
+
+    def export(self, browser: str, log_callback=_print_log) -> bool:
+        """调用 yt-dlp 从浏览器导出 Cookie 到缓存文件；成功时返回 True"""
+        cookie_path, info_path = self._paths(browser)
+        tmp_path = f"{cookie_path}.{os.getpid()}.tmp"
+        source_mtime = max((os.path.getmtime(path) for path in cookie_database_paths(browser)), default=0)
+        # yt-dlp saves the cookie jar to --cookies on exit, even though it complains that no URL was given
+        command = ["yt-dlp", "--ignore-config", "--cookies-from-browser", browser, "--cookies", tmp_path]
+        started = time.monotonic()
+        try:
+            subprocess.run(command, capture_output=True, text=True, encoding="utf-8", errors="ignore", timeout=300)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log_callback(f"⚠️ 无法从 {browser} 导出 Cookie: {e}\n")
+            self._remove(tmp_path)
+            return False
+        if not self._looks_like_cookie_file(tmp_path):
+            log_callback(f"⚠️ 无法从 {browser} 导出 Cookie，将由每个任务直接读取浏览器。\n")
+            self._remove(tmp_path)
+            return False
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, cookie_path)
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump({"browser": browser, "exported_at": self._clock(), "source_mtime": source_mtime}, f)
+        log_callback(f"🍪 已从 {browser} 导出 Cookie ({time.monotonic() - started:.1f} 秒)，后续任务将复用缓存。\n")
+        return True
+
+    def cookie_file(self, browser: str, log_callback=_print_log):
+        """返回当前线程可以交给 yt-dlp 的 cookies.txt 路径；无法导出时返回 None"""
+        cookie_path, _ = self._paths(browser)
+        with self._lock:
+            if self.is_stale(browser):
+                failed_at = self._failed_at.get(browser)
+                if failed_at is not None and self._clock() - failed_at < self.min_refresh_seconds:
+                    return None
+                if not self.export(browser, log_callback):
+                    self._failed_at[browser] = self._clock()
+                    return None
+                self._failed_at.pop(browser, None)
+        copy_path = f"{cookie_path[:-len('.txt')]}.{os.getpid()}.{threading.get_ident()}.txt"
+        try:
+            shutil.copyfile(cookie_path, copy_path)
+            os.chmod(copy_path, 0o600)
+        except OSError as e:
+            log_callback(f"⚠️ 无法复制 Cookie 缓存: {e}\n")
+            return None
+        return copy_path
+
+    def _remove_old_copies(self):
+        """删除以前的进程留下的私有副本 (<browser>.<pid>.<thread>.txt)"""
+        cutoff = self._clock() - self.ttl_seconds
+        for path in glob.glob(os.path.join(self.directory, "*.*.*.txt")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, browser: str):
+        for path in self._paths(browser):
+            self._remove(path)
+
+    @staticmethod
+    def _looks_like_cookie_file(path: str) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                header = f.readline()
+        except OSError:
+            return False
+        return "HTTP Cookie File" in header
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
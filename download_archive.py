@@ -0,0 +1,100 @@
+import os
+import shutil
+import threading
+
+from metadata_cache import cache_key
+
+
+def archive_key(extractor: str, video_id: str) -> str:
+    """生成与 yt-dlp --download-archive 文件相同格式的键："<extractor小写> <id>" """
+    return f"{extractor.lower()} {video_id}"
+
+
+def archive_keys_for(url: str, metadata=None) -> list:
+    """返回一个任务对应的存档键列表：视频一个，播放列表每个条目一个；无法确定时返回空列表"""
+    if metadata:
+        entries = metadata.get("entries")
+        if entries is not None:
+            keys = []
+            for entry in entries:
+                extractor = entry and (entry.get("ie_key") or entry.get("extractor_key"))
+                if not extractor or not entry.get("id"):
+                    return []
+                keys.append(archive_key(extractor, entry["id"]))
+            return keys
+        if metadata.get("extractor_key") and metadata.get("id"):
+            return [archive_key(metadata["extractor_key"], metadata["id"])]
+    # YouTube video URLs carry the ID, so no probe is needed
+    key = cache_key(url)
+    if key.startswith("youtube:video:"):
+        return [archive_key("youtube", key[len("youtube:video:"):])]
+    return []
+
+
+class DownloadArchive:
+    """全局下载存档：与 yt-dlp 共用一个追加写入的存档文件，在内存中维护键集合以 O(1) 查询
+
+    yt-dlp 在下载成功后自行追加记录，contains() 发现文件变大时只读取新增的部分。
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._keys = set()
+        self._offset = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """读取文件中自上次以来追加的记录"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return
+            if size < self._offset:
+                # File was truncated or replaced; start over
+                self._keys.clear()
+                self._offset = 0
+            if size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Leave a partially written last line for the next refresh
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].decode("utf-8", errors="ignore").splitlines():
+                line = line.strip()
+                if line:
+                    self._keys.add(line)
+            self._offset += end
+
+    def contains(self, key: str) -> bool:
+        self.refresh()
+        return key in self._keys
+
+    def add(self, key: str):
+        """手动追加一条记录"""
+        with self._lock:
+            if key in self._keys:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+            self._keys.add(key)
+        self.refresh()
+
+    def snapshot(self) -> str:
+        """写入存档的只读副本并返回其路径：yt-dlp 用它跳过已存档的条目，它追加到副本中的记录不会进入存档"""
+        path = f"{self.path}.pipeline"
+        with self._lock:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                shutil.copyfile(self.path, tmp_path)
+            except FileNotFoundError:
+                open(tmp_path, "w", encoding="utf-8").close()
+            os.replace(tmp_path, path)
+        return path
+
+    def __len__(self):
+        self.refresh()
+        return len(self._keys)
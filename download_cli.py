@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from download_logic import (DownloadScheduler, DownloadJob, default_settings, get_app_support_dir,
+                            get_job_store, load_settings)
+from download_planner import describe_plan, plan_batch, write_plan
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# Minimum seconds between two progress lines for the same job
+PROGRESS_INTERVAL = 2.0
+NDJSON_PROGRESS_INTERVAL = 0.5
+
+# "[#3] " prefix the scheduler adds when several jobs run at once
+_JOB_PREFIX = re.compile(r"^\s*(?:\[#\d+\] )?")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="download_cli.py",
+        description="无界面的命令行下载器：从参数、文件或标准输入读取URL (每行一个)，边读边下载。",
+    )
+    parser.add_argument("urls", nargs="*", help="要下载的URL")
+    parser.add_argument("-i", "--input", action="append", default=[], metavar="FILE",
+                        help="从文件读取URL，'-' 表示标准输入 (可重复)")
+    parser.add_argument("-o", "--output", default=".", metavar="DIR", help="下载根目录 (默认: 当前目录)")
+    add_settings_arguments(parser)
+    parser.add_argument("--resume", action="store_true", help="先继续任务队列中未完成的任务")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="守护模式：监视目录中新出现的 .txt/.urls 文件并下载其中的URL，处理后移入 DIR/processed")
+    parser.add_argument("--poll", type=float, default=5.0, metavar="SECONDS", help="守护模式的扫描间隔 (默认: 5)")
+    parser.add_argument("--plan", metavar="FILE",
+                        help="只估算不下载：解析每个URL的格式，把下载量、耗时和磁盘空间的计划写入 FILE "
+                             "(.csv 为 CSV，其他为 JSON，'-' 为标准输出)；磁盘放不下时退出码为 1")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--ndjson", action="store_true", help="以 NDJSON 格式在标准输出上报告进度")
+    output.add_argument("-v", "--verbose", action="store_true", help="输出 yt-dlp 的全部日志")
+    output.add_argument("-q", "--quiet", action="store_true", help="只输出任务结果")
+    return parser
+
+
+def add_settings_arguments(parser):
+    """命令行和 HTTP 服务共用的设置参数，由 resolve_settings() 应用"""
+    parser.add_argument("--settings", metavar="FILE",
+                        help="设置文件 (默认: 应用支持目录中的 settings.json，其次是当前目录的 settings.json)")
+    parser.add_argument("--app-dir", metavar="DIR", help="应用数据目录 (缓存、存档、任务队列)，覆盖 YOUTUBE_DOWNLOADER_HOME")
+    parser.add_argument("-j", "--workers", type=int, metavar="N", help="同时下载数")
+    parser.add_argument("--browser", help="读取 Cookie 的浏览器，'none' 表示不使用")
+    parser.add_argument("--engine", choices=["auto", "inprocess", "subprocess"], help="下载后端")
+    parser.add_argument("--no-prefetch", action="store_true", help="不批量预取元数据")
+    parser.add_argument("--refresh-metadata", action="store_true", help="忽略元数据缓存")
+
+
+def resolve_settings(args) -> dict:
+    """Loads settings from --settings, the GUI's settings file, ./settings.json or the defaults, then applies CLI overrides."""
+    if args.app_dir:
+        os.environ["YOUTUBE_DOWNLOADER_HOME"] = args.app_dir
+    if args.settings:
+        settings = load_settings(args.settings)
+    else:
+        gui_settings = get_app_support_dir() / "settings.json"
+        if gui_settings.exists():
+            settings = load_settings(str(gui_settings))
+        elif os.path.exists("settings.json"):
+            settings = load_settings("settings.json")
+        else:
+            settings = default_settings()
+
+    if args.workers:
+        settings["max_workers"] = args.workers
+    if args.browser:
+        settings["browser"] = args.browser
+    if args.engine:
+        settings["engine"] = args.engine
+    if args.no_prefetch:
+        settings["prefetch_metadata"] = False
+    if args.refresh_metadata:
+        settings["metadata_cache"] = dict(settings.get("metadata_cache") or {}, refresh=True)
+    return settings
+
+
+class Reporter:
+    """Prints job progress as compact terminal lines or NDJSON; safe to call from worker threads."""
+
+    def __init__(self, ndjson=False, verbose=False, quiet=False):
+        self.ndjson = ndjson
+        self.verbose = verbose
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._last = {}  # job index -> (state, time of last progress line)
+
+    def emit(self, text, stream=None):
+        with self._lock:
+            stream = stream or sys.stdout
+            stream.write(text)
+            stream.flush()
+
+    def log(self, msg):
+        if self.quiet:
+            return
+        # yt-dlp's own lines start with "[extractor]"; without -v only our messages and errors are shown
+        if not self.verbose and _JOB_PREFIX.sub("", msg, count=1).startswith("["):
+            return
+        if self.ndjson:
+            self.emit(json.dumps({"event": "log", "message": msg.strip()}, ensure_ascii=False) + "\n")
+        else:
+            self.emit(msg, sys.stderr)
+
+    def job_update(self, job, total):
+        now = time.monotonic()
+        interval = NDJSON_PROGRESS_INTERVAL if self.ndjson else PROGRESS_INTERVAL
+        with self._lock:
+            state, last_time = self._last.get(job.index, (None, 0.0))
+            if job.store_state == state and (job.finished or now - last_time < interval):
+                return
+            self._last[job.index] = (job.store_state, now)
+        if (self.quiet and not job.finished) or (not self.ndjson and job.state == DownloadJob.QUEUED):
+            return
+
+        if self.ndjson:
+            self.emit(json.dumps(dict(job.to_dict(), event="job", total=total()), ensure_ascii=False) + "\n")
+        else:
+            self.emit(f"[{job.index + 1}/{total()}] {job.store_state:<15} {job.progress:5.1f}%  {job.title or job.url}\n")
+
+
+class DropDirWatcher:
+    """Daemon mode: submits URLs from files dropped into a directory, then moves the files to DIR/processed."""
+
+    PATTERNS = ("*.txt", "*.urls")
+
+    def __init__(self, directory, submit, log_callback):
+        self.directory = Path(directory)
+        self.processed_dir = self.directory / "processed"
+        self.processed_dir.mkdir(parents=True, exist_ok=True)
+        self.submit = submit
+        self.log_callback = log_callback
+
+    def scan(self) -> int:
+        """Processes every file that has not changed for a second; returns the number of URLs submitted."""
+        submitted = 0
+        files = sorted((path for pattern in self.PATTERNS for path in self.directory.glob(pattern)),
+                       key=lambda path: path.stat().st_mtime)
+        for path in files:
+            try:
+                if time.time() - path.stat().st_mtime < 1:
+                    continue  # probably still being written
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+                path.replace(self.processed_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{path.name}")
+            except OSError as e:
+                self.log_callback(f"⚠️ 无法处理 {path}: {e}\n")
+                continue
+            self.log_callback(f"📥 {path.name}: {len(urls)} 个URL\n")
+            for url in urls:
+                self.submit(url)
+            submitted += len(urls)
+        return submitted
+
+
+def iter_input_urls(args):
+    """Yields URLs from positional arguments, then --input files, then stdin, line by line as they arrive."""
+    for url in args.urls:
+        if url.strip():
+            yield url.strip()
+    sources = list(args.input)
+    if not args.urls and not sources and not args.watch and not sys.stdin.isatty():
+        sources.append("-")
+    for source in sources:
+        stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8", errors="ignore")
+        try:
+            for line in stream:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def run_plan(args, settings: dict, base_path: str) -> int:
+    """Dry run: writes the plan for the input URLs and prints its summary; nothing is downloaded."""
+    reporter = Reporter(verbose=args.verbose, quiet=args.quiet)
+    cancel_event = threading.Event()
+
+    def on_signal(signum, frame):
+        cancel_event.set()
+    signal.signal(signal.SIGINT, on_signal)
+    plan = plan_batch(list(iter_input_urls(args)), settings, base_path, reporter.log, cancel_event)
+    if cancel_event.is_set():
+        return EXIT_INTERRUPTED
+    write_plan(plan, args.plan)
+    if not args.quiet:
+        print(describe_plan(plan), end="", file=sys.stderr)
+    return EXIT_OK if plan["fits"] else EXIT_FAILED
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.urls and not args.input and not args.watch and not args.resume and sys.stdin.isatty():
+        parser.print_usage(sys.stderr)
+        print("错误: 没有提供URL (参数、--input、标准输入、--watch 或 --resume)", file=sys.stderr)
+        return EXIT_USAGE
+    for source in args.input:
+        if source != "-" and not os.path.isfile(source):
+            print(f"错误: 文件不存在: {source}", file=sys.stderr)
+            return EXIT_USAGE
+
+    settings = resolve_settings(args)
+    base_path = os.path.abspath(args.output)
+    os.makedirs(base_path, exist_ok=True)
+    if args.plan:
+        return run_plan(args, settings, base_path)
+
+    reporter = Reporter(ndjson=args.ndjson, verbose=args.verbose, quiet=args.quiet)
+    scheduler = None
+
+    def on_job_update(job):
+        reporter.job_update(job, lambda: len(scheduler.jobs))
+
+    scheduler = DownloadScheduler(settings, base_path, reporter.log, on_job_update=on_job_update)
+
+    stop_event = threading.Event()
+    interrupted = []
+
+    def on_signal(signum, frame):
+        interrupted.append(signum)
+        stop_event.set()
+        scheduler.cancel(interrupted=True)
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    if args.resume or args.watch:
+        store = get_job_store(settings)
+        if store is not None:
+            stored = [job for job in store.unfinished() if job["base_path"] == base_path]
+            if stored:
+                reporter.log(f"♻️ 继续 {len(stored)} 个未完成的任务\n")
+                scheduler.resume(stored)
+
+    streaming = "-" in args.input or (not args.urls and not args.input and not args.watch and not sys.stdin.isatty())
+    if streaming:
+        # Start downloading while stdin is still being read
+        scheduler.start()
+
+        def feed():
+            try:
+                for url in iter_input_urls(args):
+                    if stop_event.is_set():
+                        break
+                    scheduler.submit(url)
+            finally:
+                if not args.watch:
+                    scheduler.close()
+        threading.Thread(target=feed, name="url-reader", daemon=True).start()
+    else:
+        for url in iter_input_urls(args):
+            scheduler.submit(url)
+        if settings.get("prefetch_metadata", False):
+            scheduler.prefetch()
+        scheduler.start()
+        if not args.watch:
+            scheduler.close()
+
+    if args.watch:
+        watcher = DropDirWatcher(args.watch, scheduler.submit, reporter.log)
+        reporter.log(f"👀 守护模式：监视 {os.path.abspath(args.watch)}\n")
+        while not stop_event.is_set():
+            watcher.scan()
+            stop_event.wait(args.poll)
+        scheduler.close()
+        scheduler.wait()
+        return EXIT_OK
+
+    # Poll so signal handlers get a chance to run in the main thread
+    while scheduler.is_alive():
+        scheduler.wait(timeout=0.5)
+
+    if interrupted:
+        return EXIT_INTERRUPTED
+    jobs = scheduler.jobs
+    failed = [job for job in jobs if job.state in (DownloadJob.FAILED, DownloadJob.CANCELLED)]
+    # Failed jobs grouped by error category (see retry_policy); cancelled jobs have no failure reason
+    failures = {}
+    for job in failed:
+        if job.failure is not None:
+            failures[job.failure.category] = failures.get(job.failure.category, 0) + 1
+    summary = {
+        "event": "summary", "total": len(jobs),
+        "done": sum(1 for job in jobs if job.state == DownloadJob.DONE),
+        "skipped": scheduler.skipped_count(), "failed": len(failed), "failures": failures,
+    }
+    if args.ndjson:
+        reporter.emit(json.dumps(summary, ensure_ascii=False) + "\n")
+    else:
+        for job in failed:
+            label = f"[{job.failure.label}] " if job.failure is not None else ""
+            print(f"❌ {label}{job.url}: {job.error or job.status_text}", file=sys.stderr)
+        print(f"完成 {summary['done']}/{summary['total']}，跳过 {summary['skipped']}，失败 {summary['failed']}", file=sys.stderr)
+        if failures:
+            labels = {job.failure.category: job.failure.label for job in failed if job.failure is not None}
+            print("失败原因: " + "，".join(f"{labels[category]} {count}" for category, count in
+                                       sorted(failures.items(), key=lambda item: -item[1])), file=sys.stderr)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
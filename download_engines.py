@@ -0,0 +1,303 @@
+import json
+import re
+import subprocess
+import time
+
+# Machine-readable progress lines requested from the yt-dlp executable. Missing fields become
+# JSON null through the "|null" default, so every line is valid JSON after the prefix.
+PROGRESS_PREFIX = "[progress] "
+POSTPROCESS_PREFIX = "[postprocess] "
+DOWNLOAD_PROGRESS_TEMPLATE = "download:" + PROGRESS_PREFIX + (
+    '{"status":%(progress.status|null)j,'
+    '"downloaded_bytes":%(progress.downloaded_bytes|null)j,'
+    '"total_bytes":%(progress.total_bytes|null)j,'
+    '"total_bytes_estimate":%(progress.total_bytes_estimate|null)j,'
+    '"speed":%(progress.speed|null)j,'
+    '"eta":%(progress.eta|null)j,'
+    '"fragment_index":%(progress.fragment_index|null)j,'
+    '"fragment_count":%(progress.fragment_count|null)j,'
+    '"playlist_index":%(info.playlist_index|null)j,'
+    '"playlist_count":%(info.n_entries|null)j,'
+    '"filename":%(progress.filename|null)j}'
+)
+POSTPROCESS_PROGRESS_TEMPLATE = "postprocess:" + POSTPROCESS_PREFIX + (
+    '{"status":%(progress.status|null)j,"postprocessor":%(progress.postprocessor|null)j}'
+)
+
+# Fallbacks for yt-dlp builds that ignore --progress-template
+_ITEM_PATTERN = re.compile(r'\[download\] Downloading item (\d+) of (\d+)')
+_PERCENT_PATTERN = re.compile(r'\[download\]\s+([0-9.]+?)%')
+
+# Consumers receive at most one "progress" event per job within this interval
+PROGRESS_COALESCE_SECONDS = 0.05
+
+
+class ProgressEvent:
+    """下载后端上报的进度事件，两种后端共用
+
+    kind 取值:
+        "item"         播放列表中开始下载第 item_index 项 (共 item_count 项)
+        "progress"     当前文件的下载进度 (percent 及可用时的字节数、速度、ETA、分片序号)
+        "item_done"    当前项已完成 (包括 "has already been downloaded")
+        "postprocess"  后处理 (合并、提取音频等) 开始或结束
+    """
+
+    __slots__ = ("kind", "percent", "downloaded_bytes", "total_bytes", "speed", "eta",
+                 "fragment_index", "fragment_count", "item_index", "item_count", "filename", "postprocessor")
+
+    def __init__(self, kind: str, percent=None, downloaded_bytes=None, total_bytes=None, speed=None, eta=None,
+                 fragment_index=None, fragment_count=None, item_index=None, item_count=None, filename=None,
+                 postprocessor=None):
+        self.kind = kind
+        self.percent = percent
+        self.downloaded_bytes = downloaded_bytes
+        self.total_bytes = total_bytes
+        self.speed = speed
+        self.eta = eta
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+        self.item_index = item_index
+        self.item_count = item_count
+        self.filename = filename
+        self.postprocessor = postprocessor
+
+    def __repr__(self):
+        return f"<ProgressEvent {self.kind} {self.percent}% item={self.item_index}/{self.item_count}>"
+
+
+class ProgressCoalescer:
+    """限制 "progress" 事件的频率：每个时间窗口内只转发最新的一条，其他类型的事件立即转发
+
+    被合并掉的最后一条进度会在下一条非进度事件之前或 flush() 时补发，保证消费者看到最终状态。
+    """
+
+    def __init__(self, on_event, interval: float = PROGRESS_COALESCE_SECONDS, clock=time.monotonic):
+        self.on_event = on_event
+        self.interval = interval
+        self._clock = clock
+        self._last_sent = float("-inf")
+        self._pending = None
+
+    def __call__(self, event):
+        if event.kind != "progress":
+            self.flush()
+            self.on_event(event)
+            return
+        now = self._clock()
+        if now - self._last_sent >= self.interval:
+            self._pending = None
+            self._last_sent = now
+            self.on_event(event)
+        else:
+            self._pending = event
+
+    def flush(self):
+        if self._pending is not None:
+            event, self._pending = self._pending, None
+            self._last_sent = self._clock()
+            self.on_event(event)
+
+
+def parse_progress_json(payload: str):
+    """把 DOWNLOAD_PROGRESS_TEMPLATE 生成的一行 JSON 转换为 ProgressEvent；无法解析时返回 None"""
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    downloaded = data.get("downloaded_bytes")
+    total = data.get("total_bytes") or data.get("total_bytes_estimate")
+    kind = "item_done" if data.get("status") == "finished" else "progress"
+    percent = 100.0 if kind == "item_done" else (downloaded * 100.0 / total if downloaded is not None and total else None)
+    return ProgressEvent(kind, percent=percent, downloaded_bytes=downloaded, total_bytes=total,
+                         speed=data.get("speed"), eta=data.get("eta"),
+                         fragment_index=data.get("fragment_index"), fragment_count=data.get("fragment_count"),
+                         item_index=data.get("playlist_index"), item_count=data.get("playlist_count"),
+                         filename=data.get("filename"))
+
+
+class SubprocessEngine:
+    """通过 yt-dlp 可执行文件运行命令，解析 --progress-template 输出的 JSON 进度行
+
+    不支持该模板的旧版本 yt-dlp 仍按 --newline 文本行解析百分比。
+    """
+
+    name = "subprocess"
+
+    def run(self, command: list, log_callback, cancel_event, on_event, cwd=None, bandwidth=None) -> bool:
+        if "--progress-template" not in command:
+            command = command[:1] + ["--progress-template", DOWNLOAD_PROGRESS_TEMPLATE,
+                                     "--progress-template", POSTPROCESS_PROGRESS_TEMPLATE] + command[1:]
+        # The share is fixed for the lifetime of the process (see bandwidth.BandwidthBudget)
+        rate = bandwidth.ytdlp_rate() if bandwidth is not None else None
+        if rate:
+            command = command[:1] + ["--limit-rate", str(rate)] + command[1:]
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='ignore',
+            cwd=cwd
+        )
+
+        current_item = 0
+        for line in process.stdout:
+            if cancel_event.is_set():
+                process.terminate()
+                return False
+
+            line = line.strip()
+            if not line:
+                continue
+
+            # Structured progress: not logged, it only drives the progress bar
+            if line.startswith(PROGRESS_PREFIX):
+                event = parse_progress_json(line[len(PROGRESS_PREFIX):])
+                if event is not None:
+                    if event.item_index and event.item_index != current_item:
+                        current_item = event.item_index
+                        on_event(ProgressEvent("item", item_index=event.item_index, item_count=event.item_count))
+                    on_event(event)
+                continue
+            if line.startswith(POSTPROCESS_PREFIX):
+                try:
+                    data = json.loads(line[len(POSTPROCESS_PREFIX):])
+                except ValueError:
+                    continue
+                on_event(ProgressEvent("postprocess", postprocessor=data.get("postprocessor")))
+                continue
+
+            log_callback(line + '\n')
+
+            if not line.startswith('[download]'):
+                continue
+            match_item_number = _ITEM_PATTERN.match(line)
+            if match_item_number:
+                current_item = int(match_item_number.group(1))
+                on_event(ProgressEvent("item", item_index=current_item, item_count=int(match_item_number.group(2))))
+                continue
+
+            match_percentage = _PERCENT_PATTERN.match(line)
+            if match_percentage:
+                on_event(ProgressEvent("progress", percent=float(match_percentage.group(1))))
+            elif "has already been downloaded" in line:
+                on_event(ProgressEvent("item_done", percent=100.0))
+
+        process.wait()
+        return process.returncode == 0
+
+
+class _CallbackLogger:
+    """把 YoutubeDL 的日志转发给 log_callback"""
+
+    def __init__(self, log_callback):
+        self.log_callback = log_callback
+
+    def debug(self, msg):
+        # yt-dlp sends regular screen output through debug() as well; only drop real debug lines
+        if not msg.startswith('[debug] '):
+            self.log_callback(msg + '\n')
+
+    def info(self, msg):
+        self.log_callback(msg + '\n')
+
+    def warning(self, msg):
+        self.log_callback(f"WARNING: {msg}\n")
+
+    def error(self, msg):
+        self.log_callback(msg + '\n')
+
+
+class InProcessEngine:
+    """在当前进程中通过 yt_dlp.YoutubeDL API 下载，使用 progress_hooks / postprocessor_hooks 获取结构化进度
+
+    命令行参数通过 yt_dlp.parse_options 转换为 YoutubeDL 参数，因此与子进程后端共用同一套命令构造逻辑。
+    """
+
+    name = "inprocess"
+
+    def __init__(self):
+        import yt_dlp  # Optional dependency; get_engine() falls back to the subprocess engine without it
+        self._yt_dlp = yt_dlp
+
+    def run(self, command: list, log_callback, cancel_event, on_event, cwd=None, bandwidth=None) -> bool:
+        yt_dlp = self._yt_dlp
+        parsed = yt_dlp.parse_options(command[1:])
+        current_item = [0]
+
+        def progress_hook(d):
+            if cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled()
+            if bandwidth is not None:
+                # YoutubeDL keeps a reference to params and reads ratelimit for every block it downloads
+                bandwidth.report_speed(d.get('speed'))
+                params['ratelimit'] = bandwidth.ytdlp_rate()
+            info = d.get('info_dict') or {}
+            item_index = info.get('playlist_index')
+            if item_index and item_index != current_item[0]:
+                current_item[0] = item_index
+                on_event(ProgressEvent("item", item_index=item_index,
+                                       item_count=info.get('n_entries') or info.get('playlist_count')))
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded = d.get('downloaded_bytes')
+            if d.get('status') == 'downloading':
+                percent = downloaded * 100.0 / total if downloaded is not None and total else None
+                on_event(ProgressEvent("progress", percent=percent, downloaded_bytes=downloaded, total_bytes=total,
+                                       speed=d.get('speed'), eta=d.get('eta'),
+                                       fragment_index=d.get('fragment_index'), fragment_count=d.get('fragment_count'),
+                                       filename=d.get('filename')))
+            elif d.get('status') == 'finished':
+                on_event(ProgressEvent("item_done", percent=100.0, downloaded_bytes=downloaded or total,
+                                       total_bytes=total, filename=d.get('filename')))
+
+        def postprocessor_hook(d):
+            if cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled()
+            on_event(ProgressEvent("postprocess", postprocessor=d.get('postprocessor'),
+                                   filename=(d.get('info_dict') or {}).get('filepath')))
+
+        params = dict(parsed.ydl_opts)
+        params.update({
+            'logger': _CallbackLogger(log_callback),
+            'noprogress': True,
+            'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [postprocessor_hook],
+        })
+        if bandwidth is not None:
+            params['ratelimit'] = bandwidth.ytdlp_rate()
+        if cwd:
+            params['paths'] = dict(params.get('paths') or {}, home=cwd)
+
+        try:
+            with yt_dlp.YoutubeDL(params) as ydl:
+                return ydl.download(parsed.urls) == 0
+        except yt_dlp.utils.DownloadCancelled:
+            return False
+        except yt_dlp.utils.DownloadError:
+            # Already reported through the logger
+            return False
+
+
+_inprocess_engine = None
+_inprocess_unavailable = False
+
+
+def get_engine(settings: dict):
+    """根据 settings["engine"] ("auto" / "inprocess" / "subprocess") 选择下载后端
+
+    auto 在能导入 yt_dlp 时使用进程内后端，否则回退到子进程后端。
+    """
+    global _inprocess_engine, _inprocess_unavailable
+    choice = (settings.get("engine") or "auto").lower()
+    if choice in ("auto", "inprocess") and not _inprocess_unavailable:
+        if _inprocess_engine is None:
+            try:
+                _inprocess_engine = InProcessEngine()
+            except ImportError:
+                _inprocess_unavailable = True
+                if choice == "inprocess":
+                    print("⚠️ 未安装 yt_dlp 模块，回退到子进程下载。")
+                return SubprocessEngine()
+        return _inprocess_engine
+    return SubprocessEngine()
@@ -1,26 +1,23 @@
-import subprocess
 import time
+_PROCESS_STARTED = time.perf_counter()  # before the other imports, for --profile-startup
+import argparse
 import os
 import threading
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-from PIL import Image, ImageTk
 from pathlib import Path
 import sys
 import json
-from download_logic import handle_url
+import queue
+from datetime import datetime
+# download_logic pulls in every feature module (sqlite3, the post-processing pool, ...); it is imported
+# by the handlers that need it, after the first window is up
+from app_settings import default_settings, get_app_support_dir
+from gui_startup import StartupProfiler, cached_ytdlp_version, logo_file, probe_ytdlp_version
 
 # --- Settings Management ---
 SETTINGS_FILE = "settings.json"
 
-def get_app_support_dir():
-    """Returns the path to the app's Application Support directory, creating it if needed."""
-    app_name = "YouTubeDownloader"
-    # Path is ~/Library/Application Support/AppName on macOS
-    app_dir = Path.home() / "Library" / "Application Support" / app_name
-    app_dir.mkdir(parents=True, exist_ok=True)
-    return app_dir
-
 def get_settings_path():
     """Gets the absolute path to the settings.json file in the app support directory."""
     return get_app_support_dir() / SETTINGS_FILE
@@ -28,14 +25,12 @@ def get_settings_path():
 def load_settings():
     """Loads settings from the JSON file. Returns defaults if file doesn't exist."""
     settings_path = get_settings_path()
-    defaults = {
-        "browser": "chrome", 
-        "interval_seconds": 600, 
-        "max_resolution": "2160",
-        "video_format": "mp4",
-        "audio_format": "m4a",
-        "playlist_as": "audio"
-    }
+    # The shared defaults plus the keys only the GUI uses
+    defaults = default_settings()
+    defaults.update({
+        "playlist_as": "audio",
+        "ui": {"max_log_lines": 5000, "frame_budget_ms": 12, "poll_ms": 50, "log_to_file": True}
+    })
     try:
         if settings_path.exists():
             with open(settings_path, 'r', encoding='utf-8') as f:
@@ -67,29 +62,171 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def get_version_cache_path():
+    return get_app_support_dir() / "cache" / "ytdlp_version.json"
+
 def get_ytdlp_version():
     """Checks if yt-dlp is installed."""
-    try:
-        process = subprocess.Popen(["yt-dlp", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, _ = process.communicate()
-        return f"yt-dlp: {stdout.strip()}"
-    except FileNotFoundError:
-        return "yt-dlp 未安装"
-    except Exception:
-        return ""
+    return probe_ytdlp_version(get_version_cache_path())
+
+def update_ytdlp_status_async(label_widget, delay_ms=500):
+    """Shows the cached yt-dlp version at once; only when the binary changed is it probed, in a
+    separate thread started delay_ms later so the probe does not compete with the first window."""
+    cached = cached_ytdlp_version(get_version_cache_path())
+    if cached:
+        label_widget.config(text=cached)
+        return
 
-def update_ytdlp_status_async(label_widget):
-    """Checks yt-dlp version in a separate thread to not block the GUI."""
     def check_version_thread():
         version_str = get_ytdlp_version()
         if label_widget.winfo_exists():
             label_widget.winfo_toplevel().after(0, lambda: label_widget.config(text=version_str))
-    thread = threading.Thread(target=check_version_thread, daemon=True)
-    thread.start()
 
-def run_gui():
+    def start_thread():
+        threading.Thread(target=check_version_thread, daemon=True).start()
+    label_widget.after(delay_ms, start_thread)
+
+class LatestValue:
+    """Thread-safe holder exposing the StringVar set/get interface; the UI pipeline applies the latest value."""
+
+    def __init__(self, value=None):
+        self._value = value
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._version += 1
+
+    def get(self):
+        return self._value
+
+    def take(self, seen_version):
+        """Returns (version, value) if the value changed since seen_version, else None."""
+        with self._lock:
+            if self._version == seen_version:
+                return None
+            return self._version, self._value
+
+
+class UiPipeline:
+    """Moves log lines, progress and status updates from worker threads onto the Tk main loop.
+
+    Workers only touch a queue and two LatestValue holders. The main loop drains the queue in
+    batches via after(), spending at most frame_budget_ms per pass, inserts each batch with a
+    single Text.insert and trims the widget to the last max_log_lines lines. When log_to_file
+    is set, every line is also written to a log file under the app support directory.
+    """
+
+    def __init__(self, root, text_area, progress_bar, status_var, config=None):
+        config = config or {}
+        self.root = root
+        self.text_area = text_area
+        self.progress_bar = progress_bar
+        self.status_var = status_var
+        self.max_log_lines = int(config.get("max_log_lines", 5000))
+        self.frame_budget = float(config.get("frame_budget_ms", 12)) / 1000
+        self.poll_ms = int(config.get("poll_ms", 50))
+        self.log_to_file = config.get("log_to_file", True)
+        self.status = LatestValue(status_var.get())
+        self.progress_value = LatestValue(0)
+        self.log_path = None
+        self._queue = queue.SimpleQueue()
+        self._log_file = None
+        self._status_version = 0
+        self._progress_version = 0
+
+    # --- Worker-thread side ---
+    def log(self, msg):
+        self._queue.put(msg)
+
+    def progress(self, percentage):
+        self.progress_value.set(percentage)
+
+    def call_soon(self, func):
+        """Runs func on the Tk main loop."""
+        self._queue.put(func)
+
+    # --- Main-thread side ---
+    def start(self):
+        self.root.after(self.poll_ms, self._drain)
+
+    def new_log_file(self):
+        """Starts a fresh log file for a new batch and prunes old ones."""
+        self.close_log_file()
+        if not self.log_to_file:
+            return None
+        try:
+            log_dir = get_app_support_dir() / "logs"
+            log_dir.mkdir(parents=True, exist_ok=True)
+            for old_log in sorted(log_dir.glob("download-*.log"))[:-19]:
+                old_log.unlink()
+            self.log_path = log_dir / f"download-{datetime.now():%Y%m%d-%H%M%S}.log"
+            self._log_file = open(self.log_path, "a", encoding="utf-8", buffering=64 * 1024)
+        except OSError as e:
+            print(f"⚠️ 无法创建日志文件: {e}")
+            self.log_path = None
+        return self.log_path
+
+    def close_log_file(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _drain(self):
+        if not self.text_area.winfo_exists():
+            self.close_log_file()
+            return
+        deadline = time.perf_counter() + self.frame_budget
+        chunks = []
+        more = True
+        while time.perf_counter() < deadline:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                more = False
+                break
+            if callable(item):
+                self._flush_text(chunks)
+                chunks = []
+                item()
+            else:
+                chunks.append(item)
+        self._flush_text(chunks)
+
+        changed = self.progress_value.take(self._progress_version)
+        if changed is not None:
+            self._progress_version, value = changed
+            self.progress_bar['value'] = value
+        changed = self.status.take(self._status_version)
+        if changed is not None:
+            self._status_version, value = changed
+            self.status_var.set(value)
+
+        # Come back almost immediately while there is a backlog, otherwise poll at the normal rate
+        self.root.after(1 if more else self.poll_ms, self._drain)
+
+    def _flush_text(self, chunks):
+        if not chunks:
+            return
+        text = "".join(chunks)
+        if self._log_file is not None:
+            self._log_file.write(text)
+        self.text_area.insert(tk.END, text)
+        line_count = int(self.text_area.index("end-1c").split(".")[0])
+        if line_count > self.max_log_lines:
+            self.text_area.delete("1.0", f"{line_count - self.max_log_lines + 1}.0")
+        self.text_area.see(tk.END)
+
+
+def run_gui(profiler=None, exit_after_startup=False):
     """Sets up and runs the main Tkinter GUI."""
+    profiler = profiler or StartupProfiler(_PROCESS_STARTED)
+    profiler.mark("imports")
     cancel_event = threading.Event()
+    active_scheduler = None
+    resume_jobs = []  # unfinished jobs from the job store that the next start should continue
 
     try:
         vendor_dir = resource_path('vendor')
@@ -101,6 +238,7 @@ def run_gui():
     root = tk.Tk()
     root.withdraw()
     root.title("Universal Downloader")
+    profiler.mark("tk")
 
     style = ttk.Style()
     style.theme_use('clam')
@@ -113,29 +251,16 @@ def run_gui():
     bottom_frame.pack(side="bottom", fill="x", padx=10, pady=10)
 
     try:
-        def add_rounded_corners(im, radius):
-            from PIL import ImageDraw
-            circle = Image.new('L', (radius * 2, radius * 2), 0)
-            draw = ImageDraw.Draw(circle)
-            draw.ellipse((0, 0, radius * 2, radius * 2), fill=255)
-            alpha = Image.new('L', im.size, 255)
-            w, h = im.size
-            alpha.paste(circle.crop((0, 0, radius, radius)), (0, 0))
-            alpha.paste(circle.crop((radius, 0, radius * 2, radius)), (w - radius, 0))
-            alpha.paste(circle.crop((0, radius, radius, radius * 2)), (0, h - radius))
-            alpha.paste(circle.crop((radius, radius, radius * 2, radius * 2)), (w - radius, h - radius))
-            im.putalpha(alpha)
-            return im
-
-        image = Image.open(resource_path("logo/logo.png")).convert("RGBA")
-        image = image.resize((80, 80), Image.Resampling.LANCZOS)
-        image = add_rounded_corners(image, radius=15)
-        logo_img = ImageTk.PhotoImage(image)
+        # Prerendered 80x80 logo, or one rendered with PIL on the first launch and cached on disk
+        logo_path = logo_file(resource_path("logo/logo.png"), resource_path("logo/logo_80.png"),
+                              get_app_support_dir() / "cache" / "ui")
+        logo_img = tk.PhotoImage(file=logo_path)
         logo_label = tk.Label(top_frame, image=logo_img)
         logo_label.image = logo_img
         logo_label.pack(side="left", padx=(0, 10))
     except Exception as e:
         print(f"⚠️ 加载 logo 失败: {e}")
+    profiler.mark("logo")
 
     controls_frame = tk.Frame(top_frame)
     controls_frame.pack(side="left", fill="x", expand=True)
@@ -162,15 +287,12 @@ def run_gui():
     text_area = tk.Text(text_area_frame, wrap='word', relief="flat", borderwidth=0)
     text_area.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+    # Safe to call from any thread; the UI pipeline applies them on the main loop
     def log_callback(msg):
-        if text_area.winfo_exists():
-            text_area.insert(tk.END, msg)
-            text_area.see(tk.END)
+        ui.log(msg)
 
     def progress_callback(percentage):
-        if progress_bar.winfo_exists():
-            progress_bar['value'] = percentage
-            root.update_idletasks()
+        ui.progress(percentage)
 
     status_frame = tk.Frame(bottom_frame)
     status_frame.pack(side="top", fill="x")
@@ -189,12 +311,16 @@ def run_gui():
     progress_bar = ttk.Progressbar(bottom_frame, length=600)
     progress_bar.pack(side="top", fill=tk.X, pady=2)
 
+    ui = UiPipeline(root, text_area, progress_bar, status_var, load_settings().get("ui"))
+    ui_status = ui.status
+    ui.start()
+
     def open_settings_window():
         settings_win = tk.Toplevel(root)
         root.settings_win = settings_win  # Keep a reference
         settings_win.withdraw()
         settings_win.title("设置")
-        settings_win.geometry("350x350")  # Increased height
+        settings_win.geometry("350x490")  # Increased height
         settings_win.resizable(False, False)
         settings_win.transient(root)
 
@@ -231,6 +357,29 @@ def run_gui():
         interval_entry = ttk.Entry(interval_frame, textvariable=interval_var)
         interval_entry.pack(side="left", fill="x", expand=True)
 
+        # --- Adaptive Rate Limit --- #
+        rate_limit_settings = current_settings.get("rate_limit") or {}
+        rate_limit_var = tk.BooleanVar(value=rate_limit_settings.get("enabled", True))
+        ttk.Checkbutton(main_frame, text="自适应限速 (启用时忽略下载间隔)", variable=rate_limit_var).pack(anchor="w", pady=5)
+
+        # --- Metadata Cache --- #
+        metadata_cache_settings = current_settings.get("metadata_cache") or {}
+        refresh_metadata_var = tk.BooleanVar(value=metadata_cache_settings.get("refresh", False))
+        ttk.Checkbutton(main_frame, text="忽略播放列表元数据缓存 (强制刷新)", variable=refresh_metadata_var).pack(anchor="w", pady=5)
+
+        # --- Playlist Fan-out --- #
+        fanout_settings = current_settings.get("playlist_fanout") or {}
+        fanout_var = tk.BooleanVar(value=fanout_settings.get("enabled", False))
+        ttk.Checkbutton(main_frame, text="并行下载播放列表中的条目", variable=fanout_var).pack(anchor="w", pady=5)
+
+        # --- Concurrent Downloads --- #
+        workers_frame = ttk.Frame(main_frame)
+        workers_frame.pack(fill="x", pady=5)
+        ttk.Label(workers_frame, text="同时下载数:").pack(side="left", padx=(0, 10))
+        workers_var = tk.StringVar(value=str(current_settings.get("max_workers", 3)))
+        workers_spin = ttk.Spinbox(workers_frame, from_=1, to=16, textvariable=workers_var)
+        workers_spin.pack(side="left", fill="x", expand=True)
+
         # --- Video Resolution --- #
         resolution_frame = ttk.Frame(main_frame)
         resolution_frame.pack(fill="x", pady=5)
@@ -271,21 +420,31 @@ def run_gui():
                 if interval < 0:
                     messagebox.showerror("错误", "间隔不能为负数。", parent=settings_win)
                     return
+                max_workers = int(workers_var.get())
+                if max_workers < 1:
+                    messagebox.showerror("错误", "同时下载数至少为 1。", parent=settings_win)
+                    return
                 
                 # Get the numeric value from the display name
                 resolution_value = RESOLUTION_MAP.get(resolution_var.get(), "1080")
 
-                new_settings = {
+                # Keep keys that have no widget here (e.g. per_host_limit)
+                new_settings = dict(current_settings)
+                new_settings.update({
                     "browser": browser_var.get(),
                     "interval_seconds": interval,
                     "max_resolution": resolution_value,
                     "video_format": video_format_var.get(),
                     "audio_format": audio_format_var.get(),
-                }
+                    "max_workers": max_workers,
+                    "rate_limit": dict(rate_limit_settings, enabled=rate_limit_var.get()),
+                    "metadata_cache": dict(metadata_cache_settings, refresh=refresh_metadata_var.get()),
+                    "playlist_fanout": dict(fanout_settings, enabled=fanout_var.get()),
+                })
                 save_settings(new_settings)
                 settings_win.destroy()
             except ValueError:
-                messagebox.showerror("错误", "间隔必须是有效的整数。", parent=settings_win)
+                messagebox.showerror("错误", "间隔和同时下载数必须是有效的整数。", parent=settings_win)
             except Exception as e:
                 messagebox.showerror("错误", f"无法保存设置: {e}", parent=settings_win)
 
@@ -293,7 +452,7 @@ def run_gui():
         save_button.pack()
 
         settings_win.update_idletasks()
-        win_width, win_height = 350, 350
+        win_width, win_height = 350, 490
         parent_x, parent_y = root.winfo_x(), root.winfo_y()
         parent_width, parent_height = root.winfo_width(), root.winfo_height()
         x = parent_x + (parent_width // 2) - (win_width // 2)
@@ -311,81 +470,148 @@ def run_gui():
     settings_btn = ttk.Button(btn_frame, text="设置", command=open_settings_window)
     settings_btn.pack(side=tk.LEFT, padx=10)
 
-    def download_thread():
+    def reset_buttons():
+        if root.winfo_exists():
+            start_btn.config(state=tk.NORMAL)
+            cancel_btn.config(state=tk.DISABLED)
+            settings_btn.config(state=tk.NORMAL)
+
+    def download_thread(urls, download_dir, stored_jobs):
+        nonlocal active_scheduler
+        from download_logic import DownloadJob, DownloadScheduler
+        settings = load_settings()
+        total_urls = len(urls)
+
+        def refresh_status(job=None):
+            counts = scheduler.counts()
+            finished = total_urls - counts[DownloadJob.QUEUED] - counts[DownloadJob.RUNNING]
+            if not cancel_event.is_set():
+                text = f"({finished}/{total_urls}) 下载中 {counts[DownloadJob.RUNNING]} 个"
+                details = scheduler.describe_progress()
+                if details:
+                    text += f" · {details}"
+                if job is not None:
+                    text += f" · #{job.index + 1}: {job.status_text}"
+                if scheduler.rate_limiter is not None:
+                    text += f" · {scheduler.rate_limiter.describe()}"
+                if scheduler.bandwidth is not None:
+                    text += f" · {scheduler.bandwidth.describe()}"
+                ui_status.set(text)
+
+        def on_job_update(job):
+            refresh_status(job)
+            progress_callback(scheduler.overall_progress())
+
+        scheduler = DownloadScheduler(settings, download_dir, log_callback, on_job_update=on_job_update, cancel_event=cancel_event)
+        if ui.log_path is not None:
+            log_callback(f"📝 完整日志: {ui.log_path}\n")
+        active_scheduler = scheduler
+        log_callback(f"🚀 共 {total_urls} 个任务，同时下载 {scheduler.max_workers} 个 (每个站点最多 {scheduler.per_host_limit} 个)\n")
+        if stored_jobs:
+            scheduler.resume(stored_jobs)
+        else:
+            for url in urls:
+                scheduler.submit(url)
+        if settings.get("prefetch_metadata", True):
+            ui_status.set(f"🔎 正在预取 {total_urls} 个链接的元数据...")
+            scheduler.prefetch()
+        scheduler.start()
+        scheduler.close()
+        # Jobs waiting on the rate limiter emit no updates, so refresh the status bar periodically
+        while scheduler.is_alive():
+            scheduler.wait(timeout=1)
+            refresh_status()
+        jobs = scheduler.jobs
+        active_scheduler = None
+
+        skipped = scheduler.skipped_count()
+        if skipped:
+            log_callback(f"\n⏭️ 已跳过 {skipped} 个已存档的项目\n")
+        failed = [job for job in jobs if job.state == DownloadJob.FAILED]
+        if failed:
+            log_callback(f"\n❌ {len(failed)} 个任务失败:\n" + "".join(f"  {job.url}\n" for job in failed))
+        if cancel_event.is_set():
+            log_callback("❌ 下载已被用户取消！\n")
+            ui_status.set("下载已取消")
+
+        if not cancel_event.is_set():
+            ui_status.set(f"🎉 全部任务完成！(跳过 {skipped} 个已存档)" if skipped else "🎉 全部任务完成！")
+            log_callback("\n🎉 全部任务完成！\n")
+
+        ui.call_soon(reset_buttons)
+        ui.call_soon(ui.close_log_file)
+
+    def on_start():
+        nonlocal resume_jobs
+        from download_logic import get_job_store
+        from url_normalizer import dedupe_urls, url_config
         urls = [url for url in url_input.get("1.0", tk.END).strip().splitlines() if url.strip()]
+        # youtu.be/X, m.youtube.com/watch?v=X&t=30 etc. become one canonical link and duplicates are dropped
+        duplicates = []
+        config = url_config(load_settings())
+        if config.get("enabled", True):
+            targets, duplicates = dedupe_urls(urls, config["mixed_policy"])
+            urls = [target.url for target in targets]
         if not urls:
             messagebox.showwarning("提示", "请输入至少一个有效的 URL")
-            if root.winfo_exists():
-                start_btn.config(state=tk.NORMAL)
-                cancel_btn.config(state=tk.DISABLED)
-                settings_btn.config(state=tk.NORMAL)
             return
 
         download_dir = dir_entry.get()
         if not download_dir or not os.path.isdir(download_dir):
             messagebox.showerror("错误", "请输入有效的下载根目录")
-            if root.winfo_exists():
-                start_btn.config(state=tk.NORMAL)
-                cancel_btn.config(state=tk.DISABLED)
-                settings_btn.config(state=tk.NORMAL)
             return
 
-        settings = load_settings()
-        interval_time = settings.get("interval_seconds", 600)
-        
-        total_urls = len(urls)
-        for i, url in enumerate(urls):
-            if cancel_event.is_set():
-                log_callback("❌ 下载已被用户取消！\n")
-                status_var.set("下载已取消")
-                break
-
-            status_var.set(f"({i + 1}/{total_urls}) 开始: {url[:80]}...")
-            log_callback(f"\n--- ({i + 1}/{total_urls}) 处理URL: {url} ---\n")
-
-            success = handle_url(url, settings, download_dir, log_callback, cancel_event, status_var, progress_callback)
-
-            if success:
-                status_var.set(f"✅ ({i + 1}/{total_urls}) 完成")
-            else:
-                if not cancel_event.is_set():
-                    status_var.set(f"❌ ({i + 1}/{total_urls}) 失败或取消")
-
-            root.update_idletasks()
-
-            if i < total_urls - 1 and not cancel_event.is_set():
-                log_callback(f"\n⏳ 等待 {interval_time} 秒...\n")
-                try:
-                    for remaining in range(interval_time, 0, -1):
-                        if cancel_event.is_set(): break
-                        mins, secs = divmod(remaining, 60)
-                        status_var.set(f"⏳ 等待 {mins:02d}:{secs:02d}...")
-                        root.update_idletasks()
-                        time.sleep(1)
-                except tk.TclError: break
-
-        if not cancel_event.is_set():
-            status_var.set("🎉 全部任务完成！")
-            log_callback("\n🎉 全部任务完成！\n")
-        
-        if root.winfo_exists():
-            start_btn.config(state=tk.NORMAL)
-            cancel_btn.config(state=tk.DISABLED)
-            settings_btn.config(state=tk.NORMAL)
-
-    def on_start():
         start_btn.config(state=tk.DISABLED)
         cancel_btn.config(state=tk.NORMAL)
         settings_btn.config(state=tk.DISABLED)
         cancel_event.clear()
-        progress_bar["value"] = 0
-        root.update_idletasks() # Ensure bar is visually reset
+        ui.progress(0)
         text_area.delete("1.0", tk.END)
-        thread = threading.Thread(target=download_thread, daemon=True)
+        ui.new_log_file()
+        if duplicates:
+            log_callback(f"🔁 合并了 {len(duplicates)} 个重复的链接\n")
+
+        # Continue the stored jobs only if the user kept the restored URL list and directory
+        stored_jobs = []
+        if resume_jobs:
+            if [job["url"] for job in resume_jobs] == urls and resume_jobs[0]["base_path"] == download_dir:
+                stored_jobs = resume_jobs
+            else:
+                store = get_job_store(load_settings())
+                if store is not None:
+                    store.discard([job["id"] for job in resume_jobs])
+            resume_jobs = []
+
+        thread = threading.Thread(target=download_thread, args=(urls, download_dir, stored_jobs), daemon=True)
         thread.start()
 
+    def offer_resume():
+        """Offers to continue jobs that were unfinished when the app last quit or crashed."""
+        nonlocal resume_jobs
+        from download_logic import get_job_store
+        store = get_job_store(load_settings())
+        if store is None:
+            return
+        store.prune()
+        unfinished = store.unfinished()
+        if not unfinished:
+            return
+        if not messagebox.askyesno("继续下载", f"发现 {len(unfinished)} 个未完成的任务，是否继续下载？"):
+            store.discard([job["id"] for job in unfinished])
+            return
+        # One download root per run; jobs stored under other roots are offered next time
+        base_path = unfinished[0]["base_path"]
+        resume_jobs = [job for job in unfinished if job["base_path"] == base_path]
+        url_input.delete("1.0", tk.END)
+        url_input.insert("1.0", "\n".join(job["url"] for job in resume_jobs))
+        dir_entry.delete(0, tk.END)
+        dir_entry.insert(0, base_path)
+        on_start()
+
     def on_cancel():
         cancel_event.set()
+        if active_scheduler is not None:
+            active_scheduler.cancel()
         cancel_btn.config(state=tk.DISABLED)
         log_callback("⚠️ 用户请求取消下载...\n")
 
@@ -399,8 +625,13 @@ def run_gui():
         if start_btn['state'] == tk.DISABLED and cancel_btn['state'] == tk.NORMAL:
             if messagebox.askokcancel("退出", "下载仍在进行中，确定要退出吗？"):
                 cancel_event.set()
+                if active_scheduler is not None:
+                    # Closing the app is not a user cancel: the jobs are offered again on the next start
+                    active_scheduler.cancel(interrupted=True)
+                ui.close_log_file()
                 root.destroy()
         else:
+            ui.close_log_file()
             root.destroy()
 
     w, h = 700, 680
@@ -410,8 +641,40 @@ def run_gui():
     root.geometry(f'{w}x{h}+{x}+{y}')
     root.minsize(600, 500)
     root.protocol("WM_DELETE_WINDOW", on_closing)
+    profiler.mark("widgets")
+
+    def on_first_map(event):
+        if event.widget is not root:
+            return
+        root.unbind("<Map>")
+        root.after_idle(first_window_shown)
+
+    def first_window_shown():
+        profiler.mark("first window")
+        if profiler.enabled:
+            print(profiler.report())
+        if exit_after_startup:
+            root.destroy()
+
+    root.bind("<Map>", on_first_map)
     root.deiconify()
+    if not exit_after_startup:
+        root.after(200, offer_resume)
     root.mainloop()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Universal Downloader")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print where the time to the first window goes (or set YOUTUBE_DOWNLOADER_PROFILE_STARTUP=1)")
+    parser.add_argument("--startup-budget", type=float, metavar="MS", help="target time to the first window in milliseconds")
+    parser.add_argument("--exit-after-startup", action="store_true",
+                        help="close as soon as the first window is shown; exit code 1 when over --startup-budget")
+    # macOS passes -psn_* arguments to app bundles on some versions
+    args, _ = parser.parse_known_args(argv)
+    profile = args.profile_startup or bool(os.environ.get("YOUTUBE_DOWNLOADER_PROFILE_STARTUP"))
+    profiler = StartupProfiler(_PROCESS_STARTED, enabled=profile or args.startup_budget is not None, budget_ms=args.startup_budget)
+    run_gui(profiler, exit_after_startup=args.exit_after_startup)
+    return 0 if profiler.within_budget() else 1
+
 if __name__ == "__main__":
-    run_gui()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
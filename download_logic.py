@@ -4,112 +4,161 @@ import os
 import re
 import json
 import threading
+import uuid
+from collections import deque
+from urllib.parse import urlparse
+from rate_limiter import AdaptiveRateLimiter, is_throttle_message
+from download_engines import SubprocessEngine, ProgressCoalescer, get_engine
+from download_archive import DownloadArchive, archive_key, archive_keys_for
+from job_store import JobStore
+from bandwidth import BandwidthBudget, DEFAULT_BANDWIDTH, format_rate
+from cookie_cache import CookieCache, DEFAULT_COOKIE_CACHE
+from download_tuning import DownloadTuner, DEFAULT_DOWNLOAD_TUNING, tuning_args
+from job_metrics import (JobTimeline, DEFAULT_METRICS, active_timeline, add_bytes, current_timeline, describe_summary,
+                         get_metrics_registry, span, summarize, switch_phase, write_summary)
+from metadata_cache import MetadataCache, DEFAULT_METADATA_CACHE, cache_key, summarize_metadata
+from postprocess_pool import (PostprocessBatch, PostprocessPool, RawPipeline, DEFAULT_POSTPROCESS_POOL, active_batch,
+                              current_batch, raw_print_args)
+from playlist_sync import PlaylistManifest, entry_key, manifest_path, match_filter_spec, playlist_items_spec, sync_config
+from progress_model import ProgressAggregator
+from retry_policy import DISK_FULL, ErrorClassifier, FailureReason, RetryPolicy, active_classifier, current_classifier, retry_config
+from staging import DEFAULT_DISK_ADMISSION, DEFAULT_STAGING, DiskAdmission, StagingArea
+from url_normalizer import INVALID, normalize_url, url_config
+from app_settings import default_settings, get_app_support_dir
 
-def load_settings() -> dict:
-    """从 settings.json 加载配置"""
+def load_settings(path: str = "settings.json") -> dict:
+    """从 settings.json 加载配置，缺少的键使用默认值"""
+    defaults = default_settings()
     try:
-        with open("settings.json", "r", encoding='utf-8') as f:
-            return json.load(f)
+        with open(path, "r", encoding='utf-8') as f:
+            settings = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
-        print("⚠️ settings.json 未找到或格式错误，将使用默认设置。")
-        return {
-            "browser": "chrome", 
-            "interval_seconds": 600, 
-            "max_resolution": "2160",
-            "video_format": "mp4",
-            "audio_format": "m4a"
-        }
+        print(f"⚠️ {path} 未找到或格式错误，将使用默认设置。")
+        return defaults
+    for key, value in defaults.items():
+        settings.setdefault(key, value)
+    return settings
 
-def classify_url(url: str) -> str:
-    """判断URL类型"""
-    if not url.startswith(('http://', 'https://')):
-        return "invalid_string"
-
-    if "spotify.com" in url:
-        return "unsupported_spotify"
-    elif "music.youtube.com" in url and "list=" in url:
-        return "music_playlist"
-    elif ("youtube.com" in url or "youtu.be" in url):
-        if "list=" in url:
-            return "video_playlist"
-        else:
-            return "video"
-    else:
-        return "video"
+def classify_url(url: str, mixed_policy: str = "video") -> str:
+    """判断URL类型；同时带有 v= 和 list= 的链接按 mixed_policy 处理 (见 url_normalizer.normalize_url)"""
+    return normalize_url(url, mixed_policy).route
 
 
-def _execute_command(command: list, log_callback, cancel_event, status_var, progress_callback, is_playlist: bool = False, total_playlist_items: int = 1, cwd=None) -> bool:
-    """执行外部命令，流式传输输出、处理进度和取消信号"""
-    status_var.set("正在下载...")
-    progress_callback(0)
+class _ProgressTracker:
+    """把下载后端的 ProgressEvent 转换为状态栏文本和总体进度百分比
 
-    current_video_number = 0  # 0-indexed initially, becomes 1-indexed upon first match
+    进度由 ProgressAggregator 按字节数加权汇总：播放列表中大文件比小文件占更大的比例。
+    fan-out 模式下多个条目各自的 tracker 共用一个 aggregator，item_offset 是条目在其中的序号。
+    """
 
-    try:
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding='utf-8',
-            errors='ignore',
-            cwd=cwd
-        )
+    def __init__(self, status_var, progress_callback, is_playlist: bool, total_playlist_items: int, aggregator=None, item_offset: int = 0, bandwidth=None):
+        self.status_var = status_var
+        self.progress_callback = progress_callback
+        self.is_playlist = is_playlist
+        self.total_playlist_items = total_playlist_items
+        self.aggregator = aggregator if aggregator is not None else ProgressAggregator([None] * max(1, total_playlist_items))
+        self.item_offset = item_offset
+        # A caller's aggregator may still be empty (e.g. no entries known yet); progress needs an item to land in
+        while len(self.aggregator) <= item_offset:
+            self.aggregator.add()
+        self.bandwidth = bandwidth
+        # A single video is item 1 from the start; playlists become 1-indexed upon the first item event
+        self.current_video_number = 0 if is_playlist else 1
+        # Bytes of finished parts of the current item (e.g. the video stream before the audio stream)
+        self.part_bytes = 0
 
-        for line in process.stdout:
-            if cancel_event.is_set():
-                process.terminate()
-                log_callback("❌ 下载已取消。\n")
-                status_var.set("用户取消")
-                progress_callback(0)
-                return False
+    def _index(self):
+        return min(self.item_offset + self.current_video_number - 1, len(self.aggregator) - 1)
 
-            line = line.strip()
-            if not line:
-                continue
-            
-            log_callback(line + '\n')
-
-            if is_playlist:
-                # First, check if a new item is starting.
-                match_item_number = re.search(r'\[download\] Downloading item (\d+) of (\d+)', line)
-                if match_item_number:
-                    current_video_number = int(match_item_number.group(1))
-                    status_var.set(f"正在下载 {current_video_number}/{total_playlist_items}")
-                    # Don't process this line for percentage, just continue.
-                    continue
+    def __call__(self, event):
+        if event.kind == "item":
+            # Items before this one are finished, or were skipped because they are already archived
+            for number in range(max(1, self.current_video_number), event.item_index):
+                self.aggregator.finish(min(self.item_offset + number - 1, len(self.aggregator) - 1))
+            self.current_video_number = event.item_index
+            self.part_bytes = 0
+            self._report()
+            return
 
-                # If we are in a playlist and know which video we are on, process progress.
-                if current_video_number > 0:
-                    match_percentage = re.search(r'\[download\]\s+([0-9.]+?)%', line)
-                    if match_percentage:
-                        percentage = float(match_percentage.group(1))
-                        
-                        # Progress from videos completed *before* the current one.
-                        completed_videos_progress = ((current_video_number - 1) / total_playlist_items) * 100
-                        
-                        # Progress from the current video's own percentage.
-                        current_video_progress_contribution = percentage / total_playlist_items
-                        
-                        overall_percentage = completed_videos_progress + current_video_progress_contribution
-                        progress_callback(overall_percentage)
-
-                    # Handle items that are already downloaded separately.
-                    elif "has already been downloaded" in line:
-                        # This video is 100% done. Update progress to the end of this video.
-                        overall_percentage = (current_video_number / total_playlist_items) * 100
-                        progress_callback(overall_percentage)
+        if self.current_video_number <= 0:
+            return
+        if event.kind == "progress":
+            if event.downloaded_bytes is not None and event.total_bytes:
+                self.aggregator.update(self._index(), downloaded_bytes=self.part_bytes + event.downloaded_bytes,
+                                       total_bytes=self.part_bytes + event.total_bytes)
+            elif event.percent is not None:
+                self.aggregator.update(self._index(), percent=event.percent)
             else:
-                # Single video logic (remains simple)
-                match_percentage = re.search(r'\[download\]\s+([0-9.]+?)%', line)
-                if match_percentage:
-                    percentage = float(match_percentage.group(1))
-                    progress_callback(percentage)
-
-        process.wait()
-        if process.returncode == 0:
+                return
+            self._report()
+        elif event.kind == "item_done":
+            # Handles items that are already downloaded as well
+            if event.total_bytes:
+                self.aggregator.update(self._index(), downloaded_bytes=self.part_bytes + (event.downloaded_bytes or event.total_bytes),
+                                       total_bytes=self.part_bytes + event.total_bytes)
+            self.part_bytes += event.total_bytes or 0
+            self.aggregator.finish(self._index())
+            self._report()
+
+    def _report(self):
+        self.progress_callback(self.aggregator.percent())
+        if self.is_playlist:
+            details = self.aggregator.describe()
+            rate = self.bandwidth.current_rate() if self.bandwidth is not None else None
+            if rate:
+                details = (f"{details} · " if details else "") + f"限速 {format_rate(rate)}"
+            self.status_var.set(f"正在下载 {self.current_video_number}/{self.total_playlist_items}" + (f" · {details}" if details else ""))
+
+def _fragment_count(command: list) -> int:
+    """yt-dlp 同时下载的分片数；使用外部下载器时它自己在整个进程上限速，按 1 计"""
+    if "--downloader" in command or "--concurrent-fragments" not in command:
+        return 1
+    try:
+        return max(1, int(command[command.index("--concurrent-fragments") + 1]))
+    except (IndexError, ValueError):
+        return 1
+
+def _execute_command(command: list, log_callback, cancel_event, status_var, progress_callback, is_playlist: bool = False, total_playlist_items: int = 1, cwd=None, engine=None, aggregator=None, item_offset: int = 0, bandwidth=None) -> bool:
+    """通过下载后端执行命令，流式传输输出、处理进度和取消信号
+
+    bandwidth 是共享的 BandwidthBudget 时，下载期间占用其中一个份额 (见 get_bandwidth_budget)。
+    """
+    engine = engine or SubprocessEngine()
+    lease = None
+    if bandwidth is not None:
+        lease = bandwidth.acquire(current_timeline(), live=engine.name == "inprocess", fragments=_fragment_count(command))
+        if lease.rate:
+            log_callback(f"🚦 带宽份额: {format_rate(lease.rate)} (总带宽 {format_rate(bandwidth.limit())})\n")
+    status_var.set(f"正在下载... (限速 {format_rate(lease.rate)})" if lease and lease.rate else "正在下载...")
+    progress_callback(0)
+
+    progress_tracker = _ProgressTracker(status_var, progress_callback, is_playlist, total_playlist_items, aggregator, item_offset, lease)
+    tracker = ProgressCoalescer(progress_tracker)
+
+    def log(msg):
+        # Post-processing (ffmpeg merge/extract) is only visible in the output; the next item switches back
+        if msg.startswith(_POSTPROCESS_PREFIXES):
+            switch_phase("postprocess")
+        elif msg.startswith(_DESTINATION_PREFIX):
+            switch_phase("download")
+        log_callback(msg)
+
+    try:
+        with span("download"):
+            success = engine.run(command, log, cancel_event, tracker, cwd=cwd, bandwidth=lease)
+        tracker.flush()
+        downloaded_bytes, _ = progress_tracker.aggregator.measurement(None if is_playlist or aggregator is None else item_offset)
+        add_bytes(downloaded_bytes)
+
+        if not success and cancel_event.is_set():
+            log_callback("❌ 下载已取消。\n")
+            status_var.set("用户取消")
+            progress_callback(0)
+            return False
+
+        if success:
             progress_callback(100)
-        return process.returncode == 0
+        return success
 
     except FileNotFoundError:
         log_callback(f"❌ 命令未找到: {command[0]}。请确保它已安装并位于系统的PATH中。\n")
@@ -119,34 +168,661 @@ def _execute_command(command: list, log_callback, cancel_event, status_var, prog
         log_callback(f"⚠️ 执行异常: {e}\n")
         status_var.set(f"错误: {e}")
         return False
+    finally:
+        if lease is not None:
+            bandwidth.release(lease)
 
-def download_video(url: str, settings: dict, base_path: str, log_callback, cancel_event, status_var, progress_callback) -> bool:
-    """下载单个视频"""
-    log_callback(f"🎥 检测到视频链接: {url}\n")
-    max_res = settings.get("max_resolution", "1080")
-    video_format = settings.get("video_format", "mp4")
+_metadata_caches = {}
+_metadata_caches_lock = threading.Lock()
+
+def get_metadata_cache(settings: dict):
+    """返回所有下载函数共享的元数据缓存；在设置中禁用时返回 None"""
+    config = dict(DEFAULT_METADATA_CACHE)
+    config.update(settings.get("metadata_cache") or {})
+    if not config.get("enabled", True):
+        return None
+    directory = config.get("directory") or str(get_app_support_dir() / "cache" / "metadata")
+    with _metadata_caches_lock:
+        cache = _metadata_caches.get(directory)
+        if cache is None:
+            cache = MetadataCache(directory)
+            _metadata_caches[directory] = cache
+        cache.ttl_seconds = float(config["ttl_hours"]) * 3600
+        cache.max_bytes = int(float(config["max_mb"]) * 1024 * 1024)
+    return cache
+
+_cookie_caches = {}
+
+def get_cookie_cache(settings: dict):
+    """返回共享的 Cookie 导出缓存；在设置中禁用时返回 None"""
+    config = dict(DEFAULT_COOKIE_CACHE)
+    config.update(settings.get("cookie_cache") or {})
+    if not config.get("enabled", True):
+        return None
+    directory = config.get("directory") or str(get_app_support_dir() / "cache" / "cookies")
+    with _metadata_caches_lock:
+        cache = _cookie_caches.get(directory)
+        if cache is None:
+            cache = CookieCache(directory)
+            _cookie_caches[directory] = cache
+        cache.ttl_seconds = float(config["ttl_hours"]) * 3600
+        cache.min_refresh_seconds = float(config["min_refresh_seconds"])
+    return cache
+
+def _cookie_args(settings: dict, log_callback=None) -> list:
+    """yt-dlp 的 Cookie 参数：优先使用缓存的 cookies.txt，导出失败时每个进程直接读取浏览器"""
     browser = settings.get("browser", "chrome")
+    if not browser or browser.lower() == 'none':
+        return []
+    cache = get_cookie_cache(settings)
+    if cache is not None:
+        with span("cookies"):
+            cookie_file = cache.cookie_file(browser, log_callback) if log_callback else cache.cookie_file(browser)
+        if cookie_file:
+            return ["--cookies", cookie_file]
+    return ["--cookies-from-browser", browser]
 
-    folder = os.path.join(base_path, "videos")
-    os.makedirs(folder, exist_ok=True)
+def fetch_playlist_metadata(url: str, settings: dict, log_callback, refresh=None, max_age=None):
+    """获取 --dump-single-json --flat-playlist 元数据，优先使用磁盘缓存
 
-    log_callback(f"⬇️ 将以最高 {max_res}p 的画质下载到 {folder} (格式: {video_format})...\n")
+    refresh=True（或设置中 metadata_cache.refresh 为 true）时跳过缓存重新获取；
+    max_age (秒) 只接受不超过该时间的缓存。失败时返回 None。
+    """
+    if refresh is None:
+        refresh = (settings.get("metadata_cache") or {}).get("refresh", False)
+    cache = get_metadata_cache(settings)
+    if cache is not None and not refresh:
+        metadata = cache.get(url, max_age)
+        if metadata is not None:
+            log_callback(f"📦 使用缓存的元数据: {metadata.get('title', url)}\n")
+            return metadata
+
+    try:
+        meta_command = ["yt-dlp", "--dump-single-json", "--flat-playlist", url]
+        meta_command.extend(_cookie_args(settings, log_callback))
+        with span("metadata"):
+            meta_process = subprocess.run(meta_command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+        if meta_process.returncode != 0:
+            log_callback(f"⚠️ 无法获取播放列表元数据，进度条可能不准确: {meta_process.stderr}\n")
+            return None
+        metadata = json.loads(meta_process.stdout)
+    except Exception as e:
+        log_callback(f"⚠️ 获取播放列表元数据时发生错误: {e}\n")
+        return None
+
+    if cache is not None:
+        try:
+            cache.put(url, metadata)
+        except OSError as e:
+            log_callback(f"⚠️ 无法写入元数据缓存: {e}\n")
+    return metadata
+
+def prefetch_metadata(urls: list, settings: dict, log_callback, on_result=None, cancel_event=None) -> dict:
+    """用一次 yt-dlp 调用 (--batch-file - --dump-single-json --flat-playlist) 获取整批URL的元数据
+
+    结果按到达顺序流式处理：写入共享的元数据缓存，并调用 on_result(url, metadata)。
+    已缓存的URL不会再次探测。返回 {url: metadata}。
+    """
+    refresh = (settings.get("metadata_cache") or {}).get("refresh", False)
+    cache = get_metadata_cache(settings)
+    results = {}
+    pending = {}  # cache key -> original URLs still waiting for a result
+    for url in dict.fromkeys(urls):
+        if classify_url(url) not in ("video", "music_playlist", "video_playlist"):
+            continue
+        metadata = cache.get(url) if cache is not None and not refresh else None
+        if metadata is not None:
+            results[url] = metadata
+            if on_result:
+                on_result(url, metadata)
+        else:
+            pending.setdefault(cache_key(url), []).append(url)
+    if not pending:
+        return results
+
+    command = ["yt-dlp", "--ignore-errors", "--dump-single-json", "--flat-playlist", "--batch-file", "-"]
+    command.extend(_cookie_args(settings, log_callback))
+    batch_urls = [url for group in pending.values() for url in group]
+    log_callback(f"🔎 正在预取 {len(batch_urls)} 个链接的元数据...\n")
+
+    try:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            errors='ignore'
+        )
+    except FileNotFoundError:
+        log_callback(f"❌ 命令未找到: {command[0]}。请确保它已安装并位于系统的PATH中。\n")
+        return results
+
+    def feed_stdin():
+        try:
+            process.stdin.write("\n".join(batch_urls) + "\n")
+            process.stdin.close()
+        except OSError:
+            pass
+    threading.Thread(target=feed_stdin, daemon=True).start()
+
+    for line in process.stdout:
+        if cancel_event is not None and cancel_event.is_set():
+            process.terminate()
+            break
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            metadata = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        key = None
+        for candidate in (metadata.get("original_url"), metadata.get("webpage_url")):
+            if candidate and cache_key(candidate) in pending:
+                key = cache_key(candidate)
+                break
+        if key is None:
+            continue
+        for url in pending.pop(key):
+            results[url] = metadata
+            if cache is not None:
+                try:
+                    cache.put(url, metadata)
+                except OSError as e:
+                    log_callback(f"⚠️ 无法写入元数据缓存: {e}\n")
+            if on_result:
+                on_result(url, metadata)
+    process.wait()
+
+    if pending:
+        log_callback(f"⚠️ {sum(len(group) for group in pending.values())} 个链接未能预取元数据，将在下载时再获取\n")
+    return results
+
+# Fields probe_formats() prints for each entry; the size fields describe the selected (merged) format
+_PROBE_FIELDS = ("id", "title", "extractor_key", "webpage_url", "playlist_index", "duration", "format_id",
+                 "resolution", "ext", "filesize", "filesize_approx", "tbr")
+
+def probe_formats(url: str, settings: dict, kind: str, log_callback, playlist_items=None):
+    """不下载，只让 yt-dlp 按下载时相同的格式选择解析每个条目，返回 (条目列表, 错误信息)
+
+    播放列表会逐个解析条目 (比 --flat-playlist 慢得多)，playlist_items 可以只解析其中一部分 ("1-3,7")。
+    某些条目失败时仍返回其他条目，错误信息为最后一行 ERROR 输出。
+    """
+    command = ["yt-dlp", "--ignore-errors", "--no-warnings", "-f", format_selector(settings, kind),
+               "--print", "%(.{" + ",".join(_PROBE_FIELDS) + "})j"]
+    if playlist_items:
+        command.extend(["--playlist-items", playlist_items])
+    command.extend(_cookie_args(settings, log_callback))
+    command.append(url)
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    except FileNotFoundError:
+        return [], f"命令未找到: {command[0]}"
+    entries = []
+    for line in process.stdout.splitlines():
+        if line.startswith("{"):
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    errors = [line.strip() for line in process.stderr.splitlines() if line.startswith("ERROR:")]
+    if errors:
+        return entries, errors[-1]
+    if process.returncode != 0 and not entries:
+        return entries, process.stderr.strip() or f"yt-dlp 退出码 {process.returncode}"
+    return entries, None
 
-    format_string = f"bestvideo[height<={max_res}]+bestaudio/best[height<={max_res}]"
+_download_archives = {}
+
+def get_download_archive(settings: dict):
+    """返回共享的全局下载存档；在设置中禁用时返回 None"""
+    config = settings.get("download_archive") or {}
+    if not config.get("enabled", True):
+        return None
+    path = config.get("path") or str(get_app_support_dir() / "download_archive.txt")
+    with _metadata_caches_lock:
+        archive = _download_archives.get(path)
+        if archive is None:
+            archive = DownloadArchive(path)
+            _download_archives[path] = archive
+    return archive
+
+def _archive_args(settings: dict, raw: bool = False) -> list:
+    """让 yt-dlp 跳过并记录已下载的条目
+
+    raw=True (后处理池模式) 时只给它存档的副本：条目在后处理成功后才记录 (见 RawPipeline)。
+    """
+    archive = get_download_archive(settings)
+    if archive is None:
+        return []
+    return ["--download-archive", archive.snapshot() if raw else archive.path]
+
+def format_selector(settings: dict, kind: str = "video") -> str:
+    """下载时使用的 -f 格式选择：视频为最高 max_resolution 的视频流+音频流，音频为最佳音质 (与 --extract-audio 相同)"""
+    if kind == "audio":
+        return "bestaudio/best"
+    max_res = settings.get("max_resolution", "1080")
+    return f"bestvideo[height<={max_res}]+bestaudio/best[height<={max_res}]"
+
+def _video_command(url: str, settings: dict, output_template: str, log_callback=None, tuning=None, raw=False) -> list:
+    """构造下载视频 (最高 max_resolution 画质) 的 yt-dlp 命令
+
+    raw=True 时只分别下载视频流和音频流，由后处理池合并 (见 postprocess_pool)。
+    """
+    max_res = settings.get("max_resolution", "1080")
+    video_format = settings.get("video_format", "mp4")
+    format_string = format_selector(settings, "video")
     command = [
         "yt-dlp",
         "--progress",
         "-f", format_string,
         "--merge-output-format", video_format,
-        "-o", os.path.join(folder, "%(title)s.%(ext)s"),
+        "-o", output_template,
+        "--newline",
+        url
+    ]
+    if raw:
+        command[2:6] = ["-f", f"bestvideo[height<={max_res}],bestaudio/best[height<={max_res}]"] + raw_print_args()
+    command[2:2] = _cookie_args(settings, log_callback)
+    command.extend(_archive_args(settings, raw))
+    command.extend(tuning_args(tuning or {}))
+    return command
+
+def _audio_command(url: str, settings: dict, output_template: str, log_callback=None, tuning=None, raw=False) -> list:
+    """构造提取最佳音质音频的 yt-dlp 命令；raw=True 时只下载音频流，由后处理池转换格式"""
+    audio_format = settings.get("audio_format", "m4a")
+    command = [
+        "yt-dlp",
+        "--progress",
+        "--extract-audio",
+        "--audio-format", audio_format,
+        "--audio-quality", "0", # Best quality
+        "-o", output_template,
         "--newline",
         url
     ]
-    if browser and browser.lower() != 'none':
-        command.insert(2, "--cookies-from-browser")
-        command.insert(3, browser)
+    if raw:
+        command[2:7] = ["-f", "bestaudio/best"] + raw_print_args()
+    command[2:2] = _cookie_args(settings, log_callback)
+    command.extend(_archive_args(settings, raw))
+    command.extend(tuning_args(tuning or {}))
+    return command
+
+_postprocess_pools = {}
+
+def get_postprocess_pool(settings: dict):
+    """返回共享的后处理池；未启用流水线模式时返回 None"""
+    config = dict(DEFAULT_POSTPROCESS_POOL)
+    config.update(settings.get("postprocess_pool") or {})
+    if not config.get("enabled", False):
+        return None
+    with _metadata_caches_lock:
+        pool = _postprocess_pools.get("default")
+        if pool is None:
+            pool = PostprocessPool(config["workers"], config["max_pending"], config["keep_raw"])
+            _postprocess_pools["default"] = pool
+        pool.max_pending = max(1, int(config["max_pending"]))
+        pool.keep_raw = config["keep_raw"]
+    return pool
+
+def _postprocess_pipeline(settings: dict, kind: str, folder: str, log_callback, cancel_event, work_dir=None):
+    """流水线模式下返回 RawPipeline (kind 为 "video" 或 "audio")，否则返回 None
+
+    在调度器中运行时文件提交到任务的 PostprocessBatch，任务在后处理完成后才结束，工作线程可以先去下载下一个任务；
+    单独调用时由 RawPipeline.finish() 等待后处理完成。原始流写入 work_dir (暂存目录)，合并后的文件写入 folder。
+    """
+    pool = get_postprocess_pool(settings)
+    if pool is None:
+        return None
+    batch = current_batch()
+    owns_batch = batch is None
+    if owns_batch:
+        batch = PostprocessBatch(log_callback, cancel_event, current_timeline())
+    return RawPipeline(pool, batch, kind, folder, settings, log_callback, owns_batch, work_dir, get_download_archive(settings))
+
+_staging_areas = {}
+
+def get_staging_area(settings: dict):
+    """返回下载过程中使用的本地暂存目录；在设置中禁用时返回 None"""
+    config = dict(DEFAULT_STAGING)
+    config.update(settings.get("staging") or {})
+    if not config.get("enabled", False):
+        return None
+    directory = config.get("directory") or str(get_app_support_dir() / "staging")
+    with _metadata_caches_lock:
+        staging = _staging_areas.get(directory)
+        if staging is None:
+            staging = StagingArea(directory, float(config["keep_days"]))
+            staging.prune()
+            _staging_areas[directory] = staging
+    return staging
+
+def _work_dir(settings: dict, url: str, folder: str) -> str:
+    """下载过程中写入的文件夹：启用暂存目录时是该URL的工作文件夹，否则就是 folder"""
+    staging = get_staging_area(settings)
+    return staging.work_dir(url) if staging is not None else folder
+
+def _finalize(settings: dict, work_dir: str, folder: str, success: bool, log_callback) -> bool:
+    """把暂存的已完成文件移入 folder (下载失败时也移入已完成的播放列表条目)；移动失败时返回 False"""
+    if work_dir == folder:
+        return True
+    with span("finalize"):
+        return get_staging_area(settings).finalize(work_dir, folder, success, log_callback)
+
+_disk_admissions = {}
+
+def get_disk_admission(settings: dict):
+    """返回所有调度器共享的磁盘空间准入检查；在设置中禁用时返回 None"""
+    config = dict(DEFAULT_DISK_ADMISSION)
+    config.update(settings.get("disk_admission") or {})
+    if not config.get("enabled", False):
+        return None
+    with _metadata_caches_lock:
+        admission = _disk_admissions.get("default")
+        if admission is None:
+            admission = DiskAdmission(config)
+            _disk_admissions["default"] = admission
+        admission.config = config
+    return admission
+
+def get_retry_policy(settings: dict):
+    """返回按错误类别决定重试次数和退避时间的 RetryPolicy；在设置中禁用时返回 None"""
+    config = retry_config(settings)
+    if not config.get("enabled", True):
+        return None
+    return RetryPolicy(config)
+
+_bandwidth_budgets = {}
+
+def get_bandwidth_budget(settings: dict):
+    """返回所有下载共享的带宽预算；在设置中禁用时返回 None"""
+    config = dict(DEFAULT_BANDWIDTH)
+    config.update(settings.get("bandwidth") or {})
+    if not config.get("enabled", False):
+        return None
+    with _metadata_caches_lock:
+        budget = _bandwidth_budgets.get("default")
+        if budget is None:
+            budget = BandwidthBudget(config)
+            _bandwidth_budgets["default"] = budget
+        budget.config = config
+    return budget
+
+_download_tuners = {}
+
+def get_download_tuner(settings: dict):
+    """返回共享的下载调优器 (分片并发、分块大小、外部下载器，自动调优的结果保存在应用支持目录)"""
+    config = dict(DEFAULT_DOWNLOAD_TUNING)
+    config.update(settings.get("download_tuning") or {})
+    path = config.get("path") or str(get_app_support_dir() / "download_tuning.json")
+    with _metadata_caches_lock:
+        tuner = _download_tuners.get(path)
+        if tuner is None:
+            tuner = DownloadTuner(config, path)
+            _download_tuners[path] = tuner
+        tuner.config = config
+    return tuner
+
+def _record_tuning(settings: dict, url: str, tuning: dict, aggregator, success: bool, log_callback, index=None):
+    """把一次下载的实测吞吐量反馈给自动调优 (失败的下载只释放试用名额)"""
+    downloaded_bytes, seconds = aggregator.measurement(index) if success else (None, None)
+    get_download_tuner(settings).record(url_host(url), tuning, downloaded_bytes, seconds, log_callback)
+
+DEFAULT_PLAYLIST_FANOUT = {
+    "enabled": False,
+    "max_workers": 4,   # parallel items per playlist, on top of the scheduler's own workers
+    "retries": 2,       # extra attempts for each failed item
+    "min_items": 2,     # smaller playlists still go through a single yt-dlp process
+}
+
+def _entry_url(entry: dict):
+    """返回 --flat-playlist 条目的下载地址；无法确定时返回 None"""
+    url = entry.get("url") or entry.get("webpage_url")
+    if url and url.startswith(("http://", "https://")):
+        return url
+    if (entry.get("ie_key") or "").lower() == "youtube" and entry.get("id"):
+        return f"https://www.youtube.com/watch?v={entry['id']}"
+    return None
+
+def _fanout_entries(metadata: dict, settings: dict) -> list:
+    """启用并行下载且每个条目都有地址时返回播放列表条目，否则返回空列表 (整体交给一个 yt-dlp 进程)"""
+    config = dict(DEFAULT_PLAYLIST_FANOUT)
+    config.update(settings.get("playlist_fanout") or {})
+    if not config.get("enabled", False):
+        return []
+    entries = [entry for entry in metadata.get("entries") or [] if entry]
+    if len(entries) < max(2, int(config["min_items"])) or not all(_entry_url(entry) for entry in entries):
+        return []
+    return entries
+
+class _ItemStatus:
+    """单个播放列表条目的状态文本；条目的状态不直接显示，由汇总后的状态代替"""
+
+    def __init__(self):
+        self.value = ""
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+def _download_playlist_fanout(entries: list, build_command, settings: dict, log_callback, cancel_event, status_var, progress_callback, on_item_done=None, max_workers=None) -> bool:
+    """把播放列表拆分为单独的条目，在有界线程池中并行下载
+
+    条目按播放列表顺序开始，输出到同一个播放列表文件夹；失败的条目按错误类别单独重试 (指数退避，
+    见 retry_policy)，不影响其他条目，私享、已删除等不会自行恢复的条目不重试。
+    进度条显示按字节数加权的总体进度。每个条目成功后调用 on_item_done(entry)。全部条目成功时返回 True。
+    max_workers 覆盖设置中的并行条目数。
+    """
+    config = dict(DEFAULT_PLAYLIST_FANOUT)
+    config.update(settings.get("playlist_fanout") or {})
+    workers = max(1, int(max_workers or config["max_workers"]))
+    retries = max(0, int(config["retries"]))
+    engine = get_engine(settings)
+    archive = get_download_archive(settings)
+    tuner = get_download_tuner(settings)
+    bandwidth = get_bandwidth_budget(settings)
+    policy = get_retry_policy(settings)
+
+    total = len(entries)
+    aggregator = ProgressAggregator.from_entries(entries)
+    pending = deque()  # (position, entry, attempt, FailureReason of the previous attempt)
+    for position, entry in enumerate(entries):
+        extractor = entry.get("ie_key") or entry.get("extractor_key")
+        if archive is not None and extractor and entry.get("id") and archive.contains(archive_key(extractor, entry["id"])):
+            aggregator.finish(position)
+            continue
+        pending.append((position, entry, 0, None))
+    state = {"done": total - len(pending), "active": 0}
+    failed = {}  # position -> (entry, FailureReason)
+    lock = threading.Lock()
+
+    if state["done"]:
+        log_callback(f"⏭️ {state['done']}/{total} 项已存档，将跳过\n")
+    log_callback(f"🔀 并行下载播放列表条目 (同时 {min(workers, max(1, len(pending)))} 项)\n")
+
+    def report(_=None):
+        with lock:
+            text = f"正在下载 {state['done']}/{total} (并行 {state['active']})"
+        details = aggregator.describe()
+        progress_callback(aggregator.percent())
+        status_var.set(text + (f" · {details}" if details else ""))
+
+    def worker():
+        while True:
+            with lock:
+                if cancel_event.is_set() or not pending:
+                    return
+                position, entry, attempt, previous = pending.popleft()
+                state["active"] += 1
+            prefix = f"[{position + 1}/{total}] "
+            errors = ErrorClassifier(policy.config if policy is not None else None)
+
+            def item_log(msg):
+                errors.feed(msg)
+                stripped = msg.lstrip("\n")
+                log_callback(msg[:len(msg) - len(stripped)] + prefix + stripped)
+
+            if attempt:
+                delay = policy.delay(previous.category, attempt) if policy is not None else min(60, 2 ** attempt)
+                item_log(f"🔁 {previous.label}，第 {attempt} 次重试，{delay:.0f} 秒后开始: "
+                         f"{entry.get('title') or _entry_url(entry)}\n")
+                cancel_event.wait(delay)
+            item_url = _entry_url(entry)
+            tuning = tuner.choose(url_host(item_url))
+            success = not cancel_event.is_set() and _execute_command(
+                build_command(item_url, tuning), item_log, cancel_event, _ItemStatus(), report, engine=engine,
+                aggregator=aggregator, item_offset=position, bandwidth=bandwidth)
+            _record_tuning(settings, item_url, tuning, aggregator, success, item_log, index=position)
+            reason = None if success else errors.reason(attempt + 1)
+
+            with lock:
+                state["active"] -= 1
+                if success:
+                    state["done"] += 1
+                    failed.pop(position, None)
+                elif cancel_event.is_set():
+                    pass
+                elif attempt < retries and reason.transient and (
+                        policy is None or policy.should_retry(reason.category, attempt + 1)):
+                    pending.append((position, entry, attempt + 1, reason))
+                    get_metrics_registry().record_retry(reason.category)
+                else:
+                    failed[position] = (entry, reason)
+            if success:
+                aggregator.finish(position)
+                if on_item_done is not None:
+                    on_item_done(entry)
+            report()
+
+    timeline = current_timeline()
+    job_errors = current_classifier()
+
+    def timed_worker():
+        # Item spans belong to the job that owns the playlist
+        with active_timeline(timeline):
+            worker()
+
+    threads = [threading.Thread(target=timed_worker, name=f"playlist-item-{i + 1}", daemon=True)
+               for i in range(min(workers, max(1, len(pending))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if failed and job_errors is not None:
+        # The job's outcome is decided by the items that still failed, not by errors that a retry got past
+        for entry, reason in failed.values():
+            job_errors.add(reason.category, reason.message)
+    if failed:
+        log_callback(f"❌ {len(failed)}/{total} 个条目下载失败:\n")
+        for position in sorted(failed):
+            entry, reason = failed[position]
+            log_callback(f"   {position + 1}. [{reason.label}] {entry.get('title') or ''} {_entry_url(entry)}\n")
+    return not failed and not cancel_event.is_set() and state["done"] == total
+
+# yt-dlp prints this line for every entry right before it downloads the selected formats
+_FETCHED_PATTERN = re.compile(r'^\[info\] ([\w-]+): Downloading \d+ format')
+
+def _listing_max_age(settings: dict):
+    """增量同步需要较新的播放列表；未启用同步时返回 None (使用元数据缓存的 TTL)"""
+    config = sync_config(settings)
+    return float(config["listing_max_age_minutes"]) * 60 if config.get("enabled", False) else None
+
+def _sync_playlist(url: str, metadata: dict, folder: str, build_command, settings: dict, log_callback, cancel_event, status_var, progress_callback):
+    """增量同步播放列表：只下载清单 (见 playlist_sync) 中还没有的条目
+
+    新条目按各自的地址逐项下载 (启用并行下载时同时下载多项)，因为列出播放列表后位置可能已经变化；
+    没有地址时才用一个 yt-dlp 进程加 --playlist-items 和按 ID 的 --match-filter 下载，之后只把确实下载了的条目记入清单。
+    下载存档中已有的条目直接记入清单。未启用同步或元数据中没有条目时返回 None，由调用方下载整个播放列表。
+    """
+    config = sync_config(settings)
+    entries = metadata.get("entries")
+    if not config.get("enabled", False) or not entries:
+        return None
+    manifest = PlaylistManifest(manifest_path(folder), float(config["flush_seconds"]))
+    manifest.url, manifest.title = url, metadata.get("title")
+    new = manifest.diff(entries)
+
+    archive = get_download_archive(settings)
+    if archive is not None:
+        archived = [entry for _, entry in new if entry_key(entry) and archive.contains(entry_key(entry))]
+        if archived:
+            manifest.mark(archived)
+            new = [(position, entry) for position, entry in new if entry_key(entry) not in manifest]
+    if not manifest.exists and config["first_run"] == "mark" and new:
+        manifest.mark(entry for _, entry in new)
+        log_callback(f"📌 首次同步: 已把 {len(new)} 项记为已同步，以后只下载新增的条目\n")
+        new = []
+
+    log_callback(f"🔄 同步播放列表: 共 {len(entries)} 项，新增 {len(new)} 项\n")
+    if not new:
+        manifest.flush()
+        progress_callback(100)
+        status_var.set("播放列表已是最新")
+        log_callback("✅ 播放列表已是最新\n")
+        return True
+
+    new_entries = [entry for _, entry in new]
+    fanout = (settings.get("playlist_fanout") or {}).get("enabled", False)
+    if all(_entry_url(entry) for entry in new_entries):
+        # Entries are fetched by their own URL: positions from the listing may have shifted since it was taken
+        success = _download_playlist_fanout(new_entries, build_command, settings, log_callback, cancel_event, status_var, progress_callback,
+                                            on_item_done=lambda entry: manifest.mark([entry]), max_workers=None if fanout else 1)
+    else:
+        tuning = get_download_tuner(settings).choose(url_host(url))
+        command = build_command(url, tuning)
+        command[1:1] = ["--playlist-items", playlist_items_spec(position for position, _ in new)]
+        match_filter = match_filter_spec(new_entries)
+        if match_filter:
+            # A shifted position must not fetch an entry that is not new; it is picked up by the next sync instead
+            command[1:1] = ["--match-filter", match_filter]
+        fetched = set()
+
+        def sync_log(msg):
+            match = _FETCHED_PATTERN.match(msg)
+            if match:
+                fetched.add(match.group(1))
+            log_callback(msg)
+
+        aggregator = ProgressAggregator.from_entries(new_entries)
+        success = _execute_command(command, sync_log, cancel_event, status_var, progress_callback, is_playlist=True, total_playlist_items=len(new_entries), engine=get_engine(settings), aggregator=aggregator, bandwidth=get_bandwidth_budget(settings))
+        _record_tuning(settings, url, tuning, aggregator, success, log_callback)
+        if archive is not None:
+            # Only entries that were actually fetched are in the archive, also when the run failed halfway
+            manifest.mark(entry for entry in new_entries if entry_key(entry) and archive.contains(entry_key(entry)))
+        elif success:
+            manifest.mark(entry for entry in new_entries if entry.get("id") in fetched)
+    manifest.flush()
+    return success
+
+def download_video(url: str, settings: dict, base_path: str, log_callback, cancel_event, status_var, progress_callback) -> bool:
+    """下载单个视频"""
+    log_callback(f"🎥 检测到视频链接: {url}\n")
+    max_res = settings.get("max_resolution", "1080")
+    video_format = settings.get("video_format", "mp4")
+
+    folder = os.path.join(base_path, "videos")
+    os.makedirs(folder, exist_ok=True)
+
+    log_callback(f"⬇️ 将以最高 {max_res}p 的画质下载到 {folder} (格式: {video_format})...\n")
 
-    success = _execute_command(command, log_callback, cancel_event, status_var, progress_callback, is_playlist=False, total_playlist_items=1)
+    work_dir = _work_dir(settings, url, folder)
+    tuning = get_download_tuner(settings).choose(url_host(url))
+    pipeline = _postprocess_pipeline(settings, "video", folder, log_callback, cancel_event, work_dir)
+    if pipeline:
+        command = _video_command(url, settings, pipeline.output_template, log_callback, tuning, raw=True)
+    else:
+        command = _video_command(url, settings, os.path.join(work_dir, "%(title)s.%(ext)s"), log_callback, tuning)
+    aggregator = ProgressAggregator([None])
+    success = _execute_command(command, pipeline.log if pipeline else log_callback, cancel_event, status_var, progress_callback, is_playlist=False, total_playlist_items=1, engine=get_engine(settings), aggregator=aggregator, bandwidth=get_bandwidth_budget(settings))
+    _record_tuning(settings, url, tuning, aggregator, success, log_callback)
+    if pipeline:
+        success = pipeline.finish(success)
+    success = _finalize(settings, work_dir, folder, success, log_callback) and success
     if success:
         log_callback(f"✅ 视频下载成功: {url}\n")
     else:
@@ -158,25 +834,12 @@ def download_playlist_audio(url: str, settings: dict, base_path: str, log_callba
     """下载YouTube等来源的播放列表（音频）"""
     log_callback(f"🎼 检测到音频播放列表链接: {url}\n")
 
-    browser = settings.get("browser", "chrome")
     audio_format = settings.get("audio_format", "m4a")
 
-    # Get total items and title from a single meta_command call
-    playlist_title = "Untitled Playlist"
-    total_items = 0
-    try:
-        meta_command = ["yt-dlp", "--dump-single-json", "--flat-playlist", url]
-        if browser and browser.lower() != 'none':
-            meta_command.extend(["--cookies-from-browser", browser])
-        meta_process = subprocess.run(meta_command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-        if meta_process.returncode == 0:
-            metadata = json.loads(meta_process.stdout)
-            playlist_title = metadata.get('title', 'Untitled Playlist')
-            total_items = metadata.get('playlist_count', 0)
-        else:
-            log_callback(f"⚠️ 无法获取播放列表元数据，进度条可能不准确: {meta_process.stderr}\n")
-    except Exception as e:
-        log_callback(f"⚠️ 获取播放列表元数据时发生错误: {e}\n")
+    # Get total items and title from the (cached) metadata probe
+    metadata = fetch_playlist_metadata(url, settings, log_callback, max_age=_listing_max_age(settings)) or {}
+    playlist_title = metadata.get('title') or 'Untitled Playlist'
+    total_items = metadata.get('playlist_count') or 0
 
     sanitized_playlist_title = re.sub(r'[/\\?%*:|"<>\\]', '_', playlist_title)
 
@@ -188,20 +851,31 @@ def download_playlist_audio(url: str, settings: dict, base_path: str, log_callba
         total_items = 1 # Prevent division by zero
 
     log_callback(f"⬇️ 正在使用下载播放列表到: {folder} (共 {total_items} 项, 音频格式: {audio_format})\n")
-    command = [
-        "yt-dlp",
-        "--progress",
-        "--extract-audio",
-        "--audio-format", audio_format,
-        "--audio-quality", "0", # Best quality
-        "-o", os.path.join(folder, "%(title)s.%(ext)s"),
-        "--newline",
-        url
-    ]
-    if browser and browser.lower() != 'none':
-        command.insert(2, "--cookies-from-browser")
-        command.insert(3, browser)
-    success = _execute_command(command, log_callback, cancel_event, status_var, progress_callback, is_playlist=True, total_playlist_items=total_items)
+    work_dir = _work_dir(settings, url, folder)
+    output_template = os.path.join(work_dir, "%(title)s.%(ext)s")
+    pipeline = _postprocess_pipeline(settings, "audio", folder, log_callback, cancel_event, work_dir)
+    if pipeline:
+        output_template = pipeline.output_template
+    raw = pipeline is not None
+    item_log = pipeline.log if pipeline else log_callback
+
+    def build_command(item_url, tuning):
+        return _audio_command(item_url, settings, output_template, log_callback, tuning, raw)
+
+    success = _sync_playlist(url, metadata, folder, build_command, settings, item_log, cancel_event, status_var, progress_callback)
+    if success is None:
+        entries = _fanout_entries(metadata, settings)
+        if entries:
+            success = _download_playlist_fanout(entries, build_command, settings, item_log, cancel_event, status_var, progress_callback)
+        else:
+            tuning = get_download_tuner(settings).choose(url_host(url))
+            command = build_command(url, tuning)
+            aggregator = ProgressAggregator.from_entries(metadata.get("entries") or [], total_items)
+            success = _execute_command(command, item_log, cancel_event, status_var, progress_callback, is_playlist=True, total_playlist_items=total_items, engine=get_engine(settings), aggregator=aggregator, bandwidth=get_bandwidth_budget(settings))
+            _record_tuning(settings, url, tuning, aggregator, success, log_callback)
+    if pipeline:
+        success = pipeline.finish(success)
+    success = _finalize(settings, work_dir, folder, success, log_callback) and success
 
     if success:
         log_callback(f"✅ 音频播放列表下载成功: {url}\n")
@@ -214,26 +888,12 @@ def download_playlist_video(url: str, settings: dict, base_path: str, log_callba
     """下载YouTube等来源的播放列表（视频）"""
     log_callback(f"🎥 检测到视频播放列表链接: {url}\n")
 
-    browser = settings.get("browser", "chrome")
-    max_res = settings.get("max_resolution", "1080")
     video_format = settings.get("video_format", "mp4")
 
-    # Get total items and title from a single meta_command call
-    playlist_title = "Untitled Playlist"
-    total_items = 0
-    try:
-        meta_command = ["yt-dlp", "--dump-single-json", "--flat-playlist", url]
-        if browser and browser.lower() != 'none':
-            meta_command.extend(["--cookies-from-browser", browser])
-        meta_process = subprocess.run(meta_command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-        if meta_process.returncode == 0:
-            metadata = json.loads(meta_process.stdout)
-            playlist_title = metadata.get('title', 'Untitled Playlist')
-            total_items = metadata.get('playlist_count', 0)
-        else:
-            log_callback(f"⚠️ 无法获取播放列表元数据，进度条可能不准确: {meta_process.stderr}\n")
-    except Exception as e:
-        log_callback(f"⚠️ 获取播放列表元数据时发生错误: {e}\n")
+    # Get total items and title from the (cached) metadata probe
+    metadata = fetch_playlist_metadata(url, settings, log_callback, max_age=_listing_max_age(settings)) or {}
+    playlist_title = metadata.get('title') or 'Untitled Playlist'
+    total_items = metadata.get('playlist_count') or 0
 
     sanitized_playlist_title = re.sub(r'[/\\?%*:|"<>\\]', '_', playlist_title)
 
@@ -245,21 +905,32 @@ def download_playlist_video(url: str, settings: dict, base_path: str, log_callba
         total_items = 1 # Prevent division by zero
 
     log_callback(f"⬇️ 正在使用下载播放列表到: {folder} (共 {total_items} 项, 视频格式: {video_format})\n")
-    
-    format_string = f"bestvideo[height<={max_res}]+bestaudio/best[height<={max_res}]"
-    command = [
-        "yt-dlp",
-        "--progress",
-        "-f", format_string,
-        "--merge-output-format", video_format,
-        "-o", os.path.join(folder, "% (title)s.%(ext)s"),
-        "--newline",
-        url
-    ]
-    if browser and browser.lower() != 'none':
-        command.insert(2, "--cookies-from-browser")
-        command.insert(3, browser)
-    success = _execute_command(command, log_callback, cancel_event, status_var, progress_callback, is_playlist=True, total_playlist_items=total_items)
+
+    work_dir = _work_dir(settings, url, folder)
+    output_template = os.path.join(work_dir, "%(title)s.%(ext)s")
+    pipeline = _postprocess_pipeline(settings, "video", folder, log_callback, cancel_event, work_dir)
+    if pipeline:
+        output_template = pipeline.output_template
+    raw = pipeline is not None
+    item_log = pipeline.log if pipeline else log_callback
+
+    def build_command(item_url, tuning):
+        return _video_command(item_url, settings, output_template, log_callback, tuning, raw)
+
+    success = _sync_playlist(url, metadata, folder, build_command, settings, item_log, cancel_event, status_var, progress_callback)
+    if success is None:
+        entries = _fanout_entries(metadata, settings)
+        if entries:
+            success = _download_playlist_fanout(entries, build_command, settings, item_log, cancel_event, status_var, progress_callback)
+        else:
+            tuning = get_download_tuner(settings).choose(url_host(url))
+            command = build_command(url, tuning)
+            aggregator = ProgressAggregator.from_entries(metadata.get("entries") or [], total_items)
+            success = _execute_command(command, item_log, cancel_event, status_var, progress_callback, is_playlist=True, total_playlist_items=total_items, engine=get_engine(settings), aggregator=aggregator, bandwidth=get_bandwidth_budget(settings))
+            _record_tuning(settings, url, tuning, aggregator, success, log_callback)
+    if pipeline:
+        success = pipeline.finish(success)
+    success = _finalize(settings, work_dir, folder, success, log_callback) and success
 
     if success:
         log_callback(f"✅ 视频播放列表下载成功: {url}\n")
@@ -269,8 +940,16 @@ def download_playlist_video(url: str, settings: dict, base_path: str, log_callba
     return success
 
 def handle_url(url: str, settings: dict, base_path: str, log_callback, cancel_event, status_var, progress_callback) -> bool:
-    """根据URL类型调用相应的下载函数"""
-    url_type = classify_url(url)
+    """根据URL类型调用相应的下载函数；下载使用规范化后的URL"""
+    config = url_config(settings)
+    if config.get("enabled", True):
+        target = normalize_url(url, config["mixed_policy"])
+        url_type = target.route
+        if url_type != INVALID:
+            url = target.url
+    else:
+        # Previous behaviour: the link is passed on as typed and any list= means the whole playlist
+        url_type = classify_url(url, "playlist")
 
     if url_type == "video":
         return download_video(url, settings, base_path, log_callback, cancel_event, status_var, progress_callback)
@@ -290,35 +969,760 @@ def handle_url(url: str, settings: dict, base_path: str, log_callback, cancel_ev
         log_callback(f"❓ 未知URL类型 {url_type}，跳过: {url}\n")
         return False
 
-if __name__ == "__main__":
-    class CLIDummy:
-        def set(self, value):
-            print(f"STATUS: {value}")
-
-    cli_settings = load_settings()
-    cli_urls = [
-        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-        "https://music.youtube.com/playlist?list=OLAK5uy_kYQ6Lvq-WTFcqHCh0z2EAuMQLmm6TkJe4", # Example music playlist
-        "https://www.youtube.com/playlist?list=PL-osiE80TeTsqhIuOqKhwlXsIBj1vCiiP", # Example video playlist
-        "this is not a url", # Example of invalid string
-    ]
+_job_stores = {}
+
+def get_job_store(settings: dict):
+    """返回共享的持久化任务队列；在设置中禁用时返回 None"""
+    config = settings.get("job_store") or {}
+    if not config.get("enabled", True):
+        return None
+    path = config.get("path") or str(get_app_support_dir() / "jobs.sqlite3")
+    with _metadata_caches_lock:
+        store = _job_stores.get(path)
+        if store is None:
+            store = JobStore(path)
+            _job_stores[path] = store
+    return store
+
+# yt-dlp output that tells which stage a running job is in
+_DESTINATION_PREFIX = "[download] Destination: "
+_POSTPROCESS_PREFIXES = ("[Merger]", "[ExtractAudio]", "[VideoConvertor]", "[VideoRemuxer]", "[FixupM3u8]",
+                         "[FixupM4a]", "[FixupStretched]", "[FixupDuplicateMoov]", "[FixupTimestamp]",
+                         "[EmbedThumbnail]", "[Metadata]", "[ffmpeg]")
+# "[3/40] " prefix of playlist items downloaded in parallel
+_ITEM_PREFIX = re.compile(r"^\[\d+/\d+\] ")
+
+def url_host(url: str) -> str:
+    """提取URL所属站点，用于按站点限制并发（youtu.be、music.youtube.com 等归为同一站点）"""
+    host = (urlparse(url).hostname or "").lower()
+    if host == "youtu.be":
+        return "youtube.com"
+    parts = host.split(".")
+    return ".".join(parts[-2:]) if len(parts) > 2 else host
+
+
+class JobStatus:
+    """单个任务的状态文本，提供与 tk.StringVar 相同的 set/get 接口"""
+
+    def __init__(self, job, on_change):
+        self._job = job
+        self._on_change = on_change
+
+    def set(self, value):
+        self._job.status_text = value
+        self._on_change(self._job)
+
+    def get(self):
+        return self._job.status_text
+
+
+class DownloadJob:
+    """调度器中的一个下载任务，记录自身的状态、进度和取消信号"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SKIPPED = "skipped"
+
+    # Finer-grained stages of a running job, as recorded in the job store
+    PROBING = "probing"
+    DOWNLOADING = "downloading"
+    POST_PROCESSING = "post-processing"
+    # A cancelled job that was stopped by a shutdown rather than by the user; it is resumed on the next start
+    INTERRUPTED = "interrupted"
+
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.url = url
+        self.host = url_host(url)
+        self.state = DownloadJob.QUEUED
+        self.progress = 0.0
+        self.status_text = "等待中"
+        self.cancel_event = threading.Event()
+        self.throttled = False
+        self.metadata = None
+        self.title = None
+        self.item_count = None
+        self.entry_ids = []
+        self.approx_bytes = None
+        self.duration = None
+        self.archived_count = 0
+        self.space_wait = None  # why the job is waiting for disk space, if it is
+        self.interrupted = False  # cancelled by a shutdown (see DownloadScheduler.cancel)
+        self.phase = None
+        self.partial_files = []
+        self.error = None
+        self.errors = ErrorClassifier()  # error lines of the current attempt
+        self.failure = None  # FailureReason once the job has failed for good
+        self.attempts = 0
+        self.retry_at = None  # monotonic time a failed job may start again
+        self.store_id = None
+        self._persisted = (None, 0.0)  # last (store_state, time) written to the job store
+        self.started_at = None
+        self.finished_at = None
+        self.timeline = JobTimeline(url, self.host)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def set_metadata(self, metadata: dict):
+        """填充预取到的元数据摘要"""
+        summary = summarize_metadata(metadata)
+        self.metadata = metadata
+        self.title = summary["title"]
+        self.item_count = summary["count"]
+        self.entry_ids = summary["ids"]
+        self.approx_bytes = summary["approx_bytes"]
+        self.duration = summary["duration"]
+
+    @property
+    def store_state(self) -> str:
+        """写入任务队列的状态：运行中的任务细分为 probing / downloading / post-processing，关闭时取消的任务为 interrupted"""
+        if self.state == DownloadJob.RUNNING:
+            return self.phase or DownloadJob.PROBING
+        if self.state == DownloadJob.CANCELLED and self.interrupted:
+            return DownloadJob.INTERRUPTED
+        return self.state
 
-    cli_cancel_event = threading.Event()
-    cli_log_callback = lambda msg: print(msg, end='')
-    cli_progress_callback = lambda p: print(f"PROGRESS: {p}%")
-    cli_base_path = "downloads_cli"
-
-    print(f"CLI模式：文件将下载到 ./{cli_base_path} 文件夹")
-
-    for i, url in enumerate(cli_urls):
-        print(f"\n--- 处理URL {i+1}/{len(cli_urls)}: {url} ---")
-        success = handle_url(url, cli_settings, cli_base_path, cli_log_callback, cli_cancel_event, CLIDummy(), cli_progress_callback)
-        if not success:
-            print(f"⚠️ 处理失败或跳过: {url}")
-
-        if i < len(cli_urls) - 1:
-            sleep_time = cli_settings.get("interval_seconds", 5)
-            print(f"⏳ 等待 {sleep_time} 秒后继续...")
-            time.sleep(sleep_time)
-    
-    print("\n🎉 所有任务完成。")
\ No newline at end of file
+    @property
+    def finished(self) -> bool:
+        return self.state in (DownloadJob.DONE, DownloadJob.FAILED, DownloadJob.CANCELLED, DownloadJob.SKIPPED)
+
+    def to_dict(self) -> dict:
+        """任务的 JSON 可序列化快照，供命令行和 HTTP 接口上报"""
+        return {
+            "id": self.index + 1, "url": self.url, "state": self.store_state,
+            "progress": round(self.progress, 1), "status": self.status_text, "title": self.title,
+            "item_count": self.item_count, "archived_count": self.archived_count, "error": self.error,
+            "attempts": self.attempts, "failure": self.failure.to_dict() if self.failure is not None else None,
+            "bandwidth": self.bandwidth_rate(),
+        }
+
+    def bandwidth_rate(self):
+        """任务当前分到的带宽 (字节/秒)；未启用带宽预算、不限速或不在下载时为 None"""
+        budget = _bandwidth_budgets.get("default")
+        return budget.allocation(self.timeline) if budget is not None else None
+
+    def __repr__(self):
+        return f"<DownloadJob #{self.index + 1} {self.state} {self.progress:.0f}% {self.url}>"
+
+
+class DownloadScheduler:
+    """有界并发的下载调度器：N 个工作线程并行执行 handle_url，并限制每个站点的同时任务数
+
+    可以在运行中继续 submit()，调用 close() 表示不会再有新任务，wait() 等待全部结束。
+    on_job_update(job) 会在任务状态或进度变化时从工作线程中调用。
+    启用 settings["rate_limit"] 时，任务的开始时间由每个站点的自适应令牌桶决定，
+    否则沿用 interval_seconds 作为每个工作线程在两个任务之间的固定等待。
+    启用 settings["job_store"] 时，每个任务的状态和未完成文件都会写入持久化队列，
+    以便程序退出或崩溃后通过 resume() 继续。
+    启用 settings["disk_admission"] 时，估算大小超出暂存目录或下载目录剩余空间的任务留在队列中，
+    直到其他任务结束或空间被释放。
+    失败的任务按 yt-dlp 输出归类 (见 retry_policy)：限流、网络错误等临时错误在退避时间后回到队列，
+    从已有的部分文件继续；私享、已删除等永久错误直接失败，job.failure 记录失败原因。
+    """
+
+    def __init__(self, settings: dict, base_path: str, log_callback, max_workers=None, per_host_limit=None, on_job_update=None, cancel_event=None, rate_limiter=None):
+        self.settings = settings
+        self.base_path = base_path
+        self.log_callback = log_callback
+        self.max_workers = max(1, int(max_workers or settings.get("max_workers", 3)))
+        self.per_host_limit = max(1, int(per_host_limit or settings.get("per_host_limit", 2)))
+        rate_limit = settings.get("rate_limit") or {}
+        if rate_limiter is None and rate_limit.get("enabled", False):
+            rate_limiter = AdaptiveRateLimiter(rate_limit, log_callback)
+        self.rate_limiter = rate_limiter
+        self.interval_seconds = 0 if rate_limiter else int(settings.get("interval_seconds", 0) or 0)
+        self.bandwidth = get_bandwidth_budget(settings)
+        self.admission = get_disk_admission(settings)
+        self.retry = get_retry_policy(settings)
+        staging = get_staging_area(settings)
+        self.staging_dir = staging.directory if staging is not None else base_path
+        self.url_config = url_config(settings)
+        self.on_job_update = on_job_update
+        self.cancel_event = cancel_event or threading.Event()
+        self.archive = get_download_archive(settings)
+        self.job_store = get_job_store(settings)
+        self.batch_id = uuid.uuid4().hex
+        self._store_lock = threading.Lock()
+        self.prefetch_seconds = 0.0
+        self._running_workers = 0
+        self._deferred = 0  # jobs whose files are still in the post-processing pool
+
+        self.jobs = []
+        self._jobs_by_key = {}  # (route, key) of the normalized URL -> job, to collapse duplicates
+        # Byte-weighted progress of the whole batch; item i is job i
+        self.aggregate = ProgressAggregator()
+        self._pending = {}  # host -> deque[DownloadJob]，保持提交顺序
+        self._retrying = []  # failed jobs waiting for their retry_at
+        self._host_active = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def submit(self, url: str, store_id=None) -> DownloadJob:
+        """加入一个新任务，运行中也可以调用；store_id 用于继续任务队列中已有的记录
+
+        URL 先规范化 (见 url_normalizer)；与排队中、运行中或已完成的任务是同一个链接时不新建任务，返回已有的任务。
+        """
+        typed = url
+        dedupe_key = None
+        if self.url_config.get("enabled", True):
+            target = normalize_url(url, self.url_config["mixed_policy"])
+            if target.route != INVALID:
+                url, dedupe_key = target.url, target.dedupe_key
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭，不能再提交任务")
+            existing = self._jobs_by_key.get(dedupe_key) if dedupe_key is not None else None
+            if existing is not None and existing.state not in (DownloadJob.FAILED, DownloadJob.CANCELLED):
+                duplicate = existing
+            else:
+                duplicate = None
+                job = self._add_job(url, store_id, dedupe_key)
+        if duplicate is not None:
+            self.log_callback(f"🔁 重复的链接，已合并到任务 #{duplicate.index + 1}: {typed}\n")
+            return duplicate
+        if job.state == DownloadJob.SKIPPED:
+            self.aggregate.finish(job.index)
+            self._finish_timeline(job)
+            self.log_callback(f"⏭️ 已存档，跳过: {job.url}\n")
+        self._notify(job)
+        return job
+
+    def _add_job(self, url: str, store_id, dedupe_key) -> DownloadJob:
+        # Called with self._cond held
+        job = DownloadJob(len(self.jobs), url)
+        job.store_id = store_id
+        if self.retry is not None:
+            job.errors = ErrorClassifier(self.retry.config)
+        self.jobs.append(job)
+        if dedupe_key is not None:
+            self._jobs_by_key[dedupe_key] = job
+        self.aggregate.add()
+        if not self._check_archive(job):
+            self._pending.setdefault(job.host, deque()).append(job)
+            self._cond.notify()
+        return job
+
+    def resume(self, stored_jobs) -> list:
+        """重新提交任务队列中未完成的任务（JobStore.unfinished() 的结果）
+
+        下载命令和输出路径与上次相同，yt-dlp 会从已有的 .part 文件继续而不是重新开始。
+        """
+        jobs = []
+        for stored in stored_jobs:
+            job = self.submit(stored["url"], store_id=stored["id"])
+            if job.store_id != stored["id"]:
+                # Collapsed into an earlier job with the same URL
+                if self.job_store is not None:
+                    self.job_store.discard([stored["id"]])
+                continue
+            job.partial_files = list(stored.get("partial_files") or [])
+            if job.partial_files:
+                existing = [path for path in job.partial_files if os.path.exists(path)]
+                self.log_callback(f"♻️ 继续未完成的任务 ({len(existing)} 个部分文件): {job.url}\n")
+            jobs.append(job)
+        return jobs
+
+    def _check_archive(self, job) -> bool:
+        """对照全局下载存档检查任务；全部已存档时标记为跳过并返回 True（调用方需持有 _cond）"""
+        if self.archive is None:
+            return False
+        keys = archive_keys_for(job.url, job.metadata)
+        if not keys:
+            return False
+        archived = sum(1 for key in keys if self.archive.contains(key))
+        job.archived_count = archived
+        if archived < len(keys):
+            if archived:
+                job.status_text = f"{archived}/{len(keys)} 项已存档"
+            return False
+        job.state = DownloadJob.SKIPPED
+        job.progress = 100.0
+        job.status_text = "已存档，跳过"
+        return True
+
+    def skipped_count(self) -> int:
+        """已存档而跳过的项目数（包括整个跳过的任务和播放列表中已存档的条目）"""
+        return sum(job.archived_count for job in list(self.jobs))
+
+    def start(self):
+        """启动工作线程"""
+        if self._workers:
+            return
+        self._running_workers = self.max_workers
+        if self.bandwidth is not None:
+            self.bandwidth.add_source(self._expected_downloads)
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{i + 1}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def close(self):
+        """不再接受新任务，队列清空后工作线程退出"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None) -> list:
+        """等待所有工作线程结束，返回全部任务"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return self.jobs
+
+    def is_alive(self) -> bool:
+        """是否还有工作线程在运行"""
+        return any(worker.is_alive() for worker in self._workers)
+
+    def prefetch(self):
+        """在开始下载前，用一次 yt-dlp 调用为所有排队中的任务预取元数据"""
+        with self._cond:
+            jobs = [job for queue in self._pending.values() for job in queue if job.metadata is None]
+        jobs_by_url = {}
+        for job in jobs:
+            jobs_by_url.setdefault(job.url, []).append(job)
+
+        def on_result(url, metadata):
+            for job in jobs_by_url.get(url, []):
+                job.set_metadata(metadata)
+                self.aggregate.set_size(job.index, job.approx_bytes, job.duration)
+                job.status_text = f"已获取元数据: {job.title or job.url}"
+                with self._cond:
+                    queue = self._pending.get(job.host)
+                    if job.state == DownloadJob.QUEUED and self._check_archive(job) and queue is not None:
+                        queue.remove(job)
+                        if not queue:
+                            del self._pending[job.host]
+                if job.state == DownloadJob.SKIPPED:
+                    self.aggregate.finish(job.index)
+                    self._finish_timeline(job)
+                    self.log_callback(f"⏭️ 已存档，跳过: {job.title or job.url}\n")
+                elif job.archived_count:
+                    self.log_callback(f"⏭️ {job.title or job.url}: {job.archived_count}/{job.item_count} 项已存档，将跳过\n")
+                self._notify(job)
+
+        started = time.monotonic()
+        prefetch_metadata(list(jobs_by_url), self.settings, self.log_callback, on_result, self.cancel_event)
+        self.prefetch_seconds += time.monotonic() - started
+        get_metrics_registry().observe("prefetch", time.monotonic() - started)
+
+    def run(self, urls) -> list:
+        """提交所有URL并阻塞到全部完成；启用 prefetch_metadata 时先批量预取元数据"""
+        for url in urls:
+            self.submit(url)
+        if self.settings.get("prefetch_metadata", False):
+            self.prefetch()
+        self.start()
+        self.close()
+        return self.wait()
+
+    def cancel(self, interrupted: bool = False):
+        """取消全部任务：正在运行的任务收到取消信号，排队中的任务直接标记为已取消
+
+        interrupted=True 表示程序正在关闭 (而不是用户取消)：未结束的任务在任务队列中记为 interrupted，下次启动时继续。
+        """
+        if interrupted:
+            for job in list(self.jobs):
+                if not job.finished:
+                    job.interrupted = True
+        self.cancel_event.set()
+        with self._cond:
+            pending = [job for queue in self._pending.values() for job in queue] + self._retrying
+            self._pending.clear()
+            self._retrying = []
+            running = [job for job in self.jobs if job.state == DownloadJob.RUNNING]
+            self._cond.notify_all()
+        for job in running:
+            job.cancel()
+        for job in pending:
+            job.cancel()
+            job.state = DownloadJob.CANCELLED
+            job.status_text = "已取消"
+            self.aggregate.finish(job.index)
+            self._finish_timeline(job)
+            self._notify(job)
+
+    def cancel_job(self, job) -> bool:
+        """取消单个任务：排队中的任务移出队列，运行中的任务收到取消信号；任务已结束时返回 False"""
+        with self._cond:
+            if job.finished:
+                return False
+            queue = self._pending.get(job.host)
+            queued = queue is not None and job in queue
+            if queued:
+                queue.remove(job)
+                if not queue:
+                    del self._pending[job.host]
+            elif job in self._retrying:
+                self._retrying.remove(job)
+                queued = True
+        job.cancel()
+        if queued:
+            job.state = DownloadJob.CANCELLED
+            job.status_text = "已取消"
+            self.aggregate.finish(job.index)
+            self._finish_timeline(job)
+            self._notify(job)
+        return True
+
+    def counts(self) -> dict:
+        """按状态统计任务数"""
+        counts = {state: 0 for state in (DownloadJob.QUEUED, DownloadJob.RUNNING, DownloadJob.DONE, DownloadJob.FAILED, DownloadJob.CANCELLED, DownloadJob.SKIPPED)}
+        for job in list(self.jobs):
+            counts[job.state] += 1
+        return counts
+
+    def overall_progress(self) -> float:
+        """整批任务按估算大小加权的总体进度 (0-100)，已结束的任务计为 100%"""
+        return self.aggregate.percent()
+
+    def describe_progress(self) -> str:
+        """整批任务的已下载量、吞吐量和剩余时间，例如 "1.2 GiB/3.4 GiB · 5.1 MiB/s · 剩余 07:20" """
+        return self.aggregate.describe()
+
+    def metrics_summary(self, details: bool = True) -> dict:
+        """整批任务各阶段的耗时统计 (见 job_metrics.summarize)"""
+        summary = summarize([job.timeline for job in list(self.jobs)],
+                            {"prefetch": self.prefetch_seconds} if self.prefetch_seconds else None)
+        summary["batch_id"] = self.batch_id
+        if not details:
+            summary.pop("job_details")
+        return summary
+
+    def _finish_timeline(self, job):
+        job.timeline.finish(job.state)
+        get_metrics_registry().record(job.timeline)
+
+    def _write_metrics_summary(self):
+        """全部工作线程结束后把本批任务的耗时统计写入应用支持目录的 metrics/<batch_id>.json"""
+        config = dict(DEFAULT_METRICS)
+        config.update(self.settings.get("metrics") or {})
+        if not config.get("enabled", True) or not self.jobs:
+            return
+        summary = self.metrics_summary()
+        directory = config.get("summary_dir") or str(get_app_support_dir() / "metrics")
+        try:
+            path = write_summary(directory, self.batch_id, summary, int(config["keep"]))
+        except OSError as e:
+            self.log_callback(f"⚠️ 无法写入耗时统计: {e}\n")
+            return
+        breakdown = describe_summary(summary)
+        if breakdown:
+            self.log_callback(f"📊 各阶段耗时: {breakdown} (详情: {path})\n")
+
+    def _persist(self, job):
+        """把任务状态写入任务队列；状态变化立即写入，进度最多每 2 秒写一次"""
+        if self.job_store is None:
+            return
+        with self._store_lock:
+            if job.store_id is None:
+                job.store_id = self.job_store.add_job(self.batch_id, job.url, self.base_path)
+            state = job.store_state
+            last_state, last_time = job._persisted
+            now = time.monotonic()
+            if state == last_state and now - last_time < 2:
+                return
+            job._persisted = (state, now)
+        try:
+            self.job_store.update(job.store_id, state=state, status_text=job.status_text,
+                                  progress=job.progress, error=job.error)
+        except Exception as e:
+            self.log_callback(f"⚠️ 无法更新任务队列: {e}\n")
+
+    def _notify(self, job):
+        self._persist(job)
+        if self.on_job_update:
+            try:
+                self.on_job_update(job)
+            except Exception as e:
+                self.log_callback(f"⚠️ 任务状态回调异常: {e}\n")
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self.cancel_event.is_set():
+                    return None
+                now = time.monotonic()
+                for job in [job for job in self._retrying if job.retry_at <= now]:
+                    # Retries go ahead of the jobs that have not started yet
+                    self._retrying.remove(job)
+                    job.retry_at = None
+                    self._pending.setdefault(job.host, deque()).appendleft(job)
+                candidates = sorted((queue[0] for host, queue in self._pending.items()
+                                     if queue and self._host_active.get(host, 0) < self.per_host_limit),
+                                    key=lambda job: job.index)
+                best = None
+                wait_timeout = None
+                for job in candidates:
+                    if not self._admit(job):
+                        if job.state == DownloadJob.FAILED:
+                            # Too large for the disk: the worker finishes it instead of waiting forever
+                            self._pending[job.host].popleft()
+                            if not self._pending[job.host]:
+                                del self._pending[job.host]
+                            return job
+                        recheck = float(self.admission.config["recheck_seconds"])
+                        wait_timeout = recheck if wait_timeout is None else min(wait_timeout, recheck)
+                        continue
+                    delay = self.rate_limiter.try_acquire(job.host) if self.rate_limiter else 0.0
+                    if delay <= 0:
+                        best = job
+                        break
+                    if self.admission is not None:
+                        self.admission.release(job)
+                    job.status_text = f"限速等待 {delay:.0f} 秒"
+                    wait_timeout = delay if wait_timeout is None else min(wait_timeout, delay)
+                if best is not None:
+                    self._pending[best.host].popleft()
+                    if not self._pending[best.host]:
+                        del self._pending[best.host]
+                    self._host_active[best.host] = self._host_active.get(best.host, 0) + 1
+                    best.state = DownloadJob.RUNNING
+                    return best
+                if self._closed and not self._pending and not self._retrying:
+                    return None
+                if self._retrying:
+                    due = max(0.0, min(job.retry_at for job in self._retrying) - now)
+                    wait_timeout = due if wait_timeout is None else min(wait_timeout, due)
+                self._cond.wait(wait_timeout)
+
+    def _admit(self, job) -> bool:
+        """磁盘空间准入检查 (调用方需持有 _cond)；放得下时为任务预留空间并返回 True
+
+        永远放不下的任务 (超过磁盘容量) 标记为失败 (disk_full) 并返回 False。
+        """
+        if self.admission is None:
+            return True
+        approx_bytes = job.approx_bytes
+        if approx_bytes and job.item_count and job.archived_count:
+            # Archived playlist entries are skipped
+            approx_bytes *= max(0, job.item_count - job.archived_count) / job.item_count
+        try:
+            oversized = self.admission.oversized(job, approx_bytes, self.staging_dir, self.base_path)
+            if oversized:
+                job.state = DownloadJob.FAILED
+                job.failure = FailureReason(DISK_FULL, False, oversized, job.attempts)
+                job.timeline.failure = DISK_FULL
+                job.error = oversized
+                job.status_text = f"磁盘空间不足: {oversized}"
+                return False
+            admitted, reason = self.admission.admit(job, approx_bytes, self.staging_dir, self.base_path,
+                                                    lambda: job.progress)
+        except OSError as e:
+            self.log_callback(f"⚠️ 无法检查剩余磁盘空间: {e}\n")
+            return True
+        if admitted:
+            job.space_wait = None
+            return True
+        if job.space_wait is None:
+            self.log_callback(f"💾 磁盘空间不足，任务 #{job.index + 1} 在队列中等待: {reason}\n")
+        job.space_wait = reason
+        job.status_text = f"等待磁盘空间: {reason}"
+        return False
+
+    def _expected_downloads(self) -> int:
+        """预计同时进行的下载数，带宽预算按它计算子进程下载的份额"""
+        with self._cond:
+            queued = sum(len(queue) for queue in self._pending.values())
+            running = sum(self._host_active.values())
+        return min(self.max_workers, queued + running)
+
+    def _has_pending(self) -> bool:
+        with self._cond:
+            return bool(self._pending) or bool(self._retrying) or not self._closed
+
+    def _job_prefix(self, job) -> str:
+        return f"[#{job.index + 1}] " if self.max_workers > 1 else ""
+
+    def _job_log(self, job):
+        prefix = self._job_prefix(job)
+
+        def log(msg):
+            if self.rate_limiter and is_throttle_message(msg):
+                job.throttled = True
+                self.rate_limiter.record_throttle(job.host, msg)
+            self._track_phase(job, msg)
+            stripped = msg.lstrip("\n")
+            self.log_callback(msg[:len(msg) - len(stripped)] + prefix + stripped)
+        return log
+
+    def _track_phase(self, job, msg):
+        """从 yt-dlp 输出中识别任务阶段、正在写入的文件和错误信息"""
+        line = _ITEM_PREFIX.sub("", msg.strip(), count=1)
+        if line.startswith(_DESTINATION_PREFIX):
+            path = os.path.abspath(line[len(_DESTINATION_PREFIX):])
+            job.phase = DownloadJob.DOWNLOADING
+            if path + ".part" not in job.partial_files:
+                job.partial_files.append(path + ".part")
+            if self.job_store is not None and job.store_id is not None:
+                try:
+                    self.job_store.add_partial_file(job.store_id, path + ".part")
+                except Exception as e:
+                    self.log_callback(f"⚠️ 无法更新任务队列: {e}\n")
+            self._notify(job)
+        elif line.startswith(_POSTPROCESS_PREFIXES):
+            if job.phase != DownloadJob.POST_PROCESSING:
+                job.phase = DownloadJob.POST_PROCESSING
+                self._notify(job)
+        else:
+            if not _ITEM_PREFIX.match(msg.strip()):
+                # Playlist items downloaded in parallel are classified and retried on their own
+                job.errors.feed(line)
+            if line.startswith("ERROR:"):
+                job.error = line
+
+    def _worker_loop(self):
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                if job.state == DownloadJob.FAILED:
+                    self._reject(job)
+                    continue
+                try:
+                    self._run_job(job)
+                finally:
+                    with self._cond:
+                        self._host_active[job.host] -= 1
+                        self._cond.notify_all()
+                if self.interval_seconds > 0 and self._has_pending() and not self.cancel_event.is_set():
+                    self._job_log(job)(f"⏳ 等待 {self.interval_seconds} 秒后开始下一个任务...\n")
+                    started = time.monotonic()
+                    self.cancel_event.wait(self.interval_seconds)
+                    # Counted against the job that preceded the wait
+                    job.timeline.add_span("interval_wait", started, time.monotonic() - started)
+                    get_metrics_registry().observe("interval_wait", time.monotonic() - started)
+        finally:
+            with self._cond:
+                self._running_workers -= 1
+                last = self._running_workers == 0
+                # The last worker stays alive until deferred jobs finish, so wait() and is_alive() cover them
+                while last and self._deferred:
+                    self._cond.wait()
+            if last:
+                if self.bandwidth is not None:
+                    self.bandwidth.remove_source(self._expected_downloads)
+                self._write_metrics_summary()
+
+    def _run_job(self, job):
+        job.attempts += 1
+        if job.attempts == 1:
+            job.started_at = time.monotonic()
+            job.timeline.start()
+        else:
+            # From the failed attempt to now: backoff, then waiting for a free slot
+            job.timeline.add_span("retry_wait", job.finished_at, time.monotonic() - job.finished_at)
+            job.finished_at = None
+            job.phase = None
+            job.error = None
+            job.errors.reset()
+        self._notify(job)
+        log = self._job_log(job)
+
+        def progress(percentage):
+            job.progress = percentage
+            self.aggregate.update(job.index, percent=percentage)
+            if percentage > 0 and job.phase is None:
+                job.phase = DownloadJob.DOWNLOADING
+            self._notify(job)
+
+        log(f"\n--- ({job.index + 1}/{len(self.jobs)}) 处理URL: {job.url} ---\n")
+        if job.attempts > 1:
+            partial = [path for path in job.partial_files if os.path.exists(path)]
+            log(f"♻️ 第 {job.attempts} 次尝试" + (f"，从 {len(partial)} 个部分文件继续\n" if partial else "\n"))
+        # In pipeline mode the files go to the post-processing pool; the job finishes once they are done
+        batch = PostprocessBatch(log, job.cancel_event, job.timeline)
+        try:
+            with active_timeline(job.timeline), active_batch(batch), active_classifier(job.errors):
+                success = handle_url(job.url, self.settings, self.base_path, log, job.cancel_event, JobStatus(job, self._notify), progress)
+        except Exception as e:
+            log(f"⚠️ 任务异常: {e}\n")
+            success = False
+
+        if success and batch.pending():
+            job.phase = DownloadJob.POST_PROCESSING
+            job.status_text = "等待后处理"
+            with self._cond:
+                self._deferred += 1
+            self._notify(job)
+            batch.on_complete(lambda ok: self._complete_deferred(job, ok))
+            return
+        self._complete_job(job, success and batch.wait())
+
+    def _reject(self, job):
+        """结束一个没有开始就失败的任务 (见 _admit)"""
+        job.finished_at = time.monotonic()
+        self.log_callback(f"❌ 磁盘空间不足，任务 #{job.index + 1} 无法开始: {job.failure.message}\n")
+        self.aggregate.finish(job.index)
+        self._finish_timeline(job)
+        self._notify(job)
+
+    def _complete_deferred(self, job, success: bool):
+        try:
+            # The downloaded files were already handed to the post-processing pool; a retry would download them again
+            self._complete_job(job, success, retry=False)
+        finally:
+            with self._cond:
+                self._deferred -= 1
+                self._cond.notify_all()
+
+    def _complete_job(self, job, success: bool, retry: bool = True):
+        job.finished_at = time.monotonic()
+        if self.admission is not None:
+            self.admission.release(job)
+        if success:
+            job.state = DownloadJob.DONE
+            job.progress = 100.0
+            if self.rate_limiter and not job.throttled:
+                self.rate_limiter.record_success(job.host)
+        else:
+            cancelled = job.cancel_event.is_set() or self.cancel_event.is_set()
+            reason = job.errors.reason(job.attempts)
+            if not cancelled and retry and self._schedule_retry(job, reason):
+                return
+            # Checked again: _schedule_retry also declines when a cancel arrives after the failure
+            if job.cancel_event.is_set() or self.cancel_event.is_set():
+                job.state = DownloadJob.CANCELLED
+            else:
+                job.state = DownloadJob.FAILED
+                job.failure = reason
+                job.timeline.failure = reason.category
+                job.error = reason.message or job.error
+        self.aggregate.finish(job.index)
+        self._finish_timeline(job)
+        self._notify(job)
+
+    def _schedule_retry(self, job, reason) -> bool:
+        """临时错误且未超过重试次数时把任务放回队列，退避时间后再开始；不重试时返回 False"""
+        if self.retry is None or not reason.transient or not self.retry.should_retry(reason.category, job.attempts):
+            return False
+        delay = self.retry.delay(reason.category, job.attempts)
+        max_attempts = self.retry.max_attempts(reason.category)
+        with self._cond:
+            if self.cancel_event.is_set() or job.cancel_event.is_set():
+                return False
+            job.state = DownloadJob.QUEUED
+            job.phase = None
+            job.retry_at = time.monotonic() + delay
+            job.status_text = f"{reason.label}，{delay:.0f} 秒后重试 ({job.attempts + 1}/{max_attempts})"
+            self._retrying.append(job)
+            self._cond.notify_all()
+        job.timeline.retries += 1
+        get_metrics_registry().record_retry(reason.category)
+        # Not through _job_log: the notice repeats the error line, which must not count as a second throttle or error
+        self.log_callback(f"{self._job_prefix(job)}🔁 {reason.label}: {reason.message or job.url}，{delay:.0f} 秒后第 "
+                          f"{job.attempts + 1}/{max_attempts} 次尝试\n")
+        self._notify(job)
+        return True
+
+
+if __name__ == "__main__":
+    # The command-line entry point lives in download_cli.py; keep this for "python download_logic.py URL..."
+    import sys
+    from download_cli import main
+    sys.exit(main())
@@ -0,0 +1,376 @@
+import csv
+import datetime
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+from bandwidth import DEFAULT_BANDWIDTH, format_rate, limit_at, parse_rate
+from download_archive import archive_key, archive_keys_for
+from download_logic import get_app_support_dir, get_download_archive, prefetch_metadata, probe_formats, url_host
+from job_metrics import DEFAULT_METRICS
+from playlist_sync import playlist_items_spec
+from progress_model import format_bytes, format_eta
+from rate_limiter import DEFAULT_RATE_LIMIT
+from staging import DEFAULT_DISK_ADMISSION, DEFAULT_STAGING, existing_path
+from url_normalizer import INVALID, MUSIC_PLAYLIST, UNSUPPORTED_SPOTIFY, VIDEO, dedupe_urls, normalize_url, url_config
+
+DEFAULT_PLANNER = {
+    "workers": 8,            # yt-dlp format probes running at once
+    "chunk_items": 50,       # playlist entries resolved by one probe process
+    "assumed_rate": "5M",    # speed of one download on a site with no measured history (units of --limit-rate)
+    "history_batches": 20,   # recent metrics summaries (metrics/<batch>.json) used to measure each site's speed
+}
+
+# Columns of the CSV plan, one row per input URL
+PLAN_COLUMNS = ("url", "route", "state", "title", "host", "entries", "archived", "to_download", "unknown_size",
+                "bytes", "duration", "format", "resolution", "estimated_seconds", "error")
+
+# Row states
+PLANNED = "planned"
+ARCHIVED = "archived"
+DUPLICATE = "duplicate"
+UNSUPPORTED = "unsupported"
+FAILED = "failed"
+
+
+def planner_config(settings: dict) -> dict:
+    config = dict(DEFAULT_PLANNER)
+    config.update(settings.get("planner") or {})
+    return config
+
+
+def entry_bytes(entry: dict):
+    """选中格式的大小：filesize / filesize_approx，否则按平均码率 (tbr, kbit/s) 和时长估算；未知时返回 None"""
+    size = entry.get("filesize") or entry.get("filesize_approx")
+    if size:
+        return int(size)
+    if entry.get("tbr") and entry.get("duration"):
+        return int(float(entry["tbr"]) * 1000 / 8 * float(entry["duration"]))
+    return None
+
+
+def measured_rates(settings: dict) -> dict:
+    """从最近的耗时统计 (见 job_metrics) 中测得的每个站点单个下载的速度 {站点: 字节/秒}"""
+    metrics = dict(DEFAULT_METRICS)
+    metrics.update(settings.get("metrics") or {})
+    directory = metrics.get("summary_dir") or str(get_app_support_dir() / "metrics")
+    try:
+        paths = sorted((os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")),
+                       key=os.path.getmtime)
+    except OSError:
+        return {}
+    totals = {}  # host -> [bytes, download seconds]
+    for path in paths[-int(planner_config(settings)["history_batches"]):]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        for job in summary.get("job_details") or []:
+            seconds = (job.get("phases") or {}).get("download")
+            if job.get("host") and job.get("bytes") and seconds:
+                total = totals.setdefault(job["host"], [0, 0.0])
+                total[0] += job["bytes"]
+                total[1] += seconds
+    return {host: size / seconds for host, (size, seconds) in totals.items() if size >= 1024 * 1024 and seconds > 0}
+
+
+def pacing_seconds(downloads: int, settings: dict) -> float:
+    """调度器在一个站点上开始 downloads 个任务至少需要的时间 (自适应限速的令牌桶，假设没有遇到限流)"""
+    if downloads <= 1:
+        return 0.0
+    config = dict(DEFAULT_RATE_LIMIT)
+    config.update(settings.get("rate_limit") or {})
+    if not config.get("enabled", True):
+        workers = max(1, int(settings.get("max_workers", 3)))
+        return (downloads - 1) / workers * float(settings.get("interval_seconds", 0) or 0)
+    rate = float(config["initial_per_minute"])
+    seconds = 0.0
+    # The bucket starts with one token; every further start waits for a token, and each success speeds the rate up
+    for _ in range(downloads - 1):
+        seconds += 60.0 / rate
+        rate = min(float(config["max_per_minute"]), rate + float(config["increase_per_minute"]))
+    return seconds
+
+
+def disk_check(sizes: list, settings: dict, base_path: str) -> list:
+    """下载目录 (和暂存目录) 的剩余空间是否放得下整批下载；sizes 是每个任务的 (总大小, 最大条目的大小)
+
+    下载目录需要全部文件的大小；合并时视频流、音频流和合并后的文件同时存在，所以同时进行的
+    max_workers 个任务中最大的条目另需 size_margin 倍的空间 (启用暂存目录时在暂存目录中)。
+    """
+    admission = dict(DEFAULT_DISK_ADMISSION)
+    admission.update(settings.get("disk_admission") or {})
+    margin = max(1.0, float(admission["size_margin"]))
+    min_free = float(admission["min_free_mb"]) * 1024 * 1024
+    largest = sorted(item for _, item in sizes)
+    concurrent = sum(largest[-max(1, int(settings.get("max_workers", 3))):])
+    needs = {}  # device -> [path, bytes]
+    destination = existing_path(base_path)
+    needs[os.stat(destination).st_dev] = [destination, float(sum(total for total, _ in sizes))]
+    staging = dict(DEFAULT_STAGING)
+    staging.update(settings.get("staging") or {})
+    work = existing_path(staging.get("directory") or str(get_app_support_dir() / "staging")) if staging.get("enabled") else destination
+    device = os.stat(work).st_dev
+    if device in needs:
+        needs[device][1] += concurrent * (margin - 1)
+    else:
+        needs[device] = [work, concurrent * margin]
+    checks = []
+    for path, needed in needs.values():
+        free = shutil.disk_usage(path).free
+        checks.append({"path": path, "needed": int(needed), "free": free, "min_free": int(min_free),
+                       "fits": needed <= free - min_free})
+    return checks
+
+
+class _PlanRow:
+    """一个输入URL的计划，由多个探测结果 (播放列表按条目分块) 累加而成"""
+
+    def __init__(self, url: str, route: str):
+        self.url = url
+        self.route = route
+        self.state = PLANNED
+        self.title = None
+        self.host = url_host(url)
+        self.entries = 0
+        self.archived = 0
+        self.sizes = []     # known or estimated size of each entry to download
+        self.durations = []
+        self.unknown = []   # entries whose size is unknown: their durations (or None)
+        self.formats = {}
+        self.resolutions = {}
+        self.error = None
+
+    def add(self, entry: dict):
+        if self.title is None and self.route == VIDEO:
+            self.title = entry.get("title")
+        size = entry_bytes(entry)
+        if size is None:
+            self.unknown.append(entry.get("duration"))
+        else:
+            self.sizes.append(size)
+            self.durations.append(entry.get("duration"))
+        for key, counts in (("format_id", self.formats), ("resolution", self.resolutions)):
+            if entry.get(key):
+                counts[entry[key]] = counts.get(entry[key], 0) + 1
+
+    def total_bytes(self) -> int:
+        """已知大小之和，加上大小未知的条目按已知条目的平均码率 (或平均大小) 的估算"""
+        known = sum(self.sizes)
+        timed = [(size, duration) for size, duration in zip(self.sizes, self.durations) if duration]
+        per_second = sum(size for size, _ in timed) / sum(duration for _, duration in timed) if timed else None
+        average = known / len(self.sizes) if self.sizes else 0
+        estimated = sum(per_second * duration if per_second and duration else average for duration in self.unknown)
+        return int(known + estimated)
+
+    def to_dict(self, rate) -> dict:
+        size = self.total_bytes()
+        durations = [duration for duration in self.durations + self.unknown if duration]
+        return {
+            "url": self.url, "route": self.route, "state": self.state, "title": self.title, "host": self.host,
+            "entries": self.entries, "archived": self.archived, "to_download": len(self.sizes) + len(self.unknown),
+            "unknown_size": len(self.unknown), "bytes": size, "duration": round(sum(durations)) if durations else None,
+            "format": max(self.formats, key=self.formats.get) if self.formats else None,
+            "resolution": max(self.resolutions, key=self.resolutions.get) if self.resolutions else None,
+            "estimated_seconds": round(size / rate) if rate and size else 0,
+            "error": self.error,
+        }
+
+
+def plan_batch(urls, settings: dict, base_path: str, log_callback, cancel_event=None) -> dict:
+    """不下载，估算一批URL的下载量、耗时和磁盘空间
+
+    播放列表先用一次批量的 yt-dlp 调用列出 (见 prefetch_metadata)，然后每个URL (播放列表为每个未存档的条目)
+    用与下载相同的格式选择 (max_resolution / 音频) 解析，探测在 planner.workers 个并行的 yt-dlp 进程中进行。耗时按每个站点测得的速度 (没有历史时为 assumed_rate)、
+    并发数、带宽预算和自适应限速的任务开始频率估算。返回的计划可用 write_plan() 写成 JSON 或 CSV。
+    """
+    config = planner_config(settings)
+    started = time.monotonic()
+    normalizer = url_config(settings)
+    if normalizer.get("enabled", True):
+        targets, duplicates = dedupe_urls(urls, normalizer["mixed_policy"])
+    else:
+        targets, duplicates = [normalize_url(url.strip(), "playlist") for url in urls if url.strip()], []
+    archive = get_download_archive(settings)
+
+    rows = []
+    tasks = deque()  # (row, url, kind, playlist items)
+    playlists = []   # (row, url, kind)
+    for target in targets:
+        url = target.url if normalizer.get("enabled", True) and target.route != INVALID else target.original
+        row = _PlanRow(url, target.route)
+        rows.append(row)
+        if target.route in (INVALID, UNSUPPORTED_SPOTIFY):
+            row.state = UNSUPPORTED
+            row.error = "无效输入" if target.route == INVALID else "不支持Spotify链接"
+        elif target.route == VIDEO:
+            row.entries = 1
+            keys = archive_keys_for(url)
+            if archive is not None and keys and all(archive.contains(key) for key in keys):
+                row.state, row.archived = ARCHIVED, 1
+            else:
+                tasks.append((row, url, "video", None))
+        else:
+            playlists.append((row, url, "audio" if target.route == MUSIC_PLAYLIST else "video"))
+    # One batch yt-dlp run lists every playlist (and fills the metadata cache the downloads use later)
+    listings = prefetch_metadata([url for _, url, _ in playlists], settings, log_callback, cancel_event=cancel_event) if playlists else {}
+    chunk = max(1, int(config["chunk_items"]))
+    for row, url, kind in playlists:
+        metadata = listings.get(url)
+        if metadata is None:
+            tasks.append((row, url, kind, None))
+            continue
+        row.title = metadata.get("title")
+        entries = metadata.get("entries") or []
+        row.entries = len(entries)
+        positions = []
+        for position, entry in enumerate(entries, 1):
+            extractor = entry and (entry.get("ie_key") or entry.get("extractor_key"))
+            if archive is not None and extractor and entry.get("id") and archive.contains(archive_key(extractor, entry["id"])):
+                row.archived += 1
+            else:
+                positions.append(position)
+        if entries and not positions:
+            row.state = ARCHIVED
+        for i in range(0, len(positions), chunk):
+            tasks.append((row, url, kind, playlist_items_spec(positions[i:i + chunk])))
+    for duplicate, first in duplicates:
+        row = _PlanRow(duplicate.original, duplicate.route)
+        row.state = DUPLICATE
+        row.error = f"与 {first.original} 相同"
+        rows.append(row)
+
+    lock = threading.Lock()
+    probes = len(tasks)
+    workers = min(max(1, int(config["workers"])), max(1, probes))
+    if probes:
+        log_callback(f"🔎 正在解析 {sum(1 for row in rows if row.state == PLANNED)} 个链接的格式 "
+                     f"({probes} 次探测，同时 {workers} 个)...\n")
+
+    def worker():
+        while True:
+            with lock:
+                if not tasks or (cancel_event is not None and cancel_event.is_set()):
+                    return
+                row, url, kind, items = tasks.popleft()
+            entries, error = probe_formats(url, settings, kind, log_callback, items)
+            with lock:
+                for entry in entries:
+                    row.add(entry)
+                if error:
+                    row.error = error
+                    log_callback(f"⚠️ 无法解析 {url}{f' (条目 {items})' if items else ''}: {error}\n")
+
+    threads = [threading.Thread(target=worker, name=f"plan-probe-{i + 1}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for row in rows:
+        if row.state == PLANNED and not row.sizes and not row.unknown and row.error:
+            row.state = FAILED
+    return _summarize(rows, settings, base_path, config, time.monotonic() - started)
+
+
+def _summarize(rows: list, settings: dict, base_path: str, config: dict, probe_seconds: float) -> dict:
+    measured = measured_rates(settings)
+    assumed = parse_rate(config["assumed_rate"]) or 5 * 1024 * 1024
+    workers = max(1, int(settings.get("max_workers", 3)))
+    per_host = min(workers, max(1, int(settings.get("per_host_limit", 2))))
+    bandwidth = dict(DEFAULT_BANDWIDTH)
+    bandwidth.update(settings.get("bandwidth") or {})
+    limit = limit_at(bandwidth, datetime.datetime.now())[0] if bandwidth.get("enabled") else None
+
+    hosts = {}
+    for row in rows:
+        if row.state == PLANNED:
+            host = hosts.setdefault(row.host, {"bytes": 0, "downloads": 0})
+            host["bytes"] += row.total_bytes()
+            host["downloads"] += 1
+    slowest = 0.0
+    capacity = 0.0
+    for name, host in hosts.items():
+        rate = measured.get(name) or assumed
+        host_capacity = rate * min(per_host, host["downloads"])
+        if limit is not None:
+            host_capacity = min(host_capacity, limit)
+        capacity += host_capacity
+        host.update(rate=round(rate), measured=name in measured, transfer_seconds=round(host["bytes"] / host_capacity),
+                    pacing_seconds=round(pacing_seconds(host["downloads"], settings)))
+        slowest = max(slowest, host["transfer_seconds"], host["pacing_seconds"])
+    total_bytes = sum(host["bytes"] for host in hosts.values())
+    # All sites share max_workers and the bandwidth budget
+    capacity = min(capacity, max((host["rate"] for host in hosts.values()), default=0) * workers)
+    if limit is not None:
+        capacity = min(capacity, limit)
+    estimated = max(slowest, total_bytes / capacity if capacity else 0.0)
+
+    sizes = [(row.total_bytes(), max(row.sizes, default=0)) for row in rows if row.state == PLANNED]
+    disk = disk_check(sizes, settings, base_path)
+    items = [row.to_dict(measured.get(row.host) or assumed) for row in rows]
+    return {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: settings.get(key) for key in ("max_resolution", "video_format", "audio_format",
+                                                         "max_workers", "per_host_limit")},
+        "totals": {
+            "urls": len(rows),
+            "planned": sum(1 for row in rows if row.state == PLANNED),
+            "archived": sum(1 for row in rows if row.state == ARCHIVED),
+            "duplicates": sum(1 for row in rows if row.state == DUPLICATE),
+            "failed": sum(1 for row in rows if row.state in (FAILED, UNSUPPORTED)),
+            "entries": sum(item["to_download"] for item in items),
+            "archived_entries": sum(row.archived for row in rows),
+            "unknown_size": sum(item["unknown_size"] for item in items),
+            "bytes": total_bytes,
+            "estimated_seconds": round(estimated),
+            "bandwidth_limit": limit,
+            "probe_seconds": round(probe_seconds, 1),
+        },
+        "fits": all(check["fits"] for check in disk),
+        "disk": disk,
+        "hosts": hosts,
+        "urls": items,
+    }
+
+
+def write_plan(plan: dict, path: str):
+    """把计划写入 path：.csv 为每个URL一行的 CSV，其他为 JSON；"-" 写到标准输出 (JSON)"""
+    if path == "-":
+        json.dump(plan, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return
+    if path.lower().endswith(".csv"):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=PLAN_COLUMNS)
+            writer.writeheader()
+            writer.writerows(plan["urls"])
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+
+def describe_plan(plan: dict) -> str:
+    """计划的几行摘要：下载量、预计耗时和每个磁盘是否放得下"""
+    totals = plan["totals"]
+    lines = [f"📋 {totals['urls']} 个链接：计划下载 {totals['entries']} 项，已存档 {totals['archived_entries']} 项，"
+             f"重复 {totals['duplicates']} 个，无法解析 {totals['failed']} 个 (探测用时 {totals['probe_seconds']} 秒)"]
+    unknown = f" (其中 {totals['unknown_size']} 项大小未知，按平均码率估算)" if totals["unknown_size"] else ""
+    lines.append(f"📦 预计下载 {format_bytes(totals['bytes'])}{unknown}，约需 {format_eta(totals['estimated_seconds'])}")
+    for name, host in sorted(plan["hosts"].items(), key=lambda item: -item[1]["bytes"]):
+        source = "历史测量" if host["measured"] else "假设"
+        lines.append(f"   {name}: {host['downloads']} 个任务，{format_bytes(host['bytes'])}，"
+                     f"单个下载 {format_rate(host['rate'])} ({source})，传输 {format_eta(host['transfer_seconds'])}，"
+                     f"限速下开始全部任务 {format_eta(host['pacing_seconds'])}")
+    if totals["bandwidth_limit"]:
+        lines.append(f"   带宽预算: {format_rate(totals['bandwidth_limit'])}")
+    for check in plan["disk"]:
+        verdict = "✅ 放得下" if check["fits"] else "❌ 空间不足"
+        lines.append(f"💾 {check['path']}: 需要 {format_bytes(check['needed'])}，可用 {format_bytes(check['free'])} "
+                     f"(保留 {format_bytes(check['min_free'])}) {verdict}")
+    return "\n".join(lines) + "\n"
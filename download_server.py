@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+
+from download_cli import add_settings_arguments, resolve_settings
+from download_logic import DownloadScheduler, DownloadJob, classify_url, get_job_store
+from url_normalizer import url_config
+from job_metrics import get_metrics_registry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8756
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# SSE comment lines keep idle streams open through proxies and reveal disconnected clients
+KEEPALIVE_SECONDS = 15
+
+_FINAL_STATES = (DownloadJob.DONE, DownloadJob.FAILED, DownloadJob.CANCELLED, DownloadJob.SKIPPED,
+                DownloadJob.INTERRUPTED)
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Subscription:
+    """一个进度流的订阅：每个任务只保留最新的快照，慢速客户端不会积压事件"""
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id  # None: all jobs
+        self._latest = {}
+        self._event = asyncio.Event()
+
+    def push(self, snapshot: dict):
+        if self.job_id is not None and snapshot["id"] != self.job_id:
+            return
+        self._latest[snapshot["id"]] = snapshot
+        self._event.set()
+
+    async def next_batch(self, timeout: float) -> list:
+        """等待下一批快照；超时返回空列表"""
+        if not self._latest:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self._latest.values())
+        self._latest.clear()
+        return batch
+
+
+class EventHub:
+    """把工作线程中的任务更新转交给事件循环，再分发给所有订阅者
+
+    工作线程只调用 publish()，快照和分发都在事件循环线程中完成；
+    所有进度流共用一个事件循环，不需要为每个客户端开线程。
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscriptions = set()
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._scheduled = False
+
+    def publish(self, job):
+        """从任意线程调用；同一轮事件循环中多次更新同一任务只分发一次"""
+        with self._lock:
+            self._dirty[job.index] = job
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self.loop.call_soon_threadsafe(self._dispatch)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def _dispatch(self):
+        with self._lock:
+            jobs = list(self._dirty.values())
+            self._dirty.clear()
+            self._scheduled = False
+        for job in jobs:
+            snapshot = job.to_dict()
+            for subscription in list(self.subscriptions):
+                subscription.push(snapshot)
+
+
+class DownloadServer:
+    """本地 HTTP/JSON 接口：提交、查询、取消下载任务，并通过 SSE 或 NDJSON 推送进度
+
+        POST   /jobs              {"url": "..."} 或 {"urls": [...]}，返回新建的任务
+        GET    /jobs              全部任务
+        GET    /jobs/<id>         单个任务
+        DELETE /jobs/<id>         取消任务 (也可以 POST /jobs/<id>/cancel)
+        GET    /jobs/<id>/events  单个任务的进度流，任务结束后关闭
+        GET    /events            全部任务的进度流
+        GET    /health            调度器状态统计
+
+    进度流默认为 Server-Sent Events；带 ?format=ndjson 或 Accept: application/x-ndjson 时为分块传输的 NDJSON。
+    """
+
+    def __init__(self, scheduler: DownloadScheduler, hub: EventHub, token=None):
+        self.scheduler = scheduler
+        self.hub = hub
+        self.token = token
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    streamed = await self._route(writer, method, path, query, headers, body, keep_alive)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive)
+                    streamed = False
+                if streamed or not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过大")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "无效的请求行")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        parsed = urlparse(target)
+        return method.upper(), parsed.path.rstrip("/") or "/", parse_qs(parsed.query), headers, body
+
+    async def _route(self, writer, method, path, query, headers, body, keep_alive) -> bool:
+        """处理一个请求；返回 True 表示已作为进度流响应并应关闭连接"""
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "缺少或错误的令牌")
+        parts = path.strip("/").split("/")
+
+        if path == "/health" and method == "GET":
+            await self._send_json(writer, HTTPStatus.OK, {
+                "counts": self.scheduler.counts(), "progress": self.scheduler.aggregate.snapshot(),
+                "streams": len(self.hub.subscriptions), "threads": threading.active_count(),
+            }, keep_alive)
+        elif path == "/metrics" and method == "GET":
+            if query.get("format", [""])[0] == "json":
+                await self._send_json(writer, HTTPStatus.OK, {
+                    "totals": get_metrics_registry().snapshot(), "batch": self.scheduler.metrics_summary(details=False),
+                }, keep_alive)
+            else:
+                await self._send(writer, HTTPStatus.OK, get_metrics_registry().to_prometheus().encode("utf-8"),
+                                 "text/plain; version=0.0.4; charset=utf-8", keep_alive)
+        elif path == "/jobs" and method == "GET":
+            await self._send_json(writer, HTTPStatus.OK, {"jobs": [job.to_dict() for job in list(self.scheduler.jobs)]}, keep_alive)
+        elif path == "/jobs" and method == "POST":
+            jobs = [self.scheduler.submit(url) for url in self._parse_urls(body)]
+            await self._send_json(writer, HTTPStatus.CREATED, {"jobs": [job.to_dict() for job in jobs]}, keep_alive)
+        elif path == "/events" and method == "GET":
+            await self._stream(writer, query, headers, None)
+            return True
+        elif parts[0] == "jobs" and len(parts) in (2, 3):
+            job = self._find_job(parts[1])
+            action = parts[2] if len(parts) == 3 else None
+            if action is None and method == "GET":
+                await self._send_json(writer, HTTPStatus.OK, job.to_dict(), keep_alive)
+            elif (action is None and method == "DELETE") or (action == "cancel" and method == "POST"):
+                if not self.scheduler.cancel_job(job):
+                    raise HttpError(HTTPStatus.CONFLICT, "任务已结束")
+                await self._send_json(writer, HTTPStatus.ACCEPTED, job.to_dict(), keep_alive)
+            elif action == "events" and method == "GET":
+                await self._stream(writer, query, headers, job)
+                return True
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, "未知的接口")
+        else:
+            raise HttpError(HTTPStatus.NOT_FOUND, "未知的接口")
+        return False
+
+    def _parse_urls(self, body: bytes) -> list:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求体不是合法的 JSON")
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求体应为 JSON 对象")
+        urls = data.get("urls") or ([data["url"]] if data.get("url") else [])
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "需要 url 或 urls 字段")
+        urls = [url.strip() for url in urls]
+        policy = url_config(self.scheduler.settings)["mixed_policy"]
+        invalid = [url for url in urls if classify_url(url, policy) in ("invalid_string", "unsupported_spotify")]
+        if invalid:
+            raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, f"不支持的URL: {', '.join(invalid)}")
+        return urls
+
+    def _find_job(self, job_id: str):
+        jobs = self.scheduler.jobs
+        if not job_id.isdigit() or not 1 <= int(job_id) <= len(jobs):
+            raise HttpError(HTTPStatus.NOT_FOUND, "任务不存在")
+        return jobs[int(job_id) - 1]
+
+    async def _send_json(self, writer, status: HTTPStatus, payload, keep_alive=True):
+        await self._send(writer, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", keep_alive)
+
+    async def _send(self, writer, status: HTTPStatus, body: bytes, content_type: str, keep_alive=True):
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _stream(self, writer, query, headers, job):
+        """以 SSE 或分块 NDJSON 推送任务快照；单个任务的流在任务结束后关闭"""
+        ndjson = query.get("format", [""])[0] == "ndjson" or "application/x-ndjson" in headers.get("accept", "")
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {'application/x-ndjson' if ndjson else 'text/event-stream'}; charset=utf-8\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1"))
+
+        def chunk(text: str):
+            data = text.encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+        def event(snapshot):
+            payload = json.dumps(snapshot, ensure_ascii=False)
+            return payload + "\n" if ndjson else f"event: job\nid: {snapshot['id']}\ndata: {payload}\n\n"
+
+        subscription = Subscription(None if job is None else job.index + 1)
+        self.hub.subscriptions.add(subscription)
+        try:
+            # Start with the current state so clients never miss a job that finished before they connected
+            initial = [job] if job is not None else list(self.scheduler.jobs)
+            chunk("".join(event(item.to_dict()) for item in initial) or (": connected\n\n" if not ndjson else "\n"))
+            await writer.drain()
+            finished = job is not None and job.finished
+            while not finished:
+                batch = await subscription.next_batch(KEEPALIVE_SECONDS)
+                if batch:
+                    chunk("".join(event(snapshot) for snapshot in batch))
+                    # Decide on the snapshot just sent, so the final state always reaches the client
+                    finished = job is not None and batch[-1]["state"] in _FINAL_STATES
+                else:
+                    chunk("\n" if ndjson else ": keep-alive\n\n")
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            self.hub.subscriptions.discard(subscription)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="download_server.py",
+        description="本地 HTTP/JSON 下载服务：通过 POST /jobs 提交URL，通过 SSE 或 NDJSON 跟踪进度。",
+    )
+    parser.add_argument("-o", "--output", default=".", metavar="DIR", help="下载根目录 (默认: 当前目录)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址 (默认: {DEFAULT_HOST}，仅本机)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口 (默认: {DEFAULT_PORT})")
+    parser.add_argument("--token", default=os.environ.get("YOUTUBE_DOWNLOADER_TOKEN"),
+                        help="要求请求携带 Authorization: Bearer <token> (默认读取 YOUTUBE_DOWNLOADER_TOKEN)")
+    add_settings_arguments(parser)
+    parser.add_argument("--resume", action="store_true", help="启动时继续任务队列中未完成的任务")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出下载日志")
+    return parser
+
+
+async def serve(args) -> int:
+    settings = resolve_settings(args)
+    base_path = os.path.abspath(args.output)
+    os.makedirs(base_path, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    hub = EventHub(loop)
+
+    def log(msg):
+        if not args.quiet:
+            sys.stderr.write(msg)
+            sys.stderr.flush()
+
+    scheduler = DownloadScheduler(settings, base_path, log, on_job_update=hub.publish)
+    if args.resume:
+        store = get_job_store(settings)
+        if store is not None:
+            stored = [job for job in store.unfinished() if job["base_path"] == base_path]
+            if stored:
+                log(f"♻️ 继续 {len(stored)} 个未完成的任务\n")
+                scheduler.resume(stored)
+    scheduler.start()
+
+    app = DownloadServer(scheduler, hub, token=args.token)
+    server = await asyncio.start_server(app.handle_connection, args.host, args.port,
+                                        limit=MAX_HEADER_BYTES, backlog=512)
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, getattr(signal, "SIGTERM", None)):
+        if signum is None:
+            continue
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            signal.signal(signum, lambda *_: loop.call_soon_threadsafe(stop.set))
+
+    address = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    log(f"🌐 下载服务已启动: {address}，下载目录: {base_path}\n")
+    async with server:
+        await stop.wait()
+        log("🛑 正在停止，未完成的任务会保留在任务队列中...\n")
+        server.close()
+        # Running downloads are cancelled; their .part files and queue entries allow --resume later
+        scheduler.cancel(interrupted=True)
+        scheduler.close()
+        await loop.run_in_executor(None, scheduler.wait, 30)
+    return 0
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return asyncio.run(serve(args))
+    except OSError as e:
+        print(f"错误: 无法启动服务: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_DOWNLOAD_TUNING = {
+    "enabled": True,
+    "concurrent_fragments": 4,     # DASH/HLS fragments fetched in parallel (--concurrent-fragments)
+    "http_chunk_size": None,       # e.g. "10M"; splits plain HTTP downloads into ranged requests
+    "external_downloader": None,   # "aria2c" to hand downloads to aria2c when it is installed
+    "downloader_args": "-x 8 -s 8 -k 1M",
+    "auto_tune": False,            # measure the candidates below on the first jobs of each site
+    "samples_per_candidate": 2,
+    "min_sample_mb": 2,            # smaller downloads are too short to measure
+    "retune_days": 30,
+    "candidates": [
+        {"concurrent_fragments": 1},
+        {"concurrent_fragments": 4},
+        {"concurrent_fragments": 8, "http_chunk_size": "10M"},
+        {"concurrent_fragments": 16, "http_chunk_size": "10M"},
+        {"external_downloader": "aria2c"},
+    ],
+}
+
+_PROFILE_KEYS = ("concurrent_fragments", "http_chunk_size", "external_downloader", "downloader_args")
+
+
+def profile_name(profile: dict) -> str:
+    """调优配置的简短名称，例如 "cf8-10M" 或 "aria2c" """
+    if profile.get("external_downloader"):
+        return profile["external_downloader"]
+    name = f"cf{int(profile.get('concurrent_fragments') or 1)}"
+    if profile.get("http_chunk_size"):
+        name += f"-{profile['http_chunk_size']}"
+    return name
+
+
+def tuning_args(profile: dict) -> list:
+    """把调优配置转换为 yt-dlp 参数"""
+    args = []
+    fragments = int(profile.get("concurrent_fragments") or 1)
+    if fragments > 1:
+        args += ["--concurrent-fragments", str(fragments)]
+    if profile.get("http_chunk_size"):
+        args += ["--http-chunk-size", str(profile["http_chunk_size"])]
+    downloader = profile.get("external_downloader")
+    if downloader:
+        args += ["--downloader", downloader]
+        if profile.get("downloader_args"):
+            args += ["--downloader-args", f"{downloader}:{profile['downloader_args']}"]
+    return args
+
+
+class DownloadTuner:
+    """为每次下载选择分片并发、分块大小和外部下载器
+
+    手动模式下总是使用设置中的配置。自动模式下，每个站点的前几个任务轮流试用 candidates 中的配置，
+    记录实际吞吐量 (字节/秒)；每个候选都有 samples_per_candidate 个样本后固定使用最快的一个，
+    结果保存在 path 中，retune_days 天后重新测量。未安装 aria2c 时跳过使用它的配置。
+    """
+
+    def __init__(self, config: dict = None, path=None, clock=time.time):
+        self.config = dict(DEFAULT_DOWNLOAD_TUNING)
+        self.config.update(config or {})
+        self.path = str(path) if path else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._in_flight = {}  # site -> {profile name: running trials}
+        self._results = self._load()
+
+    def _load(self) -> dict:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._results, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def manual_profile(self) -> dict:
+        profile = {key: self.config.get(key) for key in _PROFILE_KEYS}
+        return self._available(profile) or {"concurrent_fragments": profile.get("concurrent_fragments")}
+
+    def candidates(self) -> list:
+        profiles = []
+        for candidate in self.config.get("candidates") or []:
+            profile = {"downloader_args": self.config.get("downloader_args")}
+            profile.update(candidate)
+            if self._available(profile):
+                profiles.append(profile)
+        return profiles
+
+    @staticmethod
+    def _available(profile: dict):
+        downloader = profile.get("external_downloader")
+        if downloader and shutil.which(downloader) is None:
+            return None
+        return profile
+
+    def choose(self, site: str) -> dict:
+        """返回本次下载使用的配置；自动模式下可能是一次试用"""
+        if not self.config.get("enabled", True):
+            return {}
+        if not self.config.get("auto_tune", False):
+            return self.manual_profile()
+        candidates = self.candidates()
+        if not candidates:
+            return self.manual_profile()
+        with self._lock:
+            site_results = self._site_results(site)
+            best = site_results.get("best")
+            if best:
+                for profile in candidates:
+                    if profile_name(profile) == best:
+                        return profile
+            # Least-sampled candidate first, counting trials that are still running
+            in_flight = self._in_flight.setdefault(site, {})
+            samples = site_results.setdefault("samples", {})
+
+            def sample_count(profile):
+                name = profile_name(profile)
+                return len(samples.get(name, [])) + in_flight.get(name, 0)
+            profile = min(candidates, key=sample_count)
+            in_flight[profile_name(profile)] = in_flight.get(profile_name(profile), 0) + 1
+            return profile
+
+    def _site_results(self, site: str) -> dict:
+        # Caller holds the lock
+        results = self._results.setdefault(site, {})
+        measured_at = results.get("measured_at")
+        if measured_at and self._clock() - measured_at > float(self.config["retune_days"]) * 86400:
+            results.clear()
+        return results
+
+    def record(self, site: str, profile: dict, downloaded_bytes, seconds, log_callback=None):
+        """记录一次下载的吞吐量；样本足够时为该站点选出最快的配置"""
+        if not self.config.get("auto_tune", False) or not profile:
+            return
+        name = profile_name(profile)
+        with self._lock:
+            in_flight = self._in_flight.get(site, {})
+            if in_flight.get(name):
+                in_flight[name] -= 1
+            site_results = self._site_results(site)
+            if site_results.get("best"):
+                return
+            if not downloaded_bytes or not seconds or downloaded_bytes < float(self.config["min_sample_mb"]) * 1024 * 1024:
+                return
+            samples = site_results.setdefault("samples", {})
+            samples.setdefault(name, []).append(downloaded_bytes / seconds)
+
+            needed = int(self.config["samples_per_candidate"])
+            candidates = [profile_name(candidate) for candidate in self.candidates()]
+            if not candidates or any(len(samples.get(candidate, [])) < needed for candidate in candidates):
+                self._save()
+                return
+            throughput = {candidate: sorted(samples[candidate])[len(samples[candidate]) // 2] for candidate in candidates}
+            best = max(throughput, key=throughput.get)
+            site_results["best"] = best
+            site_results["measured_at"] = self._clock()
+            self._save()
+        if log_callback:
+            summary = ", ".join(f"{candidate} {rate / 1024 / 1024:.1f} MiB/s" for candidate, rate in throughput.items())
+            log_callback(f"🎛️ {site} 的下载调优完成，使用 {best} ({summary})\n")
+
+    def describe(self, site: str) -> str:
+        with self._lock:
+            results = self._results.get(site) or {}
+        if results.get("best"):
+            return f"{site}: {results['best']}"
+        samples = results.get("samples") or {}
+        return f"{site}: 测量中 ({sum(len(values) for values in samples.values())} 个样本)"
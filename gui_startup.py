@@ -0,0 +1,140 @@
+"""Helpers that keep the GUI cold start short.
+
+The logo is rendered once (resize + rounded corners need PIL) and loaded from a
+PNG afterwards, which Tk reads natively, so PIL is not imported on a normal
+launch. The yt-dlp version is cached and only probed again when the binary
+changes. StartupProfiler reports where the time to the first window goes.
+"""
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+LOGO_SIZE = 80
+LOGO_RADIUS = 15
+
+
+class StartupProfiler:
+    """Records named checkpoints relative to `started` (a time.perf_counter() value)."""
+
+    def __init__(self, started: float, enabled: bool = False, budget_ms=None):
+        self.started = started
+        self.enabled = enabled
+        self.budget_ms = budget_ms
+        self.marks = []  # (name, ms since start)
+
+    def mark(self, name: str):
+        self.marks.append((name, (time.perf_counter() - self.started) * 1000))
+
+    def within_budget(self) -> bool:
+        return self.budget_ms is None or not self.marks or self.marks[-1][1] <= self.budget_ms
+
+    def report(self) -> str:
+        """One line per checkpoint with the time since the previous one, e.g. "widgets  +42.1 ms  (118.0 ms)"."""
+        lines = []
+        previous = 0.0
+        for name, at in self.marks:
+            lines.append(f"  {name:<20} +{at - previous:7.1f} ms  ({at:7.1f} ms)")
+            previous = at
+        if self.budget_ms is not None and self.marks:
+            verdict = "OK" if self.within_budget() else "OVER BUDGET"
+            lines.append(f"  budget {self.budget_ms:.0f} ms: {verdict}")
+        return "⏱️ 启动耗时:\n" + "\n".join(lines)
+
+
+def render_logo(source: str, destination: str, size: int = LOGO_SIZE, radius: int = LOGO_RADIUS):
+    """Resizes the logo and rounds its corners with PIL, writing a PNG Tk can load without PIL."""
+    from PIL import Image, ImageDraw
+
+    image = Image.open(source).convert("RGBA")
+    image = image.resize((size, size), Image.Resampling.LANCZOS)
+    circle = Image.new('L', (radius * 2, radius * 2), 0)
+    draw = ImageDraw.Draw(circle)
+    draw.ellipse((0, 0, radius * 2, radius * 2), fill=255)
+    alpha = Image.new('L', image.size, 255)
+    w, h = image.size
+    alpha.paste(circle.crop((0, 0, radius, radius)), (0, 0))
+    alpha.paste(circle.crop((radius, 0, radius * 2, radius)), (w - radius, 0))
+    alpha.paste(circle.crop((0, radius, radius, radius * 2)), (0, h - radius))
+    alpha.paste(circle.crop((radius, radius, radius * 2, radius * 2)), (w - radius, h - radius))
+    image.putalpha(alpha)
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, destination)
+
+
+def logo_file(source: str, prerendered: str, cache_dir) -> str:
+    """Path of an 80x80 rounded logo PNG: the prerendered asset if it exists, else a disk-cached rendering.
+
+    The cache file name carries the source's size and mtime, so replacing logo.png renders it again.
+    """
+    if os.path.exists(prerendered):
+        return prerendered
+    stat = os.stat(source)
+    cache_dir = str(cache_dir)
+    cached = os.path.join(cache_dir, f"logo-{LOGO_SIZE}-r{LOGO_RADIUS}-{stat.st_size}-{int(stat.st_mtime)}.png")
+    if not os.path.exists(cached):
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in glob.glob(os.path.join(cache_dir, "logo-*.png")):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        render_logo(source, cached)
+    return cached
+
+
+def _binary_fingerprint(executable: str = "yt-dlp"):
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"path": os.path.realpath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def cached_ytdlp_version(cache_path):
+    """The version text saved by probe_ytdlp_version, or None when yt-dlp was replaced, updated or removed."""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    fingerprint = _binary_fingerprint()
+    if fingerprint is None or cached.get("binary") != fingerprint:
+        return None
+    return cached.get("version")
+
+
+def probe_ytdlp_version(cache_path) -> str:
+    """Runs `yt-dlp --version` and caches the result keyed on the binary's path, size and mtime."""
+    fingerprint = _binary_fingerprint()
+    if fingerprint is None:
+        return "yt-dlp 未安装"
+    try:
+        kwargs = {"creationflags": subprocess.CREATE_NO_WINDOW} if sys.platform == "win32" else {}
+        process = subprocess.run(["yt-dlp", "--version"], capture_output=True, text=True, timeout=60, **kwargs)
+    except FileNotFoundError:
+        return "yt-dlp 未安装"
+    except Exception:
+        return ""
+    version = f"yt-dlp: {process.stdout.strip()}"
+    if process.returncode == 0:
+        try:
+            os.makedirs(os.path.dirname(str(cache_path)), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump({"binary": fingerprint, "version": version}, f)
+        except OSError:
+            pass
+    return version
+
+
+if __name__ == "__main__":
+    # Regenerates the prerendered logo after logo/logo.png changes
+    root = os.path.dirname(os.path.abspath(__file__))
+    render_logo(os.path.join(root, "logo", "logo.png"), os.path.join(root, "logo", "logo_80.png"))
@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_METRICS = {
+    "enabled": True,
+    "summary_dir": None,  # defaults to <app support>/metrics
+    "keep": 50,           # batch summaries kept on disk
+}
+
+# Phases in reporting order. "queue" covers per-host limits and rate limiting, "prefetch" the batch-wide
+# metadata probe, "cookies" the export of browser cookies, "postprocess" the ffmpeg merge/extract steps
+# detected from yt-dlp output, "finalize" moving finished files out of the staging directory, "retry_wait" the
+# backoff between a failed attempt and the next one.
+PHASES = ("queue", "prefetch", "metadata", "cookies", "download", "postprocess", "finalize", "retry_wait",
+          "interval_wait")
+PHASE_LABELS = {"queue": "排队", "prefetch": "批量元数据", "metadata": "元数据", "cookies": "Cookie", "download": "下载",
+                "postprocess": "后处理", "finalize": "移入目录", "retry_wait": "重试等待", "interval_wait": "间隔等待"}
+
+_current = threading.local()
+
+
+def current_timeline():
+    """当前线程正在执行的任务的 JobTimeline；不在任务中时返回 None"""
+    return getattr(_current, "timeline", None)
+
+
+@contextmanager
+def active_timeline(timeline):
+    """在 with 块中把 timeline 设为当前线程的任务，span() 等函数记录到它上面"""
+    previous = current_timeline()
+    _current.timeline = timeline
+    try:
+        yield timeline
+    finally:
+        _current.timeline = previous
+
+
+@contextmanager
+def span(phase: str):
+    """记录当前任务中一个阶段的耗时；没有当前任务时什么也不做"""
+    timeline = current_timeline()
+    if timeline is None:
+        yield
+        return
+    timeline.push(phase)
+    try:
+        yield
+    finally:
+        timeline.pop()
+
+
+def switch_phase(phase: str):
+    """把当前线程最内层的阶段切换为 phase (例如下载完成后开始合并)"""
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.switch(phase)
+
+
+def add_bytes(count):
+    timeline = current_timeline()
+    if timeline is not None and count:
+        timeline.add_bytes(count)
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class JobTimeline:
+    """一个任务的阶段耗时、下载字节数和结果
+
+    阶段可以嵌套 (例如元数据探测中导出 Cookie)；每个阶段只计自身的时间，不含嵌套在其中的阶段，
+    所以单线程任务的各阶段之和约等于总耗时。播放列表并行下载时多个线程同时记录，阶段之和可能超过总耗时。
+    """
+
+    def __init__(self, url: str, host: str = None, clock=time.monotonic):
+        self.url = url
+        self.host = host
+        self.clock = clock
+        self.created_at = clock()
+        self.started_at = None
+        self.finished_at = None
+        self.outcome = None
+        self.failure = None  # error category of a failed job (see retry_policy)
+        self.retries = 0
+        self.bytes = 0
+        self.spans = []  # (phase, start, seconds)
+        self._stacks = {}  # thread id -> [[phase, start, nested seconds]]
+        self._lock = threading.Lock()
+
+    def start(self):
+        """任务开始运行：从创建到现在的时间记为排队"""
+        self.started_at = self.clock()
+        self.add_span("queue", self.created_at, self.started_at - self.created_at)
+
+    def add_span(self, phase: str, start: float, seconds: float):
+        with self._lock:
+            self.spans.append((phase, start, max(0.0, seconds)))
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes += count
+
+    def push(self, phase: str):
+        self._stacks.setdefault(threading.get_ident(), []).append([phase, self.clock(), 0.0])
+
+    def pop(self):
+        stack = self._stacks.get(threading.get_ident())
+        if not stack:
+            return
+        phase, start, nested = stack.pop()
+        elapsed = self.clock() - start
+        self.add_span(phase, start, elapsed - nested)
+        if stack:
+            stack[-1][2] += elapsed
+        else:
+            del self._stacks[threading.get_ident()]
+
+    def switch(self, phase: str):
+        stack = self._stacks.get(threading.get_ident())
+        if not stack or stack[-1][0] == phase:
+            return
+        self.pop()
+        self.push(phase)
+
+    def finish(self, outcome: str):
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        self.finished_at = self.clock()
+
+    def phase_seconds(self) -> dict:
+        totals = {}
+        with self._lock:
+            for phase, _, seconds in self.spans:
+                totals[phase] = totals.get(phase, 0.0) + seconds
+        return totals
+
+    def total_seconds(self):
+        end = self.finished_at if self.finished_at is not None else self.clock()
+        return end - self.created_at
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [{"phase": phase, "offset": round(start - self.created_at, 3), "seconds": round(seconds, 3)}
+                     for phase, start, seconds in self.spans]
+        return {
+            "url": self.url,
+            "host": self.host,
+            "outcome": self.outcome,
+            "failure": self.failure,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "seconds": round(self.total_seconds(), 3),
+            "phases": {phase: round(seconds, 3) for phase, seconds in self.phase_seconds().items()},
+            "spans": spans,
+        }
+
+
+class MetricsRegistry:
+    """进程内累计的阶段耗时、任务结果和下载字节数，可导出为 Prometheus 文本格式。线程安全。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phase_seconds = {}
+        self._phase_count = {}
+        self._jobs = {}
+        self._failures = {}
+        self._retries = {}
+        self._bytes = 0
+
+    def observe(self, phase: str, seconds: float):
+        with self._lock:
+            self._phase_seconds[phase] = self._phase_seconds.get(phase, 0.0) + seconds
+            self._phase_count[phase] = self._phase_count.get(phase, 0) + 1
+
+    def record(self, timeline: JobTimeline):
+        """记录一个已结束的任务"""
+        phases = timeline.phase_seconds()
+        with self._lock:
+            for phase, seconds in phases.items():
+                self._phase_seconds[phase] = self._phase_seconds.get(phase, 0.0) + seconds
+                self._phase_count[phase] = self._phase_count.get(phase, 0) + 1
+            self._jobs[timeline.outcome] = self._jobs.get(timeline.outcome, 0) + 1
+            if timeline.failure is not None:
+                self._failures[timeline.failure] = self._failures.get(timeline.failure, 0) + 1
+            self._bytes += timeline.bytes
+
+    def record_retry(self, category: str):
+        """记录一次因 category 类错误而安排的重试"""
+        with self._lock:
+            self._retries[category] = self._retries.get(category, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"phase_seconds": dict(self._phase_seconds), "phase_count": dict(self._phase_count),
+                    "jobs": dict(self._jobs), "failures": dict(self._failures), "retries": dict(self._retries),
+                    "bytes": self._bytes}
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP ytdl_phase_seconds_total Time spent in each job phase.",
+            "# TYPE ytdl_phase_seconds_total counter",
+        ]
+        lines += [f'ytdl_phase_seconds_total{{phase="{phase}"}} {seconds:.6f}' for phase, seconds in sorted(snapshot["phase_seconds"].items())]
+        lines += ["# HELP ytdl_phase_spans_total Number of jobs that went through each phase.",
+                  "# TYPE ytdl_phase_spans_total counter"]
+        lines += [f'ytdl_phase_spans_total{{phase="{phase}"}} {count}' for phase, count in sorted(snapshot["phase_count"].items())]
+        lines += ["# HELP ytdl_jobs_total Finished jobs by outcome.", "# TYPE ytdl_jobs_total counter"]
+        lines += [f'ytdl_jobs_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(snapshot["jobs"].items())]
+        lines += ["# HELP ytdl_job_failures_total Failed jobs by error category.", "# TYPE ytdl_job_failures_total counter"]
+        lines += [f'ytdl_job_failures_total{{reason="{reason}"}} {count}' for reason, count in sorted(snapshot["failures"].items())]
+        lines += ["# HELP ytdl_retries_total Retries scheduled by error category.", "# TYPE ytdl_retries_total counter"]
+        lines += [f'ytdl_retries_total{{reason="{reason}"}} {count}' for reason, count in sorted(snapshot["retries"].items())]
+        lines += ["# HELP ytdl_downloaded_bytes_total Bytes reported by the downloader.",
+                  "# TYPE ytdl_downloaded_bytes_total counter", f"ytdl_downloaded_bytes_total {snapshot['bytes']}"]
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """进程共享的 MetricsRegistry"""
+    return _registry
+
+
+def summarize(timelines, extra_phases: dict = None) -> dict:
+    """一批任务的汇总：每个阶段的总耗时、占比和分布，吞吐量，最慢的任务以及每个任务的明细"""
+    timelines = list(timelines)
+    phases = {}
+    for timeline in timelines:
+        for phase, seconds in timeline.phase_seconds().items():
+            phases.setdefault(phase, []).append(seconds)
+    for phase, seconds in (extra_phases or {}).items():
+        phases.setdefault(phase, []).append(seconds)
+    busy = sum(sum(values) for values in phases.values())
+    outcomes = {}
+    failures = {}
+    for timeline in timelines:
+        outcomes[timeline.outcome] = outcomes.get(timeline.outcome, 0) + 1
+        if timeline.failure is not None:
+            failures[timeline.failure] = failures.get(timeline.failure, 0) + 1
+    started = min((timeline.created_at for timeline in timelines), default=None)
+    finished = max((timeline.finished_at or timeline.created_at for timeline in timelines), default=None)
+    wall = finished - started if started is not None else 0.0
+    total_bytes = sum(timeline.bytes for timeline in timelines)
+    order = sorted(phases, key=lambda phase: (PHASES.index(phase) if phase in PHASES else len(PHASES), phase))
+    return {
+        "jobs": len(timelines),
+        "outcomes": outcomes,
+        "failures": failures,
+        "retries": sum(timeline.retries for timeline in timelines),
+        "wall_seconds": round(wall, 3),
+        "bytes": total_bytes,
+        "bytes_per_second": round(total_bytes / wall, 1) if wall > 0 else None,
+        "phases": {phase: {
+            "seconds": round(sum(phases[phase]), 3),
+            "share": round(sum(phases[phase]) / busy, 4) if busy else 0.0,
+            "count": len(phases[phase]),
+            "mean": round(sum(phases[phase]) / len(phases[phase]), 3),
+            "p50": round(_percentile(phases[phase], 0.5), 3),
+            "p95": round(_percentile(phases[phase], 0.95), 3),
+            "max": round(max(phases[phase]), 3),
+        } for phase in order},
+        "slowest": [{"url": timeline.url, "seconds": round(timeline.total_seconds(), 3)}
+                    for timeline in sorted(timelines, key=lambda t: t.total_seconds(), reverse=True)[:5]],
+        "job_details": [timeline.to_dict() for timeline in timelines],
+    }
+
+
+def describe_summary(summary: dict) -> str:
+    """一行阶段占比，例如 "下载 81% · 后处理 12% · 元数据 5%" """
+    phases = sorted(summary["phases"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+    return " · ".join(f"{PHASE_LABELS.get(phase, phase)} {stats['share'] * 100:.0f}%" for phase, stats in phases if stats["share"] >= 0.01)
+
+
+def write_summary(directory: str, name: str, summary: dict, keep: int = 50) -> str:
+    """把一批任务的汇总写入 directory/<name>.json，只保留最近 keep 个文件；返回文件路径"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    old = sorted(glob.glob(os.path.join(directory, "*.json")), key=os.path.getmtime)[:-keep] if keep else []
+    for old_path in old:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return path
@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Job states that still need work after a restart; jobs the user cancelled are not resumed, those stopped by a shutdown are
+UNFINISHED_STATES = ("queued", "probing", "downloading", "post-processing", "interrupted")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    base_path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status_text TEXT,
+    progress REAL DEFAULT 0,
+    partial_files TEXT DEFAULT '[]',
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+"""
+
+
+class JobStore:
+    """持久化的任务队列 (SQLite WAL)：记录每个URL的状态和未完成的 .part 文件，用于崩溃或退出后继续下载"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add_job(self, batch_id: str, url: str, base_path: str) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (batch_id, url, base_path, state, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (batch_id, url, base_path, now, now))
+            return cursor.lastrowid
+
+    def update(self, job_id: int, **fields):
+        """更新任务的 state / status_text / progress / error 字段"""
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?",
+                               (*fields.values(), time.time(), job_id))
+
+    def add_partial_file(self, job_id: int, path: str):
+        """记录任务正在写入的文件，继续下载时 yt-dlp 会复用对应的 .part 文件"""
+        with self._lock:
+            row = self._conn.execute("SELECT partial_files FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            files = json.loads(row["partial_files"] or "[]")
+            if path in files:
+                return
+            files.append(path)
+            self._conn.execute("UPDATE jobs SET partial_files = ?, updated_at = ? WHERE id = ?",
+                               (json.dumps(files, ensure_ascii=False), time.time(), job_id))
+
+    def unfinished(self) -> list:
+        """返回所有未完成的任务，按提交顺序排列"""
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id", UNFINISHED_STATES).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["partial_files"] = json.loads(job["partial_files"] or "[]")
+            jobs.append(job)
+        return jobs
+
+    def discard(self, job_ids):
+        """放弃继续这些任务"""
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET state = 'discarded', updated_at = ? WHERE id = ?",
+                                   [(time.time(), job_id) for job_id in job_ids])
+
+    def prune(self, older_than_days: float = 30):
+        """删除早已结束的任务记录"""
+        cutoff = time.time() - older_than_days * 86400
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATES)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM jobs WHERE updated_at < ? AND state NOT IN ({placeholders})",
+                               (cutoff, *UNFINISHED_STATES))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from url_normalizer import normalize_url
+
+DEFAULT_METADATA_CACHE = {
+    "enabled": True,
+    "ttl_hours": 24,
+    "max_mb": 64,
+    "refresh": False,   # ignore cached entries and probe again (the fresh result is still stored)
+}
+
+
+def cache_key(url: str) -> str:
+    """把URL归一化为缓存键：同一播放列表或视频的不同写法得到相同的键 (见 url_normalizer)"""
+    return normalize_url(url).key
+
+
+class MetadataCache:
+    """yt-dlp 元数据的磁盘缓存：每个键一个 JSON 文件，带 TTL，按总大小做 LRU 淘汰
+
+    文件的 mtime 即最近访问时间，读取命中时会更新，淘汰时删除最久未访问的文件。
+    """
+
+    def __init__(self, directory, ttl_seconds: float = 24 * 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = str(directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, url: str, max_age: float = None):
+        """返回缓存的元数据；未命中或已过期时返回 None
+
+        max_age (秒) 比 TTL 更严格时，较旧的条目按未命中处理但不删除 (例如增量同步需要较新的列表)。
+        """
+        path = self._path(cache_key(url))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return None
+        age = time.time() - entry.get("fetched_at", 0)
+        if age > self.ttl_seconds:
+            self._remove(path)
+            return None
+        if max_age is not None and age > max_age:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get("metadata")
+
+    def put(self, url: str, metadata: dict):
+        """写入元数据，必要时淘汰最久未访问的条目"""
+        key = cache_key(url)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "fetched_at": time.time(), "metadata": metadata}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def invalidate(self, url: str):
+        self._remove(self._path(cache_key(url)))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+
+def summarize_metadata(metadata: dict) -> dict:
+    """从 yt-dlp 元数据中提取任务需要的摘要：标题、项目数、条目 ID、估算大小和总时长（未知时为 None）"""
+    def item_size(info):
+        formats = info.get("requested_formats")
+        if formats:
+            sizes = [f.get("filesize") or f.get("filesize_approx") for f in formats]
+            return sum(sizes) if all(sizes) else None
+        return info.get("filesize") or info.get("filesize_approx")
+
+    entries = metadata.get("entries")
+    if entries is not None:
+        entries = [entry for entry in entries if entry]
+        sizes = [item_size(entry) for entry in entries]
+        return {
+            "title": metadata.get("title"),
+            "count": metadata.get("playlist_count") or len(entries),
+            "ids": [entry.get("id") for entry in entries],
+            "approx_bytes": sum(sizes) if sizes and all(sizes) else None,
+            "duration": sum(entry["duration"] for entry in entries) if entries and all(entry.get("duration") for entry in entries) else None,
+        }
+    return {
+        "title": metadata.get("title"),
+        "count": 1,
+        "ids": [metadata.get("id")],
+        "approx_bytes": item_size(metadata),
+        "duration": metadata.get("duration"),
+    }
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import threading
+import time
+
+from download_archive import archive_key
+
+DEFAULT_PLAYLIST_SYNC = {
+    "enabled": False,
+    "listing_max_age_minutes": 10,  # a cached flat listing older than this is fetched again before diffing
+    "first_run": "download",        # no manifest yet: "download" every entry not in the archive, or "mark" all as synced
+    "flush_seconds": 2,             # how often the manifest is rewritten while items finish
+}
+
+FIRST_RUN_POLICIES = ("download", "mark")
+MANIFEST_VERSION = 1
+
+
+def sync_config(settings: dict) -> dict:
+    config = dict(DEFAULT_PLAYLIST_SYNC)
+    config.update(settings.get("playlist_sync") or {})
+    if config.get("first_run") not in FIRST_RUN_POLICIES:
+        config["first_run"] = DEFAULT_PLAYLIST_SYNC["first_run"]
+    return config
+
+
+def manifest_path(folder: str) -> str:
+    """清单文件放在播放列表文件夹旁边：playlists/.<标题>.sync.json"""
+    folder = os.path.normpath(folder)
+    return os.path.join(os.path.dirname(folder), f".{os.path.basename(folder)}.sync.json")
+
+
+def entry_key(entry: dict):
+    """条目在清单中的键，与下载存档相同 ("youtube <id>")；没有提取器或 ID 时返回 None"""
+    extractor = entry.get("ie_key") or entry.get("extractor_key")
+    if not extractor or not entry.get("id"):
+        return None
+    return archive_key(extractor, entry["id"])
+
+
+def playlist_items_spec(positions) -> str:
+    """把 1 开始的位置列表压缩为 --playlist-items 参数，例如 [1, 2, 3, 7] -> "1-3,7" """
+    parts = []
+    run_start = previous = None
+    for position in sorted(positions):
+        if previous is not None and position == previous + 1:
+            previous = position
+            continue
+        if run_start is not None:
+            parts.append(str(run_start) if run_start == previous else f"{run_start}-{previous}")
+        run_start = previous = position
+    if run_start is not None:
+        parts.append(str(run_start) if run_start == previous else f"{run_start}-{previous}")
+    return ",".join(parts)
+
+
+def match_filter_spec(entries) -> str:
+    """只允许给定条目的 --match-filter 参数，例如 "id~='^(?:abc|def)$'"；有条目没有 ID 时返回 None"""
+    ids = [entry.get("id") for entry in entries]
+    if not ids or not all(ids):
+        return None
+    return "id~='^(?:" + "|".join(re.escape(str(video_id)) for video_id in ids) + ")$'"
+
+
+class PlaylistManifest:
+    """一个播放列表已同步条目的清单 (JSON)，用于增量同步时只下载新增的条目
+
+    条目在下载成功后才记录；写入先到临时文件再替换，中途退出不会留下损坏的清单。
+    """
+
+    def __init__(self, path, flush_seconds: float = 2.0):
+        self.path = str(path)
+        self.flush_seconds = flush_seconds
+        self.url = None
+        self.title = None
+        self._entries = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        self.exists = self._load()
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return False
+        if data.get("version") != MANIFEST_VERSION:
+            return False
+        self.url = data.get("url")
+        self.title = data.get("title")
+        self._entries = data.get("entries") or {}
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def diff(self, entries: list) -> list:
+        """返回清单中没有的条目 [(1 开始的位置, 条目)]，按播放列表顺序；无法确定键的条目总是算作新增"""
+        new = []
+        for position, entry in enumerate(entries, 1):
+            if not entry:
+                continue
+            key = entry_key(entry)
+            if key is None or key not in self._entries:
+                new.append((position, entry))
+        return new
+
+    def mark(self, entries):
+        """记录已同步的条目，并按 flush_seconds 节流写入磁盘"""
+        now = time.time()
+        with self._lock:
+            for entry in entries:
+                key = entry_key(entry)
+                if key is not None and key not in self._entries:
+                    self._entries[key] = {"title": entry.get("title"), "synced_at": now}
+                    self._dirty = True
+        if now - self._saved_at >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": MANIFEST_VERSION, "url": self.url, "title": self.title, "updated_at": time.time(),
+                    "entries": self._entries}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.time()
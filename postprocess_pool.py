@@ -0,0 +1,341 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from download_archive import archive_key
+
+DEFAULT_POSTPROCESS_POOL = {
+    "enabled": False,
+    "workers": 0,         # ffmpeg processes at a time; 0 = one per CPU
+    "max_pending": 4,     # raw downloads waiting for or in post-processing; downloads pause beyond this
+    "keep_raw": False,    # keep the downloaded streams after a successful merge/extract
+}
+
+# yt-dlp prints one of these lines per downloaded stream (--print after_move:...)
+RAW_FILE_PREFIX = "[rawfile] "
+RAW_DIR = ".raw"
+RAW_OUTPUT_TEMPLATE = "%(title)s.f%(format_id)s.%(ext)s"
+
+_RAW_SUFFIX = re.compile(r"\.f[^.]+\.[^.]+$")
+
+# Audio codec arguments matching yt-dlp's --extract-audio --audio-quality 0; copied when the stream already fits
+_AUDIO_CODECS = {
+    "m4a": (("mp4a", "aac"), ["-c:a", "aac", "-b:a", "256k"]),
+    "mp3": (("mp3",), ["-c:a", "libmp3lame", "-q:a", "0"]),
+    "opus": (("opus",), ["-c:a", "libopus", "-b:a", "192k"]),
+    "flac": (("flac",), ["-c:a", "flac", "-compression_level", "8"]),
+    "wav": ((), ["-c:a", "pcm_s16le"]),
+}
+
+
+_current = threading.local()
+
+
+def current_batch():
+    """调度器为当前线程的任务设置的 PostprocessBatch；没有时返回 None"""
+    return getattr(_current, "batch", None)
+
+
+@contextmanager
+def active_batch(batch):
+    """在 with 块中下载的文件提交到 batch，由调用方 (调度器) 等待其完成"""
+    previous = current_batch()
+    _current.batch = batch
+    try:
+        yield batch
+    finally:
+        _current.batch = previous
+
+
+def raw_print_args() -> list:
+    """让 yt-dlp 在每个流下载完成后输出一行 JSON (--print 默认会开启 quiet，用 --no-quiet 保留正常输出)"""
+    return ["--no-quiet", "--print", "after_move:" + RAW_FILE_PREFIX + "%(.{id,extractor_key,title,format_id,vcodec,acodec,ext,filepath})j"]
+
+
+def parse_raw_line(msg: str):
+    """解析 RAW_FILE_PREFIX 行 (可能带有 "[n/total] " 之类的前缀)；不是这种行时返回 None"""
+    index = msg.find(RAW_FILE_PREFIX)
+    if index < 0:
+        return None
+    try:
+        info = json.loads(msg[index + len(RAW_FILE_PREFIX):])
+    except ValueError:
+        return None
+    return info if isinstance(info, dict) and info.get("filepath") else None
+
+
+def _has_video(info: dict) -> bool:
+    # Unknown codecs (generic extractors) count as a complete file
+    return info.get("vcodec") != "none"
+
+
+def _has_audio(info: dict) -> bool:
+    return info.get("acodec") != "none"
+
+
+class RawFileCollector:
+    """把同一条目 (id) 的视频流和音频流配成一组；一组完整时交给后处理"""
+
+    def __init__(self, need_video: bool):
+        self.need_video = need_video
+        self._groups = {}
+        self._done = set()
+
+    def add(self, info: dict):
+        """加入一个已下载的流；该条目的流已齐全时返回这一组文件，否则返回 None"""
+        key = info.get("id") or info["filepath"]
+        if key in self._done:
+            return None
+        files = self._groups.setdefault(key, [])
+        files.append(info)
+        if any(_has_audio(f) for f in files) and (not self.need_video or any(_has_video(f) for f in files)):
+            self._done.add(key)
+            return self._groups.pop(key)
+        return None
+
+    def flush(self) -> list:
+        """下载结束时仍不完整的组 (例如没有音轨的视频)"""
+        groups = list(self._groups.values())
+        self._done.update(self._groups)
+        self._groups.clear()
+        return groups
+
+
+def final_path(files: list, folder: str, ext: str) -> str:
+    """原始流 "<标题>.f<format_id>.<ext>" 对应的最终文件 "<标题>.<ext>" """
+    name = _RAW_SUFFIX.sub("", os.path.basename(files[0]["filepath"]))
+    return os.path.join(folder, f"{name}.{ext}")
+
+
+def ffmpeg_command(kind: str, files: list, output: str, settings: dict) -> list:
+    """合并视频和音频流 (-c copy)，或把音频流转换为 settings["audio_format"]"""
+    command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if kind == "audio":
+        source = next((f for f in files if _has_audio(f)), files[0])
+        audio_format = settings.get("audio_format", "m4a")
+        copy_codecs, encode_args = _AUDIO_CODECS.get(audio_format, ((), []))
+        codec = (source.get("acodec") or "").lower()
+        codec_args = ["-c:a", "copy"] if codec and codec.startswith(copy_codecs) and copy_codecs else encode_args
+        return command + ["-i", source["filepath"], "-vn"] + codec_args + [output]
+    videos = [f for f in files if _has_video(f)]
+    audios = [f for f in files if _has_audio(f) and not _has_video(f)]
+    if not videos or not audios:
+        return command + ["-i", files[0]["filepath"], "-c", "copy", output]
+    command += ["-i", videos[0]["filepath"], "-i", audios[0]["filepath"], "-map", "0:v:0", "-map", "1:a:0", "-c", "copy"]
+    if output.endswith((".mp4", ".m4a", ".mov")):
+        command += ["-movflags", "+faststart"]
+    return command + [output]
+
+
+class PostprocessBatch:
+    """一个下载任务提交给后处理池的全部文件；全部处理完时通知等待者"""
+
+    def __init__(self, log_callback, cancel_event, timeline=None):
+        self.log_callback = log_callback
+        self.cancel_event = cancel_event
+        self.timeline = timeline
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._failed = 0
+        self._callbacks = []
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def _task_started(self):
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+
+    def _task_done(self, ok: bool):
+        with self._lock:
+            self._pending -= 1
+            if not ok:
+                self._failed += 1
+            if self._pending:
+                return
+            callbacks, self._callbacks = self._callbacks, []
+            self._idle.set()
+        for callback in callbacks:
+            callback(self._failed == 0)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def wait(self) -> bool:
+        """等到所有文件处理完；全部成功时返回 True"""
+        self._idle.wait()
+        return self._failed == 0
+
+    def on_complete(self, callback):
+        """所有文件处理完时调用 callback(ok)；没有未完成的文件时立即调用"""
+        with self._lock:
+            if self._pending:
+                self._callbacks.append(callback)
+                return
+        callback(self._failed == 0)
+
+
+class PostprocessPool:
+    """独立于下载的 ffmpeg 后处理线程池
+
+    下载线程通过 submit() 提交原始流；排队和处理中的文件达到 max_pending 时 submit() 阻塞，
+    下载线程不再读取 yt-dlp 的输出，yt-dlp 随之暂停，未处理的原始文件因此不会无限堆积。
+    """
+
+    def __init__(self, workers: int = 0, max_pending: int = 4, keep_raw: bool = False):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.max_pending = max(1, int(max_pending))
+        self.keep_raw = keep_raw
+        self._cond = threading.Condition()
+        self._queue = deque()  # (command, files, output, batch, on_success)
+        self._pending = 0
+        self._threads = []
+
+    def submit(self, command: list, files: list, output: str, batch: PostprocessBatch, on_success=None):
+        """提交一组原始流；处理成功后调用 on_success()"""
+        batch._task_started()
+        with self._cond:
+            while self._pending >= self.max_pending and not batch.cancel_event.is_set():
+                self._cond.wait(0.5)
+            self._pending += 1
+            self._queue.append((command, files, output, batch, on_success))
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"postprocess-{len(self._threads) + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                command, files, output, batch, on_success = self._queue.popleft()
+            ok = False
+            try:
+                ok = self._run(command, files, output, batch)
+                if ok and on_success is not None:
+                    on_success()
+            except Exception as e:
+                batch.log_callback(f"⚠️ 后处理异常: {e}\n")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+                batch._task_done(ok)
+
+    def _run(self, command: list, files: list, output: str, batch: PostprocessBatch) -> bool:
+        if batch.cancel_event.is_set():
+            return False
+        name = os.path.basename(output)
+        root, ext = os.path.splitext(output)
+        tmp_output = f"{root}.tmp{ext}"
+        command = command[:-1] + [tmp_output]
+        started = time.monotonic()
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                       encoding="utf-8", errors="ignore")
+        except FileNotFoundError:
+            batch.log_callback(f"❌ 命令未找到: {command[0]}。后处理需要 ffmpeg，原始文件保留在 {os.path.dirname(files[0]['filepath'])}\n")
+            return False
+        stderr = ""
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if batch.cancel_event.is_set():
+                    process.kill()
+                    process.communicate()
+                    self._remove(tmp_output)
+                    return False
+        seconds = time.monotonic() - started
+        if batch.timeline is not None:
+            batch.timeline.add_span("postprocess", started, seconds)
+        if process.returncode != 0:
+            self._remove(tmp_output)
+            batch.log_callback(f"❌ 后处理失败: {name}: {stderr.strip()[-500:]}\n")
+            return False
+        os.replace(tmp_output, output)
+        if not self.keep_raw:
+            for info in files:
+                self._remove(info["filepath"])
+            try:
+                os.rmdir(os.path.dirname(files[0]["filepath"]))
+            except OSError:
+                pass  # Other streams are still waiting
+        batch.log_callback(f"🎚️ 后处理完成: {name} ({seconds:.1f} 秒)\n")
+        return True
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class RawPipeline:
+    """一次下载的后处理流水线：从 yt-dlp 输出中收集原始流，齐全后提交给后处理池
+
+    yt-dlp 在原始流下载完成时就会记录存档，所以它只拿到存档的副本 (见 DownloadArchive.snapshot)；
+    条目在后处理成功后才由流水线写入 archive，合并失败或被取消的条目下次仍会下载。
+    """
+
+    def __init__(self, pool: PostprocessPool, batch: PostprocessBatch, kind: str, folder: str, settings: dict,
+                 log_callback, owns_batch: bool, work_dir: str = None, archive=None):
+        self.pool = pool
+        self.batch = batch
+        self.kind = kind
+        self.folder = folder
+        self.settings = settings
+        self.log_callback = log_callback
+        self.owns_batch = owns_batch
+        # Raw streams may live in a staging folder; the merged file is always written into folder
+        self.raw_dir = os.path.join(work_dir or folder, RAW_DIR)
+        self.output_template = os.path.join(self.raw_dir, RAW_OUTPUT_TEMPLATE)
+        self.collector = RawFileCollector(need_video=kind == "video")
+        self.archive = archive
+        self._lock = threading.Lock()
+
+    def log(self, msg: str):
+        """代替 log_callback 传给下载：拦截原始流的输出行，其余照常记录"""
+        info = parse_raw_line(msg)
+        if info is None:
+            self.log_callback(msg)
+            return
+        with self._lock:
+            files = self.collector.add(info)
+        if files:
+            self._submit(files)
+
+    def _submit(self, files: list):
+        ext = self.settings.get("audio_format", "m4a") if self.kind == "audio" else self.settings.get("video_format", "mp4")
+        output = final_path(files, self.folder, ext)
+        self.pool.submit(ffmpeg_command(self.kind, files, output, self.settings), files, output, self.batch,
+                         on_success=lambda: self._record(files))
+
+    def _record(self, files: list):
+        info = files[0]
+        if self.archive is not None and info.get("extractor_key") and info.get("id"):
+            self.archive.add(archive_key(info["extractor_key"], info["id"]))
+
+    def finish(self, success: bool) -> bool:
+        """下载结束：提交不完整的组；流水线不属于调度器的任务时等待后处理完成"""
+        with self._lock:
+            groups = self.collector.flush() if success else []
+        for files in groups:
+            self._submit(files)
+        if self.owns_batch:
+            return self.batch.wait() and success
+        return success
@@ -0,0 +1,185 @@
+import threading
+import time
+
+# Smoothing factor for the throughput estimate; one sample is taken at most every SAMPLE_SECONDS
+SPEED_SMOOTHING = 0.3
+SAMPLE_SECONDS = 0.5
+
+
+def format_bytes(size) -> str:
+    """把字节数格式化为 B / KiB / MiB / GiB"""
+    size = float(size or 0)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_eta(seconds) -> str:
+    """把剩余秒数格式化为 MM:SS 或 H:MM:SS"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressAggregator:
+    """按字节数加权的总体进度：一个播放列表的条目或一批URL中的任务
+
+    每一项的权重是已知或估算的大小 (filesize / filesize_approx，下载开始后为实际的 total_bytes)。
+    大小未知但时长已知的项按已知项的平均码率估算；再退一步按已知项的平均大小估算，
+    全部未知时按时长加权，连时长也没有时退化为按项数平均。
+    同时根据已完成字节数的变化估算吞吐量和剩余时间。可以在运行中 add() 新的项。线程安全。
+    """
+
+    def __init__(self, sizes=(), durations=(), clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sizes = []
+        self._durations = []
+        self._fractions = []
+        self._measured = {}  # index -> [bytes reported by the downloader, first update, last update]
+        self._speed = None
+        self._last_sample = None  # (time, done weight)
+        durations = list(durations)
+        for i, size in enumerate(sizes):
+            self.add(size, durations[i] if i < len(durations) else None)
+
+    @classmethod
+    def from_entries(cls, entries, count: int = 0):
+        """按 yt-dlp 元数据的条目 (filesize / filesize_approx / duration) 建立；条目不足 count 项时补上未知项"""
+        entries = [entry or {} for entry in entries]
+        entries += [{}] * max(0, count - len(entries))
+        return cls([entry.get("filesize") or entry.get("filesize_approx") for entry in entries],
+                   [entry.get("duration") for entry in entries])
+
+    def add(self, size=None, duration=None) -> int:
+        """加入一项，返回其序号"""
+        with self._lock:
+            self._sizes.append(size if size and size > 0 else None)
+            self._durations.append(duration if duration and duration > 0 else None)
+            self._fractions.append(0.0)
+            return len(self._sizes) - 1
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def set_size(self, index: int, size=None, duration=None):
+        """更新一项的大小或时长 (例如预取到元数据或下载时得知实际大小)"""
+        with self._lock:
+            if size and size > 0:
+                self._sizes[index] = size
+            if duration and duration > 0:
+                self._durations[index] = duration
+
+    def update(self, index: int, percent=None, downloaded_bytes=None, total_bytes=None):
+        """上报一项的进度；优先使用字节数，其次使用百分比"""
+        with self._lock:
+            if total_bytes and total_bytes > 0:
+                self._sizes[index] = total_bytes
+                if downloaded_bytes is not None:
+                    percent = downloaded_bytes * 100.0 / total_bytes
+                    now = self._clock()
+                    measured = self._measured.setdefault(index, [0, now, now])
+                    measured[0] = downloaded_bytes
+                    measured[2] = now
+            if percent is not None:
+                self._fractions[index] = min(1.0, max(0.0, percent / 100.0))
+            self._sample()
+
+    def finish(self, index: int):
+        """标记一项已结束 (完成、跳过或失败都计为 100%)"""
+        self.update(index, percent=100.0)
+
+    @property
+    def bytes_known(self) -> bool:
+        """是否至少有一项的大小已知 (否则吞吐量无法以字节计)"""
+        return any(self._sizes)
+
+    def _weights(self) -> list:
+        known = [size for size in self._sizes if size]
+        calibration = [(size, duration) for size, duration in zip(self._sizes, self._durations) if size and duration]
+        bytes_per_second = (sum(size for size, _ in calibration) / sum(duration for _, duration in calibration)
+                            if calibration else None)
+        durations = [duration for duration in self._durations if duration]
+        if known:
+            default = sum(known) / len(known)
+        else:
+            # No sizes at all: weigh by duration, items without one count as an average item
+            default = sum(durations) / len(durations) if durations else 1.0
+        weights = []
+        for size, duration in zip(self._sizes, self._durations):
+            if size:
+                weights.append(size)
+            elif duration and bytes_per_second:
+                weights.append(duration * bytes_per_second)
+            elif duration and not known:
+                weights.append(duration)
+            else:
+                weights.append(default)
+        return weights
+
+    def _totals(self):
+        weights = self._weights()
+        return sum(weight * fraction for weight, fraction in zip(weights, self._fractions)), sum(weights)
+
+    def _sample(self):
+        # Caller holds the lock
+        now = self._clock()
+        done, _ = self._totals()
+        if self._last_sample is None:
+            self._last_sample = (now, done)
+            return
+        last_time, last_done = self._last_sample
+        elapsed = now - last_time
+        if elapsed < SAMPLE_SECONDS:
+            return
+        # Size corrections can make "done" jump backwards; that is not negative throughput
+        instant = max(0.0, done - last_done) / elapsed
+        self._speed = instant if self._speed is None else SPEED_SMOOTHING * instant + (1 - SPEED_SMOOTHING) * self._speed
+        self._last_sample = (now, done)
+
+    def measurement(self, index=None):
+        """下载器实际上报的字节数及其耗时 (第一次到最后一次进度之间)，index 为 None 时汇总所有项；
+        没有字节数时返回 (None, None)"""
+        with self._lock:
+            if index is None:
+                items = list(self._measured.values())
+            else:
+                items = [self._measured[index]] if index in self._measured else []
+        if not items:
+            return None, None
+        return sum(item[0] for item in items), max(item[2] for item in items) - min(item[1] for item in items)
+
+    def percent(self) -> float:
+        """总体进度 (0-100)"""
+        with self._lock:
+            done, total = self._totals()
+        return done * 100.0 / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        """总体进度、已完成/总字节数 (估算)、吞吐量 (字节/秒) 和剩余秒数；未知的值为 None"""
+        with self._lock:
+            done, total = self._totals()
+            bytes_known = any(self._sizes)
+            speed = self._speed
+        eta = (total - done) / speed if speed else None
+        return {
+            "percent": done * 100.0 / total if total else 0.0,
+            "done_bytes": done if bytes_known else None,
+            "total_bytes": total if bytes_known else None,
+            "speed": speed if bytes_known else None,
+            "eta": eta,
+        }
+
+    def describe(self) -> str:
+        """状态栏文本，例如 "1.2 GiB/3.4 GiB · 5.1 MiB/s · 剩余 07:20" """
+        snapshot = self.snapshot()
+        parts = []
+        if snapshot["total_bytes"]:
+            parts.append(f"{format_bytes(snapshot['done_bytes'])}/{format_bytes(snapshot['total_bytes'])}")
+        if snapshot["speed"]:
+            parts.append(f"{format_bytes(snapshot['speed'])}/s")
+        if snapshot["eta"] is not None and snapshot["percent"] < 100:
+            parts.append(f"剩余 {format_eta(snapshot['eta'])}")
+        return " · ".join(parts)
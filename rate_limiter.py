@@ -0,0 +1,136 @@
+import re
+import threading
+import time
+
+# yt-dlp output lines that mean the site wants us to slow down
+THROTTLE_PATTERN = re.compile(
+    r"HTTP Error 429|Too Many Requests|Sign in to confirm you.re not a bot"
+    r"|rate[- ]limit|This content isn.t available, try again later",
+    re.IGNORECASE,
+)
+
+DEFAULT_RATE_LIMIT = {
+    "enabled": True,
+    "initial_per_minute": 6.0,    # job starts per minute per site
+    "min_per_minute": 0.5,
+    "max_per_minute": 60.0,
+    "increase_per_minute": 1.0,   # additive increase after each successful job
+    "decrease_factor": 0.5,       # multiplicative decrease on throttling
+    "burst": 2,                   # token bucket capacity
+    "backoff_seconds": 60,        # pause after throttling, doubled on consecutive hits
+    "max_backoff_seconds": 1800,
+}
+
+
+def is_throttle_message(line: str) -> bool:
+    """判断一行 yt-dlp 输出是否表示被站点限流"""
+    return THROTTLE_PATTERN.search(line) is not None
+
+
+class HostBucket:
+    """单个站点的令牌桶及其 AIMD 状态"""
+
+    def __init__(self, rate_per_minute: float, burst: float, now: float):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.tokens = 1.0
+        self.updated = now
+        self.backoff_until = 0.0
+        self.consecutive_throttles = 0
+        self.throttle_count = 0
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate_per_minute / 60.0)
+        self.updated = now
+
+
+class AdaptiveRateLimiter:
+    """按站点的令牌桶限速器，使用 AIMD 调整速率：任务成功时线性加速，遇到限流时成倍减速并暂停一段时间"""
+
+    def __init__(self, config: dict = None, log_callback=None, clock=time.monotonic):
+        self.config = dict(DEFAULT_RATE_LIMIT)
+        self.config.update(config or {})
+        self.log_callback = log_callback
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str, now: float) -> HostBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = HostBucket(float(self.config["initial_per_minute"]), float(self.config["burst"]), now)
+            self._buckets[host] = bucket
+        return bucket
+
+    def try_acquire(self, host: str) -> float:
+        """尝试为站点取得一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            if now < bucket.backoff_until:
+                return bucket.backoff_until - now
+            bucket.refill(now)
+            if bucket.tokens >= 1.0:
+                bucket.tokens -= 1.0
+                return 0.0
+            return (1.0 - bucket.tokens) * 60.0 / bucket.rate_per_minute
+
+    def record_success(self, host: str):
+        """任务成功：加法增加速率"""
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            bucket.refill(now)
+            bucket.consecutive_throttles = 0
+            previous = bucket.rate_per_minute
+            bucket.rate_per_minute = min(float(self.config["max_per_minute"]),
+                                         bucket.rate_per_minute + float(self.config["increase_per_minute"]))
+            rate = bucket.rate_per_minute
+        if self.log_callback and rate > previous:
+            self.log_callback(f"⚡ {host} 下载顺利，速率提升至 {rate:.1f} 次/分钟\n")
+
+    def record_throttle(self, host: str, reason: str = ""):
+        """检测到限流：乘法降低速率并进入退避；同一次退避期间的重复信号只计一次"""
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            bucket.throttle_count += 1
+            if now < bucket.backoff_until:
+                return
+            bucket.refill(now)
+            bucket.consecutive_throttles += 1
+            bucket.rate_per_minute = max(float(self.config["min_per_minute"]),
+                                         bucket.rate_per_minute * float(self.config["decrease_factor"]))
+            backoff = min(float(self.config["max_backoff_seconds"]),
+                          float(self.config["backoff_seconds"]) * 2 ** (bucket.consecutive_throttles - 1))
+            bucket.backoff_until = now + backoff
+            bucket.tokens = 0.0
+            rate = bucket.rate_per_minute
+        if self.log_callback:
+            self.log_callback(f"🐢 {host} 触发限流 ({reason.strip()[:80]})，速率降至 {rate:.1f} 次/分钟，暂停 {backoff:.0f} 秒\n")
+
+    def state(self, host: str) -> dict:
+        """返回站点当前的速率与退避状态"""
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            return {
+                "host": host,
+                "rate_per_minute": bucket.rate_per_minute,
+                "backoff_remaining": max(0.0, bucket.backoff_until - now),
+                "throttle_count": bucket.throttle_count,
+            }
+
+    def describe(self) -> str:
+        """生成适合显示在状态栏的简短描述"""
+        with self._lock:
+            hosts = list(self._buckets)
+        parts = []
+        for host in hosts:
+            state = self.state(host)
+            text = f"{host} {state['rate_per_minute']:.1f}/分"
+            if state["backoff_remaining"] > 0:
+                text += f" 退避 {state['backoff_remaining']:.0f}s"
+            parts.append(text)
+        return " | ".join(parts)
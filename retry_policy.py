@@ -0,0 +1,198 @@
+import random
+import re
+import threading
+from contextlib import contextmanager
+
+from rate_limiter import is_throttle_message
+
+# Failure categories. Transient ones are retried with backoff (see DEFAULT_RETRY); the rest fail right away.
+THROTTLED = "throttled"
+NETWORK = "network"
+SERVER_ERROR = "server_error"
+FRAGMENT = "fragment"
+DISK_FULL = "disk_full"
+PRIVATE = "private"
+LOGIN_REQUIRED = "login_required"
+GEO_BLOCKED = "geo_blocked"
+UNAVAILABLE = "unavailable"
+UNSUPPORTED = "unsupported"
+POSTPROCESS = "postprocess"
+TOOL_MISSING = "tool_missing"
+UNKNOWN = "unknown"
+
+CATEGORY_LABELS = {
+    THROTTLED: "被限流", NETWORK: "网络错误", SERVER_ERROR: "服务器错误", FRAGMENT: "分片下载失败",
+    DISK_FULL: "磁盘已满", PRIVATE: "私享视频", LOGIN_REQUIRED: "需要登录或会员", GEO_BLOCKED: "地区限制",
+    UNAVAILABLE: "视频已删除或不可用", UNSUPPORTED: "不支持的链接或格式", POSTPROCESS: "后处理失败",
+    TOOL_MISSING: "缺少外部程序", UNKNOWN: "未知错误",
+}
+
+DEFAULT_RETRY = {
+    "enabled": True,
+    "jitter": 0.3,   # each delay is randomly stretched or shrunk by up to this fraction
+    # Attempts in total (1 = no retry) and the exponential backoff per category; unlisted categories are not retried
+    "policies": {
+        THROTTLED: {"max_attempts": 4, "base_seconds": 60, "max_seconds": 900},
+        NETWORK: {"max_attempts": 5, "base_seconds": 5, "max_seconds": 300},
+        SERVER_ERROR: {"max_attempts": 4, "base_seconds": 15, "max_seconds": 600},
+        FRAGMENT: {"max_attempts": 4, "base_seconds": 5, "max_seconds": 120},
+        DISK_FULL: {"max_attempts": 3, "base_seconds": 120, "max_seconds": 1800},
+        UNKNOWN: {"max_attempts": 2, "base_seconds": 10, "max_seconds": 60},
+    },
+}
+
+# First match wins, so the specific causes come before the generic HTTP and network errors
+_PATTERNS = [
+    (DISK_FULL, re.compile(r"No space left on device|Errno 28\b|磁盘空间不足", re.IGNORECASE)),
+    (TOOL_MISSING, re.compile(r"命令未找到|ffmpeg (is )?not (found|installed)|ffprobe (and ffmpeg )?not found", re.IGNORECASE)),
+    (FRAGMENT, re.compile(r"fragment|did not get any data blocks", re.IGNORECASE)),
+    (PRIVATE, re.compile(r"private video|video is private", re.IGNORECASE)),
+    (LOGIN_REQUIRED, re.compile(r"confirm your age|age[- ]restricted|members[- ]only|join this channel"
+                                r"|requires? (a )?(login|subscription|payment|authentication)|premium", re.IGNORECASE)),
+    (GEO_BLOCKED, re.compile(r"not (made this video )?available in your country|geo[- ]?restrict|blocked it in your country",
+                             re.IGNORECASE)),
+    (UNAVAILABLE, re.compile(r"video unavailable|has been removed|no longer available|account .*terminated"
+                             r"|copyright|does not exist|HTTP Error 404|HTTP Error 410|incomplete youtube id",
+                             re.IGNORECASE)),
+    (UNSUPPORTED, re.compile(r"unsupported URL|is not a valid URL|no video formats found"
+                             r"|requested format is not available|无效输入|Spotify 链接，已跳过", re.IGNORECASE)),
+    (POSTPROCESS, re.compile(r"postprocessing|conversion failed|后处理失败", re.IGNORECASE)),
+    (SERVER_ERROR, re.compile(r"HTTP Error 5\d\d|internal server error|bad gateway|service unavailable"
+                              r"|gateway time-?out", re.IGNORECASE)),
+    (NETWORK, re.compile(r"connection (reset|refused|aborted)|timed? ?out|temporary failure in name resolution"
+                         r"|name or service not known|getaddrinfo failed|network is unreachable"
+                         r"|remote end closed|IncompleteRead|EOF occurred|SSL|unable to download", re.IGNORECASE)),
+]
+# Lines other than "ERROR: ..." / "❌ ..." that still end a download
+_FATAL_OUTSIDE_ERRORS = (DISK_FULL, TOOL_MISSING, UNSUPPORTED)
+
+
+def classify_line(line: str):
+    """返回一行 ERROR 输出的错误类别；不是错误行时返回 None"""
+    line = line.strip()
+    is_error = line.startswith("ERROR:") or line.startswith("❌")
+    if is_error and is_throttle_message(line):
+        return THROTTLED
+    for category, pattern in _PATTERNS:
+        if (is_error or category in _FATAL_OUTSIDE_ERRORS) and pattern.search(line):
+            return category
+    return UNKNOWN if line.startswith("ERROR:") else None
+
+
+_current = threading.local()
+
+
+def current_classifier():
+    """当前线程正在执行的任务的 ErrorClassifier；不在任务中时返回 None"""
+    return getattr(_current, "classifier", None)
+
+
+@contextmanager
+def active_classifier(classifier):
+    """在 with 块中把 classifier 设为当前线程的任务的错误分类器"""
+    previous = current_classifier()
+    _current.classifier = classifier
+    try:
+        yield classifier
+    finally:
+        _current.classifier = previous
+
+
+def is_transient(category: str, config: dict = None) -> bool:
+    policies = (config or DEFAULT_RETRY)["policies"]
+    return int((policies.get(category) or {}).get("max_attempts", 1)) > 1
+
+
+class FailureReason:
+    """一次失败的结构化原因：类别、是否可重试、触发它的输出行和已尝试次数"""
+
+    __slots__ = ("category", "transient", "message", "attempts")
+
+    def __init__(self, category: str, transient: bool, message=None, attempts: int = 1):
+        self.category = category
+        self.transient = transient
+        self.message = message
+        self.attempts = attempts
+
+    @property
+    def label(self) -> str:
+        return CATEGORY_LABELS.get(self.category, self.category)
+
+    def to_dict(self) -> dict:
+        return {"category": self.category, "label": self.label, "transient": self.transient,
+                "message": self.message, "attempts": self.attempts}
+
+    def __repr__(self):
+        return f"<FailureReason {self.category} x{self.attempts}>"
+
+
+class ErrorClassifier:
+    """从流式输出中收集错误行并归类；一次尝试结束后由 reason() 给出失败原因
+
+    播放列表中有的条目遇到临时错误、有的遇到永久错误时按临时错误处理：重试时已完成的条目会被跳过 (下载存档)，
+    永久失败的条目再次失败也很快。
+    """
+
+    def __init__(self, config: dict = None):
+        self.config = config or DEFAULT_RETRY
+        self.errors = []  # (category, line), most recent last
+
+    def feed(self, line: str):
+        category = classify_line(line)
+        if category is not None:
+            self.add(category, line.strip())
+
+    def add(self, category: str, line=None):
+        """直接记录一个已归类的错误 (例如播放列表并行下载中最终失败的条目)"""
+        self.errors.append((category, line))
+        del self.errors[:-20]
+
+    def reset(self):
+        self.errors = []
+
+    def reason(self, attempts: int = 1) -> FailureReason:
+        transient = [(category, line) for category, line in self.errors if is_transient(category, self.config)]
+        if transient:
+            category, line = transient[-1]
+        elif self.errors:
+            category, line = self.errors[-1]
+        else:
+            category, line = UNKNOWN, None
+        return FailureReason(category, is_transient(category, self.config), line, attempts)
+
+
+class RetryPolicy:
+    """按错误类别决定是否重试以及等待多久：指数退避 base_seconds * 2^(n-1)，不超过 max_seconds，带随机抖动"""
+
+    def __init__(self, config: dict = None, rng=random.random):
+        self.config = retry_config({"retry": config})
+        self._rng = rng
+
+    def policy(self, category: str) -> dict:
+        return self.config["policies"].get(category) or {"max_attempts": 1, "base_seconds": 0, "max_seconds": 0}
+
+    def max_attempts(self, category: str) -> int:
+        return max(1, int(self.policy(category)["max_attempts"]))
+
+    def should_retry(self, category: str, attempts: int) -> bool:
+        """已尝试 attempts 次之后是否还应重试"""
+        return attempts < self.max_attempts(category)
+
+    def delay(self, category: str, attempts: int) -> float:
+        """第 attempts 次失败后等待的秒数"""
+        policy = self.policy(category)
+        delay = min(float(policy["max_seconds"]), float(policy["base_seconds"]) * 2 ** max(0, attempts - 1))
+        jitter = max(0.0, min(1.0, float(self.config["jitter"])))
+        return max(0.0, delay * (1 + jitter * (2 * self._rng() - 1)))
+
+
+def retry_config(settings: dict) -> dict:
+    """设置中的 retry 与默认值合并；policies 按类别逐项覆盖"""
+    user = settings.get("retry") or {}
+    config = dict(DEFAULT_RETRY)
+    config.update({key: value for key, value in user.items() if key != "policies"})
+    policies = {category: dict(policy) for category, policy in DEFAULT_RETRY["policies"].items()}
+    for category, policy in (user.get("policies") or {}).items():
+        policies.setdefault(category, {"max_attempts": 1, "base_seconds": 0, "max_seconds": 0}).update(policy)
+    config["policies"] = policies
+    return config
@@ -0,0 +1,220 @@
+import errno
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+
+from metadata_cache import cache_key
+from progress_model import format_bytes
+
+DEFAULT_STAGING = {
+    "enabled": False,
+    "directory": None,   # local disk for .part files, fragments and merges; default: <app support dir>/staging
+    "keep_days": 7,      # unfinished work folders untouched for this long are deleted
+}
+
+DEFAULT_DISK_ADMISSION = {
+    "enabled": False,
+    "size_margin": 2.0,      # staging needs room for the separate streams and the merged file at the same time
+    "min_free_mb": 1024,     # always leave this much free on each disk
+    "recheck_seconds": 15,   # how often waiting jobs look at the free space again
+}
+
+# yt-dlp's in-progress files: .part / .ytdl, HLS/DASH fragments and temporary files of the fixup and merge steps
+_PARTIAL = re.compile(r"(\.part|\.ytdl|\.temp|\.tmp)$|\.part-Frag\d+|\.(temp|tmp)\.[^.]+$")
+# Separately downloaded streams ("<title>.f137.mp4"); only complete files once the merge has succeeded
+_FORMAT_STREAM = re.compile(r"\.f\d+\.[^.]+$")
+
+
+def is_partial(name: str, success: bool = True) -> bool:
+    """文件是否是尚未完成的下载数据；下载失败时单独下载的视频流/音频流也算未完成 (还没有合并)"""
+    return bool(_PARTIAL.search(name)) or (not success and bool(_FORMAT_STREAM.search(name)))
+
+
+def move_atomic(source: str, destination: str):
+    """把文件移动到目标位置，目标文件名上不会出现写了一半的文件
+
+    同一文件系统内直接 rename；跨文件系统时先复制为目标目录中的隐藏临时文件，再 rename 为最终文件名。
+    """
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    directory, name = os.path.split(destination)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.finalize")
+    try:
+        shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.remove(source)
+
+
+class StagingArea:
+    """本地暂存目录：下载过程中的数据写在这里，完成后整体移入 videos/ 或 playlists/
+
+    每个URL (规范化后) 有固定的工作文件夹，中断后再次下载时 yt-dlp 从其中的 .part 文件继续。
+    """
+
+    def __init__(self, directory, keep_days: float = 7):
+        self.directory = str(directory)
+        self.keep_days = keep_days
+        os.makedirs(self.directory, exist_ok=True)
+
+    def work_dir(self, url: str) -> str:
+        digest = hashlib.sha1(cache_key(url).encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(self.directory, digest)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def finalize(self, work_dir: str, destination: str, success: bool, log_callback) -> bool:
+        """把工作文件夹中已完成的文件移入 destination；未完成的文件留给下次继续。移动失败时返回 False
+
+        destination 中已有同名文件时保留原文件，丢弃新下载的副本。
+        """
+        try:
+            names = sorted(os.listdir(work_dir))
+        except OSError:
+            return True
+        moved = 0
+        for name in names:
+            source = os.path.join(work_dir, name)
+            if not os.path.isfile(source) or is_partial(name, success):
+                continue
+            target = os.path.join(destination, name)
+            if os.path.exists(target):
+                # yt-dlp cannot see the destination from the work folder; never replace a file that is already there
+                log_callback(f"⏭️ {destination} 中已有 {name}，保留原文件\n")
+                try:
+                    os.remove(source)
+                except OSError:
+                    pass
+                continue
+            try:
+                move_atomic(source, target)
+            except OSError as e:
+                log_callback(f"❌ 无法把 {name} 移入 {destination}: {e}。文件保留在 {work_dir}\n")
+                return False
+            moved += 1
+        if moved:
+            log_callback(f"📁 已移入 {destination}: {moved} 个文件\n")
+        try:
+            os.rmdir(work_dir)
+        except OSError:
+            pass  # Unfinished downloads or raw streams waiting for post-processing
+        return True
+
+    def prune(self, log_callback=None):
+        """删除 keep_days 天未使用的工作文件夹 (放弃的下载)"""
+        cutoff = time.time() - float(self.keep_days) * 86400
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if not os.path.isdir(path) or os.stat(path).st_mtime > cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            if log_callback:
+                log_callback(f"🧹 已清理过期的暂存文件夹: {path}\n")
+
+
+def existing_path(path: str) -> str:
+    """path 本身或最近的已存在的上级目录 (目标文件夹可能还没有创建)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class DiskAdmission:
+    """开始任务前检查暂存目录和目标目录的剩余空间，放不下的任务留在队列中等待
+
+    所需空间按元数据中的 filesize_approx 估算：暂存目录需要 size_margin 倍 (合并时各个流和合并后的文件同时存在)，
+    不同磁盘上的目标目录需要 1 倍。已开始的任务在结束前一直占用预留的空间；
+    暂存目录的预留随下载进度减少 (已写入的部分已经反映在剩余空间中)。大小未知的任务直接开始，
+    永远放不下的任务 (见 oversized) 由调用方直接判为失败。
+    """
+
+    def __init__(self, config: dict = None, disk_usage=shutil.disk_usage):
+        self.config = dict(DEFAULT_DISK_ADMISSION)
+        self.config.update(config or {})
+        self._disk_usage = disk_usage
+        self._lock = threading.Lock()
+        self._reservations = {}  # owner -> [(device, bytes, progress callable or None)]
+
+    def _device(self, path: str):
+        return os.stat(existing_path(path)).st_dev
+
+    def _reserved(self, device) -> float:
+        total = 0.0
+        for reservations in self._reservations.values():
+            for reserved_device, size, progress in reservations:
+                if reserved_device == device:
+                    total += size * (1 - min(100.0, progress()) / 100) if progress else size
+        return total
+
+    def _needs(self, approx_bytes, staging_dir: str, destination: str, progress=None) -> list:
+        """[(设备, 路径, 所需字节, 进度)]：暂存目录需要 size_margin 倍，不同磁盘上的目标目录需要 1 倍"""
+        margin = max(1.0, float(self.config["size_margin"]))
+        staging_device, destination_device = self._device(staging_dir), self._device(destination)
+        needs = [(staging_device, staging_dir, approx_bytes * margin, progress)]
+        if destination_device != staging_device:
+            needs.append((destination_device, destination, approx_bytes, None))
+        return needs
+
+    def oversized(self, owner, approx_bytes, staging_dir: str, destination: str) -> str:
+        """任务永远放不下时返回原因，否则返回 ""
+
+        所需空间超过磁盘总容量 (减去 min_free_mb) 时等待没有意义；没有其他任务预留空间时，
+        当前的剩余空间也不会因为其他任务结束而增加。
+        """
+        if not approx_bytes:
+            return ""
+        min_free = float(self.config["min_free_mb"]) * 1024 * 1024
+        needs = self._needs(approx_bytes, staging_dir, destination)
+        with self._lock:
+            alone = not any(other is not owner for other in self._reservations)
+            for _, path, size, _ in needs:
+                usage = self._disk_usage(existing_path(path))
+                if size > usage.total - min_free:
+                    return f"{path} 需要 {format_bytes(size)}，超过磁盘容量 {format_bytes(usage.total)}"
+                if alone and size > usage.free - min_free:
+                    return f"{path} 需要 {format_bytes(size)}，可用 {format_bytes(max(0, usage.free - min_free))}，没有其他任务会释放空间"
+        return ""
+
+    def admit(self, owner, approx_bytes, staging_dir: str, destination: str, progress=None):
+        """空间足够时为 owner 预留空间并返回 (True, "")，否则返回 (False, 原因)
+
+        progress 返回 owner 的下载进度 (0-100)，用于减少暂存目录的预留。
+        """
+        if not approx_bytes:
+            return True, ""
+        min_free = float(self.config["min_free_mb"]) * 1024 * 1024
+        needs = self._needs(approx_bytes, staging_dir, destination, progress)
+        with self._lock:
+            for device, path, size, _ in needs:
+                free = self._disk_usage(existing_path(path)).free - self._reserved(device) - min_free
+                if size > free:
+                    return False, f"{path} 需要 {format_bytes(size)}，可用 {format_bytes(max(0, free))}"
+            self._reservations[owner] = [(device, size, reserved_progress) for device, _, size, reserved_progress in needs]
+        return True, ""
+
+    def release(self, owner):
+        with self._lock:
+            self._reservations.pop(owner, None)
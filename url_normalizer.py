@@ -0,0 +1,178 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_URL_NORMALIZER = {
+    "enabled": True,
+    "mixed_policy": "video",  # watch link that also carries list=: "video" = only that video, "playlist" = the whole list
+}
+
+MIXED_POLICIES = ("video", "playlist")
+
+# Routes, as returned by download_logic.classify_url
+VIDEO = "video"
+VIDEO_PLAYLIST = "video_playlist"
+MUSIC_PLAYLIST = "music_playlist"
+UNSUPPORTED_SPOTIFY = "unsupported_spotify"
+INVALID = "invalid_string"
+
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_LIST_ID = re.compile(r"^[A-Za-z0-9_-]{2,}$")
+_YOUTUBE_HOSTS = frozenset(("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+                            "youtube-nocookie.com", "www.youtube-nocookie.com"))
+# Path forms that carry the video ID as the second segment, e.g. /shorts/<id>
+_ID_PATHS = frozenset(("shorts", "live", "embed", "v", "e"))
+_TRACKING_PARAMS = frozenset(("fbclid", "gclid", "igshid", "mc_cid", "mc_eid"))
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class NormalizedUrl:
+    """解析一次后的URL：规范写法、(站点, 类型, ID) 和下载路线"""
+
+    __slots__ = ("original", "url", "site", "kind", "id", "route")
+
+    def __init__(self, original: str, url: str, site: str, kind: str, id: str, route: str):
+        self.original = original
+        self.url = url
+        self.site = site
+        self.kind = kind
+        self.id = id
+        self.route = route
+
+    @property
+    def key(self) -> str:
+        """与元数据缓存、下载存档共用的键，例如 "youtube:video:<id>"；其他站点为 "url:<规范URL>" """
+        if self.site == "youtube":
+            return f"youtube:{self.kind}:{self.id}"
+        return "url:" + self.url
+
+    @property
+    def dedupe_key(self) -> tuple:
+        # The same playlist as music (audio) and as video are different downloads
+        return (self.route, self.key)
+
+    def __repr__(self):
+        return f"<NormalizedUrl {self.route} {self.key}>"
+
+
+def normalize_url(url: str, mixed_policy: str = "video") -> NormalizedUrl:
+    """解析URL并返回规范形式
+
+    YouTube 的 youtu.be、m.、music.、/shorts/、/live/、/embed/ 等写法归一为 watch?v=<id> 或 playlist?list=<id>，
+    去掉 t=、si=、feature= 等不影响下载内容的参数。同时带有 v= 和 list= 的链接按 mixed_policy 处理：
+    "video" 只下载该视频，"playlist" 下载整个列表；按视频生成的合辑 (RD...) 没有固定内容，总是只下载视频。
+    其他站点只统一大小写、默认端口和片段，并去掉 utm_* 等跟踪参数。
+    """
+    text = url.strip()
+    try:
+        parts = urlsplit(text)
+        scheme = parts.scheme.lower()
+        host, port = _host_port(parts)
+    except ValueError:
+        return NormalizedUrl(url, text, "", "invalid", text, INVALID)
+    if scheme not in ("http", "https") or not host:
+        return NormalizedUrl(url, text, "", "invalid", text, INVALID)
+
+    if host in _YOUTUBE_HOSTS or host == "youtu.be":
+        normalized = _normalize_youtube(url, host, parts, mixed_policy)
+        if normalized is not None:
+            return normalized
+
+    query = parts.query
+    if query:
+        params = parse_qsl(query, keep_blank_values=True)
+        kept = [(name, value) for name, value in params if not name.startswith("utm_") and name not in _TRACKING_PARAMS]
+        if len(kept) != len(params):
+            query = urlencode(kept)
+    netloc = host if port is None or port == _DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    canonical = urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+    route = UNSUPPORTED_SPOTIFY if host == "spotify.com" or host.endswith(".spotify.com") else VIDEO
+    return NormalizedUrl(url, canonical, host, "url", canonical, route)
+
+
+def _host_port(parts):
+    netloc = parts.netloc
+    if "@" in netloc or "[" in netloc:
+        return (parts.hostname or "").lower(), parts.port
+    # Plain "host[:port]" is by far the common case; SplitResult.hostname/.port parse it again each time
+    host, _, port = netloc.partition(":")
+    if port and not port.isdigit():
+        raise ValueError(f"Port could not be cast to integer value as {port!r}")
+    return host.lower(), int(port) if port else None
+
+
+def _youtube_params(query: str) -> dict:
+    """只取 v 和 list (第一次出现的值)；ID 只含 [A-Za-z0-9_-]，不需要解码"""
+    params = {}
+    for part in query.split("&"):
+        name, _, value = part.partition("=")
+        if name in ("v", "list") and name not in params:
+            params[name] = value
+    return params
+
+
+def _normalize_youtube(url: str, host: str, parts, mixed_policy: str):
+    """YouTube 链接的规范形式；无法识别的 (频道、搜索等) 返回 None，按普通URL处理"""
+    query = _youtube_params(parts.query) if parts.query else {}
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if host == "youtu.be":
+        video_id = segments[0] if segments else ""
+    elif segments and segments[0] == "watch":
+        video_id = query.get("v", "")
+    elif len(segments) >= 2 and segments[0] in _ID_PATHS:
+        video_id = segments[1]
+    else:
+        video_id = ""
+    list_id = query.get("list", "")
+    if not _LIST_ID.match(list_id):
+        list_id = ""
+    music = host == "music.youtube.com"
+
+    if not _YOUTUBE_ID.match(video_id):
+        if list_id and (not segments or segments[0] in ("playlist", "watch")):
+            return _youtube_playlist(url, list_id, music)
+        return None
+    if list_id and mixed_policy == "playlist" and not list_id.startswith("RD"):
+        return _youtube_playlist(url, list_id, music)
+    return NormalizedUrl(url, f"https://www.youtube.com/watch?v={video_id}", "youtube", "video", video_id, VIDEO)
+
+
+def _youtube_playlist(url: str, list_id: str, music: bool) -> NormalizedUrl:
+    if music:
+        return NormalizedUrl(url, f"https://music.youtube.com/playlist?list={list_id}", "youtube", "playlist", list_id,
+                             MUSIC_PLAYLIST)
+    return NormalizedUrl(url, f"https://www.youtube.com/playlist?list={list_id}", "youtube", "playlist", list_id,
+                         VIDEO_PLAYLIST)
+
+
+def url_config(settings: dict) -> dict:
+    config = dict(DEFAULT_URL_NORMALIZER)
+    config.update(settings.get("url_normalizer") or {})
+    if config.get("mixed_policy") not in MIXED_POLICIES:
+        config["mixed_policy"] = DEFAULT_URL_NORMALIZER["mixed_policy"]
+    return config
+
+
+def dedupe_urls(lines, mixed_policy: str = "video"):
+    """规范化一批输入 (空行和 # 注释行被忽略)，按 (路线, 键) 去重
+
+    返回 (保留的 NormalizedUrl 列表, 重复项列表)；重复项是 (NormalizedUrl, 它合并到的第一个 NormalizedUrl)。
+    无效链接不去重，照常交给下载流程报告。
+    """
+    unique = []
+    duplicates = []
+    seen = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        normalized = normalize_url(line, mixed_policy)
+        if normalized.route == INVALID:
+            unique.append(normalized)
+            continue
+        first = seen.get(normalized.dedupe_key)
+        if first is not None:
+            duplicates.append((normalized, first))
+            continue
+        seen[normalized.dedupe_key] = normalized
+        unique.append(normalized)
+    return unique, duplicates